@@ -0,0 +1,4 @@
+# 统一在包导入时加载一次 .env（各模块只读取 os.environ）
+from dotenv import load_dotenv
+
+load_dotenv()
@@ -0,0 +1,202 @@
+"""
+响应压缩中间件（brotli / gzip）
+
+根据 Accept-Encoding 协商编码：安装了 brotli 包时优先使用 br，否则使用 gzip。
+压缩后的响应带有独立的强ETag（原ETag追加 -br / -gzip 后缀），
+http_cache 比较 If-None-Match 时会去掉该后缀，因此条件请求仍能命中304。
+PDF、Excel等已压缩的文件不再压缩。
+只使用 Starlette 的公开接口（Headers / MutableHeaders），压缩和发送逻辑都在本模块中实现。
+"""
+import os
+import zlib
+from typing import Optional
+
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli为可选依赖，未安装时只使用gzip
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# 已压缩或流式的类型不再压缩（"类型/*" 匹配整类）
+EXCLUDED_CONTENT_TYPES = (
+    "application/gzip",
+    "application/x-gzip",
+    "application/zip",
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "audio/*",
+    "font/woff",
+    "font/woff2",
+    "image/avif",
+    "image/gif",
+    "image/jpeg",
+    "image/png",
+    "image/webp",
+    "text/event-stream",
+    "video/*",
+)
+
+# 超过该大小的响应体在线程中压缩，避免阻塞事件循环
+THREAD_MIN_SIZE = 128 * 1024
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """按 Accept-Encoding（含q值）选择编码，同等权重时优先br"""
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    def weight(encoding: str) -> float:
+        return weights.get(encoding, weights.get("*", 0.0))
+
+    candidates = (["br"] if brotli is not None else []) + ["gzip"]
+    best = max(candidates, key=weight)
+    return best if weight(best) > 0 else None
+
+
+class _Compressor:
+    """流式压缩器：more_body 为 True 时刷新已压缩的数据，为 False 时结束压缩流"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        if self.encoding == "br":
+            data = self._br.process(body)
+            return data + (self._br.flush() if more_body else self._br.finish())
+        data = self._gz.compress(body)
+        return data + self._gz.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class _CompressionResponder:
+    """
+    包装一个请求的 send：在第一个响应体消息时决定是否压缩，再发送（改写后的）响应头
+    不压缩的情况：已有 Content-Encoding（如预压缩的报告文件）、206、排除的类型、小于 minimum_size 的完整响应
+    """
+
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int, if_none_match: str) -> None:
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.if_none_match = if_none_match
+        self.send: Send = None
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.compressor: Optional[_Compressor] = None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    def _is_excluded(self, headers: Headers) -> bool:
+        media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+        return media_type in EXCLUDED_CONTENT_TYPES or media_type.partition("/")[0] + "/*" in EXCLUDED_CONTENT_TYPES
+
+    def _tagged_etag(self, etag: str) -> str:
+        return etag[:-1] + f'-{self.encoding}"'
+
+    async def _compress(self, body: bytes, more_body: bool) -> bytes:
+        if len(body) >= THREAD_MIN_SIZE:
+            return await anyio.to_thread.run_sync(self.compressor.compress, body, more_body)
+        return self.compressor.compress(body, more_body)
+
+    async def send_with_compression(self, message: Message) -> None:
+        message_type = message["type"]
+        if message_type == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            if message["status"] == 304:
+                # 304没有响应体，沿用客户端缓存的带后缀ETag
+                etag = headers.get("etag")
+                if etag and not etag.startswith("W/") and self._tagged_etag(etag) in self.if_none_match:
+                    MutableHeaders(raw=message["headers"])["etag"] = self._tagged_etag(etag)
+                self.passthrough = True
+            else:
+                self.passthrough = (
+                    "content-encoding" in headers or message["status"] == 206 or self._is_excluded(headers)
+                )
+            if self.passthrough:
+                await self.send(message)
+            else:
+                # 等到第一个响应体消息再决定是否压缩
+                self.start_message = message
+            return
+
+        if self.passthrough or message_type != "http.response.body":
+            if self.start_message is not None:
+                # 例如 pathsend：不压缩，先发出暂存的响应头
+                await self.send(self.start_message)
+                self.start_message = None
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start_message is None:
+            # 流式响应的后续分块
+            if self.compressor is not None:
+                message["body"] = await self._compress(body, more_body)
+            await self.send(message)
+            return
+
+        start, self.start_message = self.start_message, None
+        headers = MutableHeaders(raw=start["headers"])
+        headers.add_vary_header("Accept-Encoding")
+        if len(body) < self.minimum_size and not more_body:
+            await self.send(start)
+            await self.send(message)
+            return
+
+        self.compressor = _Compressor(self.encoding)
+        message["body"] = await self._compress(body, more_body)
+        headers["Content-Encoding"] = self.encoding
+        if more_body:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(len(message["body"]))
+        # 压缩后的表示使用独立的强ETag
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["etag"] = self._tagged_etag(etag)
+        await self.send(start)
+        await self.send(message)
+
+
+class CompressionMiddleware:
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self.app, encoding, self.minimum_size, headers.get("if-none-match", ""))
+        await responder(scope, receive, send)
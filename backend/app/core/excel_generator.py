@@ -3,6 +3,7 @@ import re
 from pathlib import Path
 from typing import Dict, List
 import pandas as pd
+from app.core import pack_archive
 
 def parse_name_id_from_filename(path: Path) -> tuple:
     """从文件名解析姓名和学号
@@ -25,7 +26,7 @@ def parse_name_id_from_filename(path: Path) -> tuple:
 
 def load_one_json(path: Path) -> Dict:
     """加载单个JSON文件并转换为宽表行"""
-    obj = json.loads(path.read_text(encoding="utf-8"))
+    obj = json.loads(pack_archive.read_text(path))
     # 优先从文件名解析（更可靠），如果JSON中有值且看起来合理则使用JSON的值
     parsed_name, parsed_sid = parse_name_id_from_filename(path)
     json_name = obj.get("student_name", "").strip()
@@ -83,7 +84,7 @@ def load_one_json(path: Path) -> Dict:
 def collect_rows(json_dir: Path) -> List[Dict]:
     """收集所有JSON文件的数据（递归查找）"""
     rows: List[Dict] = []
-    for p in sorted(json_dir.glob("**/*.json")):
+    for p in pack_archive.glob(json_dir, "*.json", recursive=True):
         try:
             rows.append(load_one_json(p))
         except Exception as e:
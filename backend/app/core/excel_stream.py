@@ -0,0 +1,131 @@
+"""
+从数据库流式生成Excel汇总（不依赖pandas）
+
+逐题数据按提交顺序分批从数据库读取，使用openpyxl的write-only模式逐行写入，
+内存占用与班级人数、作业数量无关。输出的两个工作表与 excel_generator.generate_excel 一致：
+「汇总(宽表)」每个学生一行，「明细(长表)」每个学生每道题一行。
+"""
+from itertools import groupby
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.models import Assignment, Submission, SubmissionQuestion, User
+
+BASE_COLS = [
+    "student_name", "student_id", "total_questions",
+    "correct", "partial", "result_wrong", "wrong", "grade"
+]
+# 多个作业合并导出时，在每行前增加作业列
+ASSIGNMENT_COLS = ["assignment_id", "assignment_title"]
+
+# 每批从数据库读取的行数
+FETCH_SIZE = 2000
+
+
+def get_question_keys(db: Session, assignment_ids: Sequence[int]) -> Dict[int, List[str]]:
+    """每个作业的题目键（按键排序，与 get_all_qcols 的列顺序一致）"""
+    rows = db.query(SubmissionQuestion.assignment_id, SubmissionQuestion.key).filter(
+        SubmissionQuestion.assignment_id.in_(assignment_ids)
+    ).distinct().all()
+    keys: Dict[int, List[str]] = {}
+    for assignment_id, key in rows:
+        keys.setdefault(assignment_id, []).append(key)
+    return {assignment_id: sorted(k) for assignment_id, k in keys.items()}
+
+
+def iter_student_rows(db: Session, assignment_ids: Sequence[int]) -> Iterator[Dict]:
+    """
+    按（作业、提交）顺序逐个产出学生行：
+    {assignment_id, assignment_title, student_name, student_id, grade, questions: {键: 状态}}
+    只包含已批改（有JSON数据）的提交
+    """
+    query = db.query(
+        Submission.assignment_id,
+        Assignment.title,
+        Submission.id,
+        User.username,
+        User.student_id,
+        Submission.grade,
+        SubmissionQuestion.key,
+        SubmissionQuestion.status,
+    ).join(
+        Assignment, Assignment.id == Submission.assignment_id
+    ).join(
+        User, User.id == Submission.student_id
+    ).outerjoin(
+        SubmissionQuestion, SubmissionQuestion.submission_id == Submission.id
+    ).filter(
+        Submission.assignment_id.in_(assignment_ids),
+        Submission.json_file_path.isnot(None)
+    ).order_by(
+        Submission.assignment_id, Submission.id, SubmissionQuestion.id
+    ).yield_per(FETCH_SIZE)
+
+    for _, group in groupby(query, key=lambda r: r[2]):
+        group = list(group)
+        first = group[0]
+        yield {
+            "assignment_id": first[0],
+            "assignment_title": first[1],
+            "student_name": first[3],
+            "student_id": first[4] or "",
+            "grade": first[5] or "",
+            "questions": {r[6]: r[7] for r in group if r[6] is not None},
+        }
+
+
+def _counts(statuses) -> Dict[str, int]:
+    counts = {"correct": 0, "partial": 0, "result_wrong": 0, "wrong": 0}
+    for status in statuses:
+        if status == "正确":
+            counts["correct"] += 1
+        elif status == "过程部分正确":
+            counts["partial"] += 1
+        elif status == "答案正确结果错误":
+            counts["result_wrong"] += 1
+        else:
+            counts["wrong"] += 1
+    return counts
+
+
+def wide_row(student: Dict, qkeys: Sequence[str]) -> List:
+    """宽表的一行（不含作业列）"""
+    questions = student["questions"]
+    counts = _counts(questions.values())
+    return [
+        student["student_name"], student["student_id"], len(questions),
+        counts["correct"], counts["partial"], counts["result_wrong"], counts["wrong"],
+        student["grade"],
+    ] + [questions.get(k, "") for k in qkeys]
+
+
+def write_summary_excel(db: Session, assignment_ids: Sequence[int], output_path: Path) -> Path:
+    """将一个或多个作业的逐题结果写入Excel（write-only模式，常量内存）"""
+    from openpyxl import Workbook
+
+    keys_by_assignment = get_question_keys(db, assignment_ids)
+    qkeys = sorted({k for keys in keys_by_assignment.values() for k in keys})
+    multi = len(assignment_ids) > 1
+
+    workbook = Workbook(write_only=True)
+    wide = workbook.create_sheet("汇总(宽表)")
+    long = workbook.create_sheet("明细(长表)")
+
+    prefix_cols = ASSIGNMENT_COLS if multi else []
+    wide.append(prefix_cols + BASE_COLS + [f"Q:{k}" for k in qkeys])
+    long.append(prefix_cols + ["student_name", "student_id", "key", "status", "grade"])
+
+    for student in iter_student_rows(db, assignment_ids):
+        prefix = [student["assignment_id"], student["assignment_title"]] if multi else []
+        wide.append(prefix + wide_row(student, qkeys))
+        questions = student["questions"]
+        for key in keys_by_assignment.get(student["assignment_id"], []):
+            long.append(prefix + [
+                student["student_name"], student["student_id"], key,
+                questions.get(key, ""), student["grade"]
+            ])
+
+    workbook.save(output_path)
+    return output_path
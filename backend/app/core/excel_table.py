@@ -0,0 +1,86 @@
+"""
+在线表格的列式数据格式
+
+宽表按列返回：列名只出现一次，逐题状态编码为状态字典中的下标（小整数）。
+完整表格按数据版本缓存，请求时再按行分页、按列投影，响应体积与所选行列成正比。
+
+    {
+        "columns": ["student_name", ..., "Q:§2.5 T1", ...],
+        "status_dictionary": ["", "正确", "过程部分正确", "答案正确结果错误", "错误"],
+        "encoded_columns": ["Q:§2.5 T1", ...],   # 这些列的值是状态字典下标
+        "data": [[...第1列...], [...第2列...], ...],
+        "total_rows": 120, "offset": 0, "limit": 50
+    }
+"""
+from typing import Dict, List, Optional, Sequence
+
+from sqlalchemy.orm import Session
+
+from app.core.excel_stream import BASE_COLS, get_question_keys, iter_student_rows, wide_row
+
+# 常见状态预先编码，未知状态追加在后面
+STATUS_DICTIONARY = ["", "正确", "过程部分正确", "答案正确结果错误", "错误"]
+
+
+class ColumnarTable:
+    """一个作业的完整宽表（列式存储）"""
+
+    def __init__(self, columns: List[str], encoded_columns: List[str],
+                 status_dictionary: List[str], data: List[list]):
+        self.columns = columns
+        self.encoded_columns = encoded_columns
+        self.status_dictionary = status_dictionary
+        self.data = data
+        self._index = {c: i for i, c in enumerate(columns)}
+
+    @property
+    def total_rows(self) -> int:
+        return len(self.data[0]) if self.data else 0
+
+    def resolve_columns(self, names: Optional[Sequence[str]]) -> List[str]:
+        """校验并返回投影的列（保持请求中的顺序）；未指定时返回全部列"""
+        if not names:
+            return list(self.columns)
+        unknown = [n for n in names if n not in self._index]
+        if unknown:
+            raise ValueError(f"不存在的列: {', '.join(unknown)}")
+        return list(dict.fromkeys(names))
+
+    def page(self, offset: int, limit: Optional[int], columns: List[str]) -> Dict:
+        end = None if limit is None else offset + limit
+        encoded = set(self.encoded_columns)
+        return {
+            "columns": columns,
+            "status_dictionary": self.status_dictionary,
+            "encoded_columns": [c for c in columns if c in encoded],
+            "data": [self.data[self._index[c]][offset:end] for c in columns],
+            "total_rows": self.total_rows,
+            "offset": offset,
+            "limit": limit,
+        }
+
+
+def build_columnar_table(db: Session, assignment_id: int) -> ColumnarTable:
+    """从逐题记录构建宽表（与Excel汇总表的列和取值一致）"""
+    qkeys = get_question_keys(db, [assignment_id]).get(assignment_id, [])
+    qcols = [f"Q:{k}" for k in qkeys]
+    columns = BASE_COLS + qcols
+
+    dictionary = list(STATUS_DICTIONARY)
+    codes = {s: i for i, s in enumerate(dictionary)}
+    data: List[list] = [[] for _ in columns]
+    base_count = len(BASE_COLS)
+
+    for student in iter_student_rows(db, [assignment_id]):
+        row = wide_row(student, qkeys)
+        for i in range(base_count):
+            data[i].append(row[i])
+        for i in range(base_count, len(columns)):
+            status = row[i]
+            code = codes.get(status)
+            if code is None:
+                code = codes[status] = len(dictionary)
+                dictionary.append(status)
+            data[i].append(code)
+
+    return ColumnarTable(columns, qcols, dictionary, data)
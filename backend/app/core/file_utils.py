@@ -1,9 +1,15 @@
 """
 文件路径工具函数
 """
+import os
 import re
 from pathlib import Path
 
+# 上传文件根目录（所有模块共用，可通过环境变量 UPLOAD_DIR 指定）
+UPLOAD_DIR = Path(os.getenv("UPLOAD_DIR", "uploads"))
+SUBMISSIONS_DIR = UPLOAD_DIR / "submissions"
+TEACHERS_DIR = UPLOAD_DIR / "teachers"
+
 def sanitize_filename(name: str, max_length: int = 100) -> str:
     """
     清理文件名，去除特殊字符，保留中文、英文、数字、下划线、连字符
@@ -53,3 +59,13 @@ def get_assignment_dir_name(assignment_title: str, assignment_id: int) -> str:
     sanitized_name = sanitize_filename(assignment_title)
     return f"{sanitized_name}_{assignment_id}"
 
+
+def get_teacher_assignment_dir(teacher, assignment) -> Path:
+    """获取教师作业目录：uploads/teachers/{teacher_name}_{teacher_id}/assignments/{assignment_title}_{assignment_id}/"""
+    teacher_dir = get_teacher_dir_name(teacher.username, teacher.id)
+    assignment_dir = get_assignment_dir_name(assignment.title, assignment.id)
+    return TEACHERS_DIR / teacher_dir / "assignments" / assignment_dir
+
+def get_submission_dir(assignment, student) -> Path:
+    """获取学生提交的结果目录（批改报告、JSON）：uploads/submissions/{class_id}/{assignment_id}/{学号}-{姓名}/"""
+    return SUBMISSIONS_DIR / assignment.class_id / str(assignment.id) / f"{student.student_id}-{student.username}"
@@ -1,12 +1,11 @@
 import os
 from pathlib import Path
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
+import logging
 import time
 import random
 
-load_dotenv()
+# google.genai 导入较慢（约0.6秒），在各函数内首次调用模型时才导入，不拖慢Web/Worker进程启动
 
 # 强制使用 Gemini API（避免误走 Vertex）
 for k in ("GOOGLE_GENAI_USE_VERTEXAI", "GOOGLE_CLOUD_PROJECT", "GOOGLE_CLOUD_LOCATION"):
@@ -16,16 +15,52 @@ API_KEY = os.getenv("GEMINI_API_KEY", "")
 MODEL_PRO = "gemini-2.5-pro"
 MODEL_FLASH = "gemini-2.5-flash"
 
+logger = logging.getLogger(__name__)
+
+
+def _is_transient(e: Exception) -> bool:
+    """是否为临时性错误（服务过载、连接中断、速率限制），可退避后重试"""
+    msg = str(e)
+    return (
+        "503" in msg
+        or "UNAVAILABLE" in msg.upper()
+        or "overloaded" in msg.lower()
+        or "Server disconnected without sending a response" in msg
+        or "429" in msg  # 速率限制
+        or "RESOURCE_EXHAUSTED" in msg.upper()
+    )
+
+
+def _with_retry(fn, attempts: int = 5):
+    """
+    执行一次模型调用，遇到临时错误时指数退避重试（第1次等待1-2秒，之后2-3、4-5、8-9秒……）
+    非临时性错误或已达到最大次数时抛出原异常
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if not _is_transient(e) or attempt >= attempts - 1:
+                raise
+            wait_time = (2 ** attempt) + random.random()
+            logger.warning(f"Gemini API临时错误，等待 {wait_time:.1f} 秒后重试（第 {attempt + 1}/{attempts} 次）: {e}")
+            time.sleep(wait_time)
+
 def get_client():
     """获取Gemini客户端"""
+    from google import genai
+    from google.genai import types
+
     # 每次调用时重新加载环境变量，确保使用最新的API密钥
     load_dotenv(override=True)
     api_key = os.getenv("GEMINI_API_KEY", "")
     if not api_key:
         raise ValueError("GEMINI_API_KEY未设置，请在.env文件中配置")
+    # GEMINI_BASE_URL 可指向兼容的本地服务（如压测用的 benchmarks/fake_gemini.py）
+    base_url = os.getenv("GEMINI_BASE_URL") or None
     return genai.Client(
         api_key=api_key,
-        http_options=types.HttpOptions(api_version="v1", timeout=600_000),
+        http_options=types.HttpOptions(api_version="v1", timeout=600_000, base_url=base_url),
     )
 
 def extract_qa_from_pdf(pdf_path: Path, teacher_msg: str) -> str:
@@ -33,6 +68,8 @@ def extract_qa_from_pdf(pdf_path: Path, teacher_msg: str) -> str:
     从PDF中提取题目和答案（对应QA提取.py）
     包含自动重试机制，处理API过载等临时错误
     """
+    from google.genai import types
+
     if not pdf_path.exists() or pdf_path.suffix.lower() != ".pdf":
         raise ValueError(f"未找到PDF文件：{pdf_path}")
     
@@ -62,45 +99,8 @@ def extract_qa_from_pdf(pdf_path: Path, teacher_msg: str) -> str:
             ),
         )
     
-    # 重试机制：最多重试5次，使用指数退避
-    resp = None
-    last_error = None
-    for attempt in range(5):
-        try:
-            resp = generate_once()
-            break
-        except Exception as e:
-            last_error = e
-            msg = str(e)
-            # 判断是否为临时性错误（可重试）
-            transient = (
-                "503" in msg
-                or "UNAVAILABLE" in msg.upper()
-                or "overloaded" in msg.lower()
-                or "The model is overloaded" in msg
-                or "Server disconnected without sending a response" in msg
-                or "429" in msg  # 速率限制
-                or "RESOURCE_EXHAUSTED" in msg.upper()
-            )
-            
-            if transient and attempt < 4:
-                # 指数退避：第1次等待2-3秒，第2次4-5秒，第3次8-9秒，第4次16-17秒
-                wait_time = (2 ** attempt) + random.random()
-                print(f"API过载，等待 {wait_time:.1f} 秒后重试（第 {attempt + 1}/5 次）...")
-                time.sleep(wait_time)
-                continue
-            else:
-                # 非临时性错误或已达到最大重试次数
-                raise
-    
-    if resp is None:
-        error_msg = str(last_error) if last_error else "未知错误"
-        if "503" in error_msg or "overloaded" in error_msg.lower():
-            raise ValueError(
-                "Gemini API当前过载，请稍后重试。"
-                "如果问题持续，可能是API配额已用完或服务暂时不可用。"
-            )
-        raise ValueError(f"提取答案失败: {error_msg}")
+    # 临时错误（过载、限流）最多重试5次，使用指数退避
+    resp = _with_retry(generate_once)
     
     md = (resp.text or "").strip()
     if not md:
@@ -112,6 +112,8 @@ def grade_homework(pdf_path: Path, answer_md_path: Path) -> str:
     """
     批改学生作业（对应作业批改-作业报告生成.py）
     """
+    from google.genai import types
+
     if not pdf_path.exists() or pdf_path.suffix.lower() != ".pdf":
         raise ValueError(f"未找到PDF文件：{pdf_path}")
     if not answer_md_path.exists():
@@ -151,23 +153,7 @@ def grade_homework(pdf_path: Path, answer_md_path: Path) -> str:
             ),
         )
     
-    resp = None
-    for attempt in range(5):
-        try:
-            resp = generate_once()
-            break
-        except Exception as e:
-            msg = str(e)
-            transient = (
-                "503" in msg
-                or "UNAVAILABLE" in msg.upper()
-                or "overloaded" in msg.lower()
-                or "Server disconnected without sending a response" in msg
-            )
-            if transient and attempt < 4:
-                time.sleep((2 ** attempt) + random.random())
-                continue
-            raise
+    resp = _with_retry(generate_once)
     
     md = (resp.text or "").strip() if resp else ""
     if not md:
@@ -179,6 +165,8 @@ def extract_json_from_report(md_text: str) -> dict:
     """
     从批改报告中提取JSON数据（对应同学报告提取json格式.py）
     """
+    from google.genai import types
+
     SYSTEM_TEXT = (
         "你将收到一份 Markdown 报告，第二部分是「逐题批改简报」。\n"
         "请从该部分中为每一题抽取：章节（如「§2.5」）、题号（原样，如「T6」）、正确性标签。\n"
@@ -202,19 +190,7 @@ def extract_json_from_report(md_text: str) -> dict:
         )
         return (resp.text or "").strip()
     
-    text = ""
-    for attempt in range(4):
-        try:
-            text = _once()
-            break
-        except Exception as e:
-            msg = str(e)
-            transient = "503" in msg or "UNAVAILABLE" in msg.upper() \
-                        or "Server disconnected without sending a response" in msg
-            if transient and attempt < 3:
-                time.sleep((2 ** attempt) + random.random())
-                continue
-            raise
+    text = _with_retry(_once, attempts=4)
     
     if not text:
         return {"questions": []}
@@ -268,10 +244,36 @@ def extract_json_from_report(md_text: str) -> dict:
     
     return data
 
+# 全班学情报告的五个部分（单次生成与分块汇总共用）
+CLASS_REPORT_OUTLINE = (
+    "## 一、整体情况概览\n"
+    "- 提交情况统计（已提交人数、未提交人数）\n"
+    "- 整体完成度分析\n"
+    "- 平均正确率\n\n"
+    "## 二、题目完成情况分析\n"
+    "- 按题目统计完成情况（已作答/未作答）\n"
+    "- 各题目的正确率\n"
+    "- 高频错误题目识别\n\n"
+    "## 三、常见错误分析\n"
+    "- 总结学生普遍出现的错误类型\n"
+    "- 识别知识薄弱点\n"
+    "- 提供教学建议\n\n"
+    "## 四、重点关注学生\n"
+    "- 列出需要重点关注的学生（未提交、错误率高等）\n"
+    "- 简要说明关注原因\n\n"
+    "## 五、教学建议\n"
+    "- 基于学情分析，提供针对性的教学建议\n"
+    "- 建议重点讲解的知识点\n"
+    "- 建议的复习和巩固措施\n\n"
+    "请确保报告结构清晰、数据准确、建议具有可操作性。\n"
+)
+
 def generate_class_report(combined_md_path: Path) -> str:
     """
     生成全班学情报告（汇总所有学生的批改报告后生成）
     """
+    from google.genai import types
+
     if not combined_md_path.exists():
         raise ValueError(f"未找到汇总的MD文件：{combined_md_path}")
     
@@ -282,26 +284,7 @@ def generate_class_report(combined_md_path: Path) -> str:
         "1) 学生作业 OCR 结果\n"
         "2) 逐题批改简报\n\n"
         "请基于这些批改报告，生成一份**全班学情分析报告**，包含以下内容：\n\n"
-        "## 一、整体情况概览\n"
-        "- 提交情况统计（已提交人数、未提交人数）\n"
-        "- 整体完成度分析\n"
-        "- 平均正确率\n\n"
-        "## 二、题目完成情况分析\n"
-        "- 按题目统计完成情况（已作答/未作答）\n"
-        "- 各题目的正确率\n"
-        "- 高频错误题目识别\n\n"
-        "## 三、常见错误分析\n"
-        "- 总结学生普遍出现的错误类型\n"
-        "- 识别知识薄弱点\n"
-        "- 提供教学建议\n\n"
-        "## 四、重点关注学生\n"
-        "- 列出需要重点关注的学生（未提交、错误率高等）\n"
-        "- 简要说明关注原因\n\n"
-        "## 五、教学建议\n"
-        "- 基于学情分析，提供针对性的教学建议\n"
-        "- 建议重点讲解的知识点\n"
-        "- 建议的复习和巩固措施\n\n"
-        "请确保报告结构清晰、数据准确、建议具有可操作性。\n"
+        + CLASS_REPORT_OUTLINE
     )
     
     client = get_client()
@@ -317,23 +300,7 @@ def generate_class_report(combined_md_path: Path) -> str:
             ),
         )
     
-    resp = None
-    for attempt in range(5):
-        try:
-            resp = generate_once()
-            break
-        except Exception as e:
-            msg = str(e)
-            transient = (
-                "503" in msg
-                or "UNAVAILABLE" in msg.upper()
-                or "overloaded" in msg.lower()
-                or "Server disconnected without sending a response" in msg
-            )
-            if transient and attempt < 4:
-                time.sleep((2 ** attempt) + random.random())
-                continue
-            raise
+    resp = _with_retry(generate_once)
     
     md = (resp.text or "").strip() if resp else ""
     if not md:
@@ -341,3 +308,82 @@ def generate_class_report(combined_md_path: Path) -> str:
     
     return md
 
+
+def _generate_text(model: str, contents: list, max_output_tokens: int, attempts: int = 5) -> str:
+    """调用模型并返回文本，遇到临时错误时指数退避重试"""
+    from google.genai import types
+
+    client = get_client()
+
+    def generate_once():
+        return client.models.generate_content(
+            model=model,
+            contents=contents,
+            config=types.GenerateContentConfig(
+                temperature=0.0,
+                max_output_tokens=max_output_tokens,
+            ),
+        )
+
+    resp = _with_retry(generate_once, attempts=attempts)
+    return (resp.text or "").strip()
+
+def summarize_report_chunk(chunk_md: str) -> str:
+    """
+    分块汇总（map阶段）：将一组学生的逐题批改简报压缩为结构化摘要，使用Flash模型
+    """
+    SYSTEM_TEXT = (
+        "【系统指令】\n"
+        "你将收到一组学生的「逐题批改简报」，每位学生以「### 学生 N: 姓名 (ID: x)」开头。\n"
+        "请输出这组学生的结构化摘要（Markdown），供后续与其他组合并，不要写总结性评价：\n\n"
+        "### 人数\n"
+        "- 本组学生人数\n\n"
+        "### 逐题统计\n"
+        "- 表格：题目 | 正确 | 过程部分正确 | 答案正确结果错误 | 错误 | 未作答（填人数）\n\n"
+        "### 常见错误\n"
+        "- 每条写明题目、错误类型、出现人数，以及一句典型错误描述\n\n"
+        "### 需要关注的学生\n"
+        "- 姓名（ID）：原因（如错误题目多、未作答多）\n\n"
+        "数字必须来自简报原文，不要估算。\n"
+    )
+    text = _generate_text(MODEL_FLASH, [SYSTEM_TEXT, chunk_md], max_output_tokens=8192)
+    if not text:
+        raise ValueError("模型未返回分块摘要")
+    return text
+
+def reduce_class_report(assignment_title: str, chunk_summaries: list, student_count: int) -> str:
+    """
+    合并分块摘要（reduce阶段）：根据各组的结构化摘要生成全班学情报告
+    """
+    SYSTEM_TEXT = (
+        "【系统指令】\n"
+        f"你将收到作业「{assignment_title}」全班 {student_count} 名已批改学生的分组摘要，"
+        f"共 {len(chunk_summaries)} 组。每组包含人数、逐题统计、常见错误和需要关注的学生。\n"
+        "请将各组的逐题人数相加得到全班数据，合并相同的错误类型，"
+        "生成一份**全班学情分析报告**，包含以下内容：\n\n"
+        + CLASS_REPORT_OUTLINE
+    )
+    parts = [f"## 第 {i} 组\n\n{summary}" for i, summary in enumerate(chunk_summaries, start=1)]
+    md = _generate_text(MODEL_PRO, [SYSTEM_TEXT, "\n\n".join(parts)], max_output_tokens=32000)
+    if not md:
+        raise ValueError("模型未返回内容，请检查文件是否正常")
+    return md
+
+def generate_grounded_class_report(assignment_title: str, stats_md: str, excerpts_md: str) -> str:
+    """
+    基于本地统计数据生成全班学情报告：数字已计算好，模型只负责分析与建议
+    """
+    SYSTEM_TEXT = (
+        "【系统指令】\n"
+        f"你将收到作业「{assignment_title}」的全班统计数据（已由系统精确计算）"
+        "以及错误率最高题目的抽样学生评语片段。\n"
+        "报告中的所有数字必须直接引用统计数据，不要重新计算或估算；"
+        "错误类型和知识薄弱点请结合抽样片段归纳。\n"
+        "请生成一份**全班学情分析报告**，包含以下内容：\n\n"
+        + CLASS_REPORT_OUTLINE
+    )
+    content = f"## 统计数据\n\n{stats_md}\n\n## 抽样错误片段\n\n{excerpts_md or '（无）'}\n"
+    md = _generate_text(MODEL_PRO, [SYSTEM_TEXT, content], max_output_tokens=16000)
+    if not md:
+        raise ValueError("模型未返回内容，请检查文件是否正常")
+    return md
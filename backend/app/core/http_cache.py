@@ -0,0 +1,100 @@
+"""
+HTTP条件请求（ETag / Last-Modified）
+
+接口根据数据版本生成ETag，客户端带 If-None-Match / If-Modified-Since 再次请求时，
+数据未变化则直接返回304，不再重新生成内容。
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+from app.core.ttl_cache import TTLCache
+
+# 允许浏览器缓存，但每次使用前都必须向服务器验证
+CACHE_CONTROL = "private, no-cache"
+
+# 压缩中间件为压缩后的表示追加的ETag后缀（如 "abc-gzip"），比较时视为同一版本
+ENCODING_ETAG_SUFFIXES = ("-gzip", "-br")
+
+# 文件内容摘要缓存：按（路径, 修改时间, 大小）缓存，文件未变化时不重新读取
+_digest_cache = TTLCache(maxsize=4096, ttl=3600)
+
+
+def make_etag(*parts) -> str:
+    """由版本信息生成强ETag"""
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
+
+
+def file_digest(path: Path) -> str:
+    """文件内容的SHA-256摘要"""
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    digest = _digest_cache.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        _digest_cache.set(key, digest)
+    return digest
+
+
+def to_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    """数据库中的无时区时间按UTC处理，并去掉微秒（HTTP日期只精确到秒）"""
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).replace(microsecond=0)
+
+
+def cache_headers(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    last_modified = to_utc(last_modified)
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified, usegmt=True)
+    return headers
+
+
+def _strip_etag(etag: str) -> str:
+    """去掉 W/ 前缀（GET请求使用弱比较）和压缩后缀"""
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    for suffix in ENCODING_ETAG_SUFFIXES:
+        if etag.endswith(suffix + '"'):
+            return etag[:-len(suffix) - 1] + '"'
+    return etag
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    bare = _strip_etag(etag)
+    return any(_strip_etag(c.strip()) == bare for c in if_none_match.split(","))
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """按RFC 9110：有 If-None-Match 时只比较ETag，否则比较 If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = to_utc(last_modified)
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return last_modified <= to_utc(since)
+    return False
+
+
+def not_modified_response(etag: str, last_modified: Optional[datetime] = None) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, last_modified))
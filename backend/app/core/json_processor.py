@@ -52,6 +52,17 @@ def parse_name_id_from_filename(path: Path) -> tuple:
     sid = m.group(1) if m else ""
     return stem, sid
 
+def question_key(q: Dict) -> str:
+    """获取题目键，兼容两种结构：新（key+status）和旧（section+id+status）"""
+    if q.get("key"):
+        return str(q["key"]).strip()
+    raw_id = str(q.get("id", "")).strip()
+    qid = re.sub(r"[^0-9A-Za-z\.\-]", "", raw_id) or raw_id
+    section_raw = str(q.get("section", "")).strip()
+    sec_num = re.sub(r"[^0-9\.]", "", section_raw)
+    section = f"§{sec_num}" if sec_num else ""
+    return f"{section} {qid}".strip()
+
 def process_report_to_json(md_text: str, student_name: str, student_id: str, raw_questions: List[Dict]) -> dict:
     """
     处理从Gemini提取的原始问题数据，生成标准JSON格式
@@ -0,0 +1,245 @@
+"""
+归档包（zstd压缩）的读写
+
+已关闭作业的批改报告、JSON等小文件被打包为目录下的单个归档包 archive.zpack，原文件删除。
+读取报告的代码通过本模块的 exists / read_bytes / read_text / digest / glob 访问文件：
+磁盘上存在时直接读取磁盘（归档后重新生成的文件优先），否则在所在目录或上级目录的归档包中查找。
+
+归档包格式：
+    [条目数据...][zstd字典][索引（zstd压缩的JSON）][索引偏移 8字节][索引长度 8字节][MAGIC 8字节]
+每个条目单独压缩为一个zstd帧，可以随机读取；相似的报告共用一个训练出的字典以提高压缩率。
+索引记录每个条目（相对于归档包所在目录的路径）的偏移、长度、原始大小和SHA-256。
+"""
+import fnmatch
+import hashlib
+import json
+import os
+import struct
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import zstandard
+
+from app.core.http_cache import file_digest
+from app.core.ttl_cache import TTLCache
+
+PACK_NAME = "archive.zpack"
+MAGIC = b"ZPACK001"
+FOOTER = struct.Struct("<QQ8s")
+ZSTD_LEVEL = int(os.getenv("ARCHIVE_ZSTD_LEVEL", "19"))
+DICT_SIZE = 112 * 1024
+# 条目数达到该数量时训练字典
+DICT_MIN_SAMPLES = 8
+# 向上查找归档包的最大层数（报告位于归档目录下的 学生目录/文件 或 class_reports/文件）
+MAX_LOOKUP_DEPTH = 3
+
+
+@dataclass
+class PackEntry:
+    offset: int
+    length: int
+    size: int
+    sha256: str
+
+
+@dataclass
+class PackIndex:
+    entries: Dict[str, PackEntry]
+    dict_data: Optional[bytes]
+
+    def decompressor(self) -> zstandard.ZstdDecompressor:
+        if self.dict_data:
+            return zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(self.dict_data))
+        return zstandard.ZstdDecompressor()
+
+
+# 索引缓存：按（路径, inode, 修改时间, 大小）缓存，归档包被替换后自动失效
+_index_cache = TTLCache(maxsize=1024, ttl=3600)
+
+
+def _read_index(f, stat: os.stat_result) -> PackIndex:
+    f.seek(stat.st_size - FOOTER.size)
+    index_offset, index_length, magic = FOOTER.unpack(f.read(FOOTER.size))
+    if magic != MAGIC:
+        raise ValueError("不是有效的归档包")
+    f.seek(index_offset)
+    raw = json.loads(zstandard.ZstdDecompressor().decompress(f.read(index_length)))
+    dict_data = None
+    if raw.get("dict"):
+        f.seek(raw["dict"][0])
+        dict_data = f.read(raw["dict"][1])
+    entries = {name: PackEntry(*values) for name, values in raw["entries"].items()}
+    return PackIndex(entries, dict_data)
+
+
+def _load_index(f, pack_path: Path) -> PackIndex:
+    stat = os.fstat(f.fileno())
+    key = (str(pack_path), stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    index = _index_cache.get(key)
+    if index is None:
+        index = _read_index(f, stat)
+        _index_cache.set(key, index)
+    return index
+
+
+def read_pack_index(pack_path: Path) -> PackIndex:
+    with open(pack_path, "rb") as f:
+        return _load_index(f, pack_path)
+
+
+def _pack_for_dir(directory: Path) -> Optional[Tuple[Path, str]]:
+    """查找覆盖 directory 的归档包，返回（归档包所在目录, directory 相对该目录的前缀）"""
+    pack_dir, prefix = directory, ""
+    for _ in range(MAX_LOOKUP_DEPTH):
+        if (pack_dir / PACK_NAME).is_file():
+            return pack_dir, prefix
+        if pack_dir == pack_dir.parent:
+            return None
+        prefix = f"{pack_dir.name}/{prefix}"
+        pack_dir = pack_dir.parent
+    return None
+
+
+def _entries_for_dir(directory: Path) -> Tuple[Optional[Path], str, Dict[str, PackEntry]]:
+    located = _pack_for_dir(directory)
+    if located is None:
+        return None, "", {}
+    pack_dir, prefix = located
+    try:
+        return pack_dir, prefix, read_pack_index(pack_dir / PACK_NAME).entries
+    except (OSError, ValueError):
+        return None, "", {}
+
+
+def _find_entry(path: Path) -> Optional[Tuple[Path, str, PackEntry]]:
+    """在归档包中查找文件，返回（归档包路径, 条目名, 条目）"""
+    pack_dir, prefix, entries = _entries_for_dir(path.parent)
+    name = prefix + path.name
+    entry = entries.get(name)
+    return (pack_dir / PACK_NAME, name, entry) if entry else None
+
+
+def exists(path: Path) -> bool:
+    """文件（或目录）在磁盘上或归档包中存在"""
+    path = Path(path)
+    if path.exists():
+        return True
+    if _find_entry(path) is not None:
+        return True
+    _, prefix, entries = _entries_for_dir(path)
+    return any(name.startswith(prefix) for name in entries)
+
+
+def is_archived(path: Path) -> bool:
+    """文件只存在于归档包中"""
+    path = Path(path)
+    return not path.exists() and _find_entry(path) is not None
+
+
+def read_bytes(path: Path) -> bytes:
+    path = Path(path)
+    try:
+        return path.read_bytes()
+    except FileNotFoundError:
+        found = _find_entry(path)
+        if found is None:
+            raise
+    pack_path, name, _ = found
+    with open(pack_path, "rb") as f:
+        # 从同一个文件句柄读取索引和条目，归档包在此期间被替换也不会错位
+        index = _load_index(f, pack_path)
+        entry = index.entries.get(name)
+        if entry is None:
+            raise FileNotFoundError(str(path))
+        f.seek(entry.offset)
+        return index.decompressor().decompress(f.read(entry.length), max_output_size=entry.size)
+
+
+def read_text(path: Path, encoding: str = "utf-8") -> str:
+    return read_bytes(path).decode(encoding)
+
+
+def digest(path: Path) -> str:
+    """文件内容的SHA-256（归档的文件直接取索引中记录的值）"""
+    path = Path(path)
+    try:
+        return file_digest(path)
+    except FileNotFoundError:
+        found = _find_entry(path)
+        if found is None:
+            raise
+        return found[2].sha256
+
+
+def glob(directory: Path, pattern: str, recursive: bool = False) -> List[Path]:
+    """目录下文件名匹配 pattern 的文件（磁盘和归档包合并，按路径排序）"""
+    directory = Path(directory)
+    found = set()
+    if directory.is_dir():
+        candidates = directory.rglob(pattern) if recursive else directory.glob(pattern)
+        found.update(p for p in candidates if p.is_file())
+
+    pack_dir, prefix, entries = _entries_for_dir(directory)
+    for name in entries:
+        if not name.startswith(prefix):
+            continue
+        rest = name[len(prefix):]
+        if ("/" in rest and not recursive) or not fnmatch.fnmatch(PurePosixPath(rest).name, pattern):
+            continue
+        found.add(pack_dir / name)
+    return sorted(found)
+
+
+def write_pack(pack_path: Path, files: Iterable[Tuple[str, bytes]]) -> PackIndex:
+    """将（相对路径, 内容）写入新的归档包（先写临时文件再原子替换）"""
+    files = list(files)
+    dict_data = None
+    if len(files) >= DICT_MIN_SAMPLES:
+        try:
+            dict_data = zstandard.train_dictionary(DICT_SIZE, [data for _, data in files]).as_bytes()
+        except zstandard.ZstdError:
+            dict_data = None
+    compressor = zstandard.ZstdCompressor(
+        level=ZSTD_LEVEL,
+        dict_data=zstandard.ZstdCompressionDict(dict_data) if dict_data else None
+    )
+
+    entries: Dict[str, PackEntry] = {}
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=pack_path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for name, data in files:
+                frame = compressor.compress(data)
+                entries[name] = PackEntry(f.tell(), len(frame), len(data), hashlib.sha256(data).hexdigest())
+                f.write(frame)
+            index = {"version": 1, "dict": None,
+                     "entries": {n: [e.offset, e.length, e.size, e.sha256] for n, e in entries.items()}}
+            if dict_data:
+                index["dict"] = [f.tell(), len(dict_data)]
+                f.write(dict_data)
+            index_offset = f.tell()
+            index_bytes = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(
+                json.dumps(index, ensure_ascii=False).encode("utf-8")
+            )
+            f.write(index_bytes)
+            f.write(FOOTER.pack(index_offset, len(index_bytes), MAGIC))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, pack_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    return PackIndex(entries, dict_data)
+
+
+def iter_pack(pack_path: Path) -> Iterable[Tuple[str, bytes]]:
+    """逐个读出归档包中的条目（重新打包时使用）"""
+    with open(pack_path, "rb") as f:
+        index = _read_index(f, os.fstat(f.fileno()))
+        decompressor = index.decompressor()
+        for name, entry in index.entries.items():
+            f.seek(entry.offset)
+            yield name, decompressor.decompress(f.read(entry.length), max_output_size=entry.size)
@@ -0,0 +1,95 @@
+"""
+列表接口的游标（keyset）分页
+
+游标编码了上一页最后一行的排序值和ID，下一页从该位置继续查询，
+查询成本与翻页深度无关。下一页游标通过响应头 X-Next-Cursor 返回，
+响应体保持原有的列表格式；总数由单独的 count 接口提供。
+"""
+import base64
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Query
+
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort: str, value: Any, last_id: int) -> str:
+    raw = json.dumps([sort, value, last_id], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_sort, value, last_id = json.loads(base64.urlsafe_b64decode(padded))
+        if cursor_sort != sort or not isinstance(last_id, int):
+            raise ValueError("cursor does not match sort")
+        return value, last_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+
+def parse_sort(sort: str, sort_fields: Dict[str, Any]) -> Tuple[str, bool]:
+    """解析排序参数，如 "created_at" 或 "-grade"（降序），返回(字段名, 是否降序)"""
+    descending = sort.startswith("-")
+    name = sort[1:] if descending else sort
+    if name not in sort_fields:
+        raise HTTPException(
+            status_code=400,
+            detail=f"不支持的排序字段: {name}，可选: {', '.join(sort_fields)}"
+        )
+    return name, descending
+
+
+def paginate(
+    query: Query,
+    id_column,
+    sort: str,
+    sort_fields: Dict[str, Any],
+    cursor: Optional[str],
+    limit: Optional[int],
+    response: Response,
+) -> List[Any]:
+    """
+    按排序字段和ID进行keyset分页
+
+    sort_fields 将排序名映射到排序表达式；None 表示按ID排序
+    （ID与创建顺序一致，created_at 排序即使用ID）。
+    不传 limit 时返回全部结果，保持与旧客户端兼容。
+    """
+    name, descending = parse_sort(sort, sort_fields)
+    sort_expr = sort_fields[name]
+
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if sort_expr is None:
+            query = query.filter(id_column < last_id if descending else id_column > last_id)
+        elif descending:
+            query = query.filter(or_(sort_expr < value, and_(sort_expr == value, id_column < last_id)))
+        else:
+            query = query.filter(or_(sort_expr > value, and_(sort_expr == value, id_column > last_id)))
+
+    order = []
+    if sort_expr is not None:
+        order.append(sort_expr.desc() if descending else sort_expr.asc())
+    order.append(id_column.desc() if descending else id_column.asc())
+    query = query.order_by(*order)
+
+    if limit is None:
+        return query.all()
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if sort_expr is None:
+            value = None
+        else:
+            # 排序值从查询本身取回，避免与数据库中的格式不一致
+            value = query.session.query(sort_expr).filter(id_column == last.id).scalar()
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(sort, value, last.id)
+    return rows
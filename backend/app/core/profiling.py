@@ -0,0 +1,217 @@
+"""
+按请求的性能分析与慢请求日志
+
+ProfilingMiddleware 做两件事：
+1. 慢请求日志：每个请求统计耗时、SQL次数和SQL耗时（SQLAlchemy引擎事件），超过 SLOW_REQUEST_MS
+   的请求以 WARNING 记录到 app.slow_requests（含路由模板、状态码）。
+2. 采样分析：被选中的请求在执行期间由后台线程定时采样调用栈，结束后写出 collapsed stack 格式的文件
+   （每行 "帧;帧;帧 次数"，可直接用 flamegraph.pl、speedscope 等生成火焰图），响应头 X-Profile-File 给出文件名。
+   选中方式：
+   - 请求头 X-Profile 的值等于配置的 PROFILING_TOKEN（只有持有该令牌的管理员可以触发）；
+   - 或 PROFILING_ENABLED=true 时按 PROFILING_SAMPLE_RATE 的比例抽样。
+
+采样只用标准库（sys._current_frames），事件循环线程上只记录包含本请求调用链的栈；
+线程池中的栈（asyncio.to_thread、同步接口）无法区分所属请求，以 "thread:名称" 为根一并记录，
+并发较高时可能混入其他请求的工作。
+"""
+import contextvars
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("app.slow_requests")
+
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "1000"))
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "1.0"))
+PROFILING_INTERVAL = float(os.getenv("PROFILING_INTERVAL", "0.005"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "profiles"))
+
+PROFILE_HEADER = b"x-profile"
+# 栈顶为这些文件时线程处于空闲等待，不计入采样
+IDLE_FILES = ("threading.py", "queue.py", "selectors.py", "thread.py")
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    seconds: float = 0.0
+
+
+_query_stats: contextvars.ContextVar[Optional[QueryStats]] = contextvars.ContextVar("query_stats", default=None)
+
+
+def install_query_hooks(engine: Engine) -> None:
+    """在引擎上注册SQL计时事件（结果计入当前请求的 QueryStats）"""
+    if getattr(engine, "_profiling_hooks", False):
+        return
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("query_start")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        stats = _query_stats.get()
+        if stats is not None:
+            stats.count += 1
+            stats.seconds += elapsed
+
+    engine._profiling_hooks = True
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """在后台线程中定时采样调用栈，按 collapsed stack 格式汇总"""
+
+    def __init__(self, anchor_frame, interval: float = PROFILING_INTERVAL):
+        self.anchor_frame = anchor_frame
+        self.loop_thread = threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            self.samples += 1
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                if ident == self.loop_thread:
+                    stack = self._request_stack(frame)
+                else:
+                    if Path(frame.f_code.co_filename).name in IDLE_FILES:
+                        continue
+                    if ident not in names:
+                        names = {t.ident: t.name for t in threading.enumerate()}
+                    stack = [f"thread:{names.get(ident, ident)}"] + self._full_stack(frame)
+                if stack:
+                    self.stacks[";".join(stack)] += 1
+
+    def _request_stack(self, frame) -> list:
+        """事件循环线程上本请求的调用栈（从中间件开始）；正在执行其他请求时返回空"""
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            if frame is self.anchor_frame:
+                return [_frame_label(f) for f in reversed(frames)]
+            frame = frame.f_back
+        return []
+
+    @staticmethod
+    def _full_stack(frame) -> list:
+        frames = []
+        while frame is not None:
+            frames.append(_frame_label(frame))
+            frame = frame.f_back
+        return list(reversed(frames))
+
+    def write(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def _route_path(scope: Scope) -> str:
+    """请求的路由模板（路径参数替换为 {名称}），便于按接口汇总日志"""
+    path = scope.get("path", "")
+    params = {str(v): k for k, v in (scope.get("path_params") or {}).items()}
+    if not params:
+        return path
+    return "/".join(f"{{{params[seg]}}}" if seg in params else seg for seg in path.split("/"))
+
+
+def _profile_filename(method: str, path: str) -> str:
+    slug = re.sub(r"[^0-9A-Za-z]+", "_", path).strip("_") or "root"
+    return f"{datetime.now():%Y%m%d-%H%M%S-%f}-{method}-{slug[:80]}.collapsed"
+
+
+class ProfilingMiddleware:
+    def __init__(self, app: ASGIApp, engine: Optional[Engine] = None):
+        self.app = app
+        if engine is not None:
+            install_query_hooks(engine)
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if PROFILING_TOKEN:
+            for name, value in scope.get("headers", []):
+                if name == PROFILE_HEADER:
+                    return hmac.compare_digest(value.decode("latin-1"), PROFILING_TOKEN)
+        return PROFILING_ENABLED and random.random() < PROFILING_SAMPLE_RATE
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _query_stats.set(stats)
+        sampler = None
+        profile_name = ""
+        if self._should_profile(scope):
+            sampler = StackSampler(sys._getframe())
+            profile_name = _profile_filename(scope["method"], scope.get("path", ""))
+        status_code = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                if sampler is not None:
+                    MutableHeaders(scope=message)["X-Profile-File"] = profile_name
+            await send(message)
+
+        start = time.perf_counter()
+        if sampler is not None:
+            sampler.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            _query_stats.reset(token)
+            route = _route_path(scope)
+            if sampler is not None:
+                sampler.stop()
+                sampler.write(PROFILE_DIR / profile_name)
+            if elapsed_ms >= SLOW_REQUEST_MS:
+                logger.warning(
+                    f"慢请求 {scope['method']} {route} {status_code} {elapsed_ms:.0f}ms，"
+                    f"SQL {stats.count} 次 {stats.seconds * 1000:.0f}ms"
+                    + (f"，分析文件 {profile_name}" if sampler is not None else "")
+                )
@@ -0,0 +1,114 @@
+"""
+报告文件的预压缩与直接发送
+
+批改报告写入时同时生成 .gz（以及安装了brotli时的 .br）压缩副本。
+报告接口按 Accept-Encoding 选择压缩副本，通过 FileResponse 直接分块发送文件
+（支持Range），不再把报告读入内存、包装进JSON再逐次压缩。
+旧报告没有压缩副本时在首次访问时补齐。已归档（打包进归档包）的报告解压后返回。
+"""
+import asyncio
+import gzip
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+from app.core import pack_archive
+from app.core.compression import brotli, negotiate_encoding
+from app.core.http_cache import cache_headers, file_digest, is_not_modified, make_etag
+
+MARKDOWN_MEDIA_TYPE = "text/markdown; charset=utf-8"
+SIDECAR_SUFFIXES = {"gzip": ".gz", "br": ".br"}
+
+
+def _sidecar(path: Path, encoding: str) -> Path:
+    return path.with_name(path.name + SIDECAR_SUFFIXES[encoding])
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=path.parent)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def write_sidecars(path: Path) -> None:
+    """为报告生成压缩副本"""
+    data = path.read_bytes()
+    _atomic_write(_sidecar(path, "gzip"), gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        _atomic_write(_sidecar(path, "br"), brotli.compress(data, quality=11))
+
+
+def write_report(path: Path, content: str) -> None:
+    """写入报告及其压缩副本"""
+    path.write_text(content, encoding="utf-8")
+    write_sidecars(path)
+
+
+def _fresh_sidecar(path: Path, encoding: Optional[str]) -> Optional[Path]:
+    """与原文件同步的压缩副本；原文件在副本之后被修改过则视为过期"""
+    if encoding is None:
+        return None
+    sidecar = _sidecar(path, encoding)
+    try:
+        if sidecar.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+            return sidecar
+    except FileNotFoundError:
+        pass
+    return None
+
+
+async def _select_file(path: Path, accept_encoding: str) -> Tuple[Path, Optional[str]]:
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None:
+        return path, None
+    sidecar = _fresh_sidecar(path, encoding)
+    if sidecar is None:
+        await asyncio.to_thread(write_sidecars, path)
+        sidecar = _fresh_sidecar(path, encoding)
+    return (sidecar, encoding) if sidecar is not None else (path, None)
+
+
+async def _archived_response(request: Request, path: Path) -> Response:
+    """归档包中的报告：ETag与归档前相同，内容解压后返回（由压缩中间件按需压缩）"""
+    etag = make_etag(pack_archive.digest(path))
+    if is_not_modified(request, etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+    content = await asyncio.to_thread(pack_archive.read_bytes, path)
+    return Response(content, media_type=MARKDOWN_MEDIA_TYPE, headers=cache_headers(etag))
+
+
+async def report_file_response(request: Request, path: Path, filename: Optional[str] = None) -> Response:
+    """发送报告文件：强ETag（内容摘要），未变化返回304，支持Range"""
+    if pack_archive.is_archived(path):
+        return await _archived_response(request, path)
+    path_to_send, encoding = await _select_file(path, request.headers.get("accept-encoding", ""))
+    etag = make_etag(file_digest(path))
+    if encoding:
+        etag = etag[:-1] + f'-{encoding}"'
+
+    if is_not_modified(request, etag):
+        headers = cache_headers(etag)
+        headers["Vary"] = "Accept-Encoding"
+        return Response(status_code=304, headers=headers)
+
+    headers = cache_headers(etag)
+    headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return FileResponse(
+        str(path_to_send),
+        media_type=MARKDOWN_MEDIA_TYPE,
+        headers=headers,
+        filename=filename,
+        content_disposition_type="inline",
+    )
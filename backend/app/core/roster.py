@@ -0,0 +1,104 @@
+"""
+班级花名册解析（CSV / XLSX）
+支持的列名：姓名/name/username、学号/student_id、初始密码/密码/password
+"""
+import csv
+import io
+from dataclasses import dataclass
+from typing import List, Optional
+
+# 列名别名（小写比较）
+COLUMN_ALIASES = {
+    "username": ("姓名", "name", "username", "student_name"),
+    "student_id": ("学号", "student_id", "student id", "sid"),
+    "password": ("初始密码", "密码", "password", "initial_password"),
+}
+
+
+@dataclass
+class RosterRow:
+    row: int  # 文件中的行号（含表头，从1开始）
+    username: str
+    student_id: str
+    password: str
+
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    # Excel中的数字学号会被读成浮点数
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _map_header(header: List[str]) -> dict:
+    normalized = [h.strip().lower() for h in header]
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for idx, name in enumerate(normalized):
+            if name in aliases:
+                mapping[field] = idx
+                break
+    missing = [f for f in COLUMN_ALIASES if f not in mapping]
+    if missing:
+        raise ValueError(
+            "花名册缺少必要的列：" + "、".join(COLUMN_ALIASES[f][0] for f in missing)
+        )
+    return mapping
+
+
+def _read_csv(content: bytes) -> List[List[str]]:
+    for encoding in ("utf-8-sig", "gbk"):
+        try:
+            text = content.decode(encoding)
+            break
+        except UnicodeDecodeError:
+            continue
+    else:
+        raise ValueError("无法识别CSV文件编码，请使用UTF-8保存")
+    return [row for row in csv.reader(io.StringIO(text))]
+
+
+def _read_xlsx(content: bytes) -> List[List[str]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        return [[_cell(v) for v in row] for row in sheet.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+
+def parse_roster(filename: Optional[str], content: bytes) -> List[RosterRow]:
+    """解析花名册文件，返回数据行（跳过空行）"""
+    name = (filename or "").lower()
+    if name.endswith(".xlsx"):
+        table = _read_xlsx(content)
+    elif name.endswith(".csv"):
+        table = _read_csv(content)
+    else:
+        raise ValueError("仅支持CSV或XLSX格式的花名册")
+
+    if not table:
+        raise ValueError("花名册为空")
+    mapping = _map_header([_cell(h) for h in table[0]])
+
+    rows = []
+    for line_no, values in enumerate(table[1:], start=2):
+        values = [_cell(v) for v in values]
+        if not any(values):
+            continue
+
+        def get(field):
+            idx = mapping[field]
+            return values[idx] if idx < len(values) else ""
+
+        rows.append(RosterRow(
+            row=line_no,
+            username=get("username"),
+            student_id=get("student_id"),
+            password=get("password"),
+        ))
+    return rows
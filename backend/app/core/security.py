@@ -1,30 +1,63 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import User
+from sqlalchemy.orm import Session, make_transient_to_detached
+from dataclasses import dataclass
+from app.database import get_db, SessionLocal
+from app.models import User, UserRole
+from app.core.user_cache import user_cache, cache_user
 import os
-from dotenv import load_dotenv
-
-load_dotenv()
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7天
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt 成本参数；修改后，已有用户会在下次登录时按新参数重新哈希
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 密码哈希线程池大小（bcrypt 计算时释放GIL，线程可以并行）
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# 密码哈希在有界线程池中执行，避免每次 200~300ms 的CPU计算阻塞事件循环
+_hash_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS,
+    thread_name_prefix="password-hash"
+)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+async def hash_password_async(password: str) -> str:
+    """在哈希线程池中计算密码哈希"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_hash_executor, get_password_hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    在哈希线程池中校验密码
+    返回: (是否正确, 新哈希)；哈希参数与当前配置不一致时新哈希非空，调用方应保存
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _hash_executor, pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -35,7 +68,30 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str = Depends(oauth2_scheme)) -> str:
+@dataclass(frozen=True)
+class TokenIdentity:
+    """
+    从JWT声明中得到的用户身份（无需查询数据库）
+    属性名与 User 一致，只需要角色/班级/ID判断的路由可直接替代 User 使用
+    """
+    id: int
+    username: str
+    role: UserRole
+    class_id: str
+
+def create_user_token(user: User) -> str:
+    """签发包含用户ID、角色和班级的访问令牌"""
+    return create_access_token(
+        data={
+            "sub": user.username,
+            "uid": user.id,
+            "role": user.role.value,
+            "class_id": user.class_id,
+        },
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+
+def verify_token(token: str = Depends(oauth2_scheme)) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="无效的认证凭据",
@@ -46,16 +102,59 @@ def verify_token(token: str = Depends(oauth2_scheme)) -> str:
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
-        return username
+        return payload
     except JWTError:
         raise credentials_exception
 
+def _load_user_snapshot(db: Session, payload: dict) -> dict:
+    """从缓存或数据库获取用户快照；旧令牌只有 sub，按用户名查询"""
+    user_id = payload.get("uid")
+    if user_id is not None:
+        snapshot = user_cache.get(user_id)
+        if snapshot is not None:
+            return snapshot
+        user = db.query(User).filter(User.id == user_id).first()
+    else:
+        user = db.query(User).filter(User.username == payload["sub"]).first()
+    if user is None or user.username != payload["sub"]:
+        raise HTTPException(status_code=404, detail="用户不存在")
+    return cache_user(user)
+
+def get_current_identity(payload: dict = Depends(verify_token)) -> TokenIdentity:
+    """
+    只需要角色/班级判断的路由使用：直接信任令牌中的声明，不访问数据库。
+    进程内有该用户的缓存时以缓存为准（用户信息变更后缓存会失效重建）。
+    """
+    user_id = payload.get("uid")
+    snapshot = user_cache.get(user_id) if user_id is not None else None
+    if snapshot is None and (user_id is None or "role" not in payload or "class_id" not in payload):
+        # 旧令牌缺少声明，回退到数据库查询
+        db = SessionLocal()
+        try:
+            snapshot = _load_user_snapshot(db, payload)
+        finally:
+            db.close()
+    if snapshot is not None:
+        return TokenIdentity(
+            id=snapshot["id"],
+            username=snapshot["username"],
+            role=snapshot["role"],
+            class_id=snapshot["class_id"],
+        )
+    return TokenIdentity(
+        id=user_id,
+        username=payload["sub"],
+        role=UserRole(payload["role"]),
+        class_id=payload["class_id"],
+    )
+
 def get_current_user(
-    username: str = Depends(verify_token),
+    payload: dict = Depends(verify_token),
     db: Session = Depends(get_db)
 ) -> User:
-    user = db.query(User).filter(User.username == username).first()
-    if user is None:
-        raise HTTPException(status_code=404, detail="用户不存在")
-    return user
-
+    """获取当前用户（ORM对象）；缓存命中时不查询数据库"""
+    snapshot = _load_user_snapshot(db, payload)
+    user = User(**snapshot)
+    make_transient_to_detached(user)
+    # load=False：直接将缓存的状态附加到当前会话，未缓存的列（如密码哈希）在访问时再加载
+    return db.merge(user, load=False)
@@ -0,0 +1,280 @@
+"""
+文件存储后端（按内容寻址）
+
+学生作业PDF等上传文件通过存储后端保存，键为内容的SHA-256，相同的文件只保存一份。
+数据库中保存的引用形如 blob://ab/cd/abcd....pdf；旧数据中的本地文件路径仍可直接读取。
+
+通过环境变量 STORAGE_BACKEND 选择后端：
+- local（默认）：保存在 {UPLOAD_DIR}/blobs 下；
+- s3：S3兼容的对象存储（S3_BUCKET、S3_PREFIX、S3_ENDPOINT_URL、S3_REGION，
+  凭据使用boto3的标准环境变量），可用本地MinIO测试；多台Web节点无需共享文件系统。
+  boto3 是可选依赖，不在 requirements.txt 中，需另行安装：pip install -r requirements-s3.txt；
+- memory：进程内存，仅用于测试。
+"""
+import hashlib
+import os
+from abc import ABC, abstractmethod
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, Optional
+
+from app.core.file_utils import UPLOAD_DIR
+
+BLOB_SCHEME = "blob://"
+CHUNK_SIZE = 1024 * 1024
+# 超过该大小时边哈希边写入临时文件，不整体载入内存
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+def blob_key(digest: str, suffix: str = "") -> str:
+    """按哈希前缀分两级目录，避免单个目录下文件过多"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{suffix}"
+
+
+def is_blob_ref(ref: str) -> bool:
+    return ref.startswith(BLOB_SCHEME)
+
+
+class BlobStorage(ABC):
+    """存储后端基类：子类实现按键读写（缺少任一抽象方法时无法实例化），引用解析与旧路径兼容在这里处理"""
+
+    def put_file(self, fileobj: BinaryIO, suffix: str = "") -> str:
+        """保存文件内容并返回引用；内容已存在时不重复写入"""
+        sha = hashlib.sha256()
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sha.update(chunk)
+                spool.write(chunk)
+            key = blob_key(sha.hexdigest(), suffix)
+            if not self._exists(key):
+                spool.seek(0)
+                self._write(key, spool)
+        return BLOB_SCHEME + key
+
+    def put_bytes(self, data: bytes, suffix: str = "") -> str:
+        return self.put_file(BytesIO(data), suffix)
+
+    def read_bytes(self, ref: str) -> bytes:
+        if is_blob_ref(ref):
+            return self._read(ref[len(BLOB_SCHEME):])
+        return Path(ref).read_bytes()
+
+    def open(self, ref: str) -> BinaryIO:
+        """以二进制流打开内容（用于分块读取）"""
+        if is_blob_ref(ref):
+            return self._open(ref[len(BLOB_SCHEME):])
+        return Path(ref).open("rb")
+
+    def exists(self, ref: str) -> bool:
+        if is_blob_ref(ref):
+            return self._exists(ref[len(BLOB_SCHEME):])
+        return Path(ref).exists()
+
+    def size(self, ref: str) -> int:
+        if is_blob_ref(ref):
+            return self._size(ref[len(BLOB_SCHEME):])
+        return Path(ref).stat().st_size
+
+    def filesystem_path(self, ref: str) -> Optional[Path]:
+        """内容在本地文件系统中的路径（可直接用FileResponse发送）；对象存储返回None"""
+        if is_blob_ref(ref):
+            return None
+        return Path(ref)
+
+    @contextmanager
+    def local_path(self, ref: str, suffix: str = "") -> Iterator[Path]:
+        """需要文件路径的场景（如调用Gemini）：本地文件直接返回，否则下载到临时文件"""
+        path = self.filesystem_path(ref)
+        if path is not None:
+            yield path
+            return
+        fd, tmp_path = tempfile.mkstemp(suffix=suffix or Path(ref).suffix)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.read_bytes(ref))
+            yield Path(tmp_path)
+        finally:
+            os.unlink(tmp_path)
+
+    @abstractmethod
+    def _write(self, key: str, fileobj: BinaryIO) -> None:
+        ...
+
+    @abstractmethod
+    def _read(self, key: str) -> bytes:
+        ...
+
+    def _open(self, key: str) -> BinaryIO:
+        return BytesIO(self._read(key))
+
+    @abstractmethod
+    def _exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def _size(self, key: str) -> int:
+        ...
+
+
+class LocalBlobStorage(BlobStorage):
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, key: str) -> Path:
+        return self.root / key
+
+    def _write(self, key: str, fileobj: BinaryIO) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=path.parent)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(fileobj, f, CHUNK_SIZE)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def _read(self, key: str) -> bytes:
+        return self._path(key).read_bytes()
+
+    def _open(self, key: str) -> BinaryIO:
+        return self._path(key).open("rb")
+
+    def _exists(self, key: str) -> bool:
+        return self._path(key).exists()
+
+    def _size(self, key: str) -> int:
+        return self._path(key).stat().st_size
+
+    def filesystem_path(self, ref: str) -> Optional[Path]:
+        if is_blob_ref(ref):
+            return self._path(ref[len(BLOB_SCHEME):])
+        return Path(ref)
+
+
+class InMemoryBlobStorage(BlobStorage):
+    """进程内存中的存储（测试用）"""
+
+    def __init__(self):
+        self._data: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _write(self, key: str, fileobj: BinaryIO) -> None:
+        data = fileobj.read()
+        with self._lock:
+            self._data[key] = data
+
+    def _read(self, key: str) -> bytes:
+        try:
+            return self._data[key]
+        except KeyError:
+            raise FileNotFoundError(key)
+
+    def _exists(self, key: str) -> bool:
+        return key in self._data
+
+    def _size(self, key: str) -> int:
+        return len(self._read(key))
+
+
+class S3BlobStorage(BlobStorage):
+    """S3兼容的对象存储（AWS S3、MinIO等）"""
+
+    def __init__(self, bucket: str, prefix: str = "", endpoint_url: Optional[str] = None,
+                 region: Optional[str] = None):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("使用S3存储需要安装boto3：pip install -r requirements-s3.txt")
+        self.bucket = bucket
+        self.prefix = prefix.strip("/") + "/" if prefix.strip("/") else ""
+        self.client = boto3.client("s3", endpoint_url=endpoint_url or None, region_name=region or None)
+
+    def _object_key(self, key: str) -> str:
+        return self.prefix + key
+
+    def _head(self, key: str) -> Optional[dict]:
+        from botocore.exceptions import ClientError
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def _write(self, key: str, fileobj: BinaryIO) -> None:
+        self.client.upload_fileobj(fileobj, self.bucket, self._object_key(key))
+
+    def _read(self, key: str) -> bytes:
+        body = self._open(key)
+        try:
+            return body.read()
+        finally:
+            body.close()
+
+    def _open(self, key: str) -> BinaryIO:
+        from botocore.exceptions import ClientError
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=self._object_key(key))
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise FileNotFoundError(key)
+            raise
+        return obj["Body"]
+
+    def _exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def _size(self, key: str) -> int:
+        head = self._head(key)
+        if head is None:
+            raise FileNotFoundError(key)
+        return head["ContentLength"]
+
+
+_storage: Optional[BlobStorage] = None
+_storage_lock = threading.Lock()
+
+
+def create_storage(backend: Optional[str] = None) -> BlobStorage:
+    backend = (backend or os.getenv("STORAGE_BACKEND", "local")).lower()
+    if backend == "local":
+        return LocalBlobStorage(UPLOAD_DIR / "blobs")
+    if backend == "memory":
+        return InMemoryBlobStorage()
+    if backend == "s3":
+        bucket = os.getenv("S3_BUCKET", "")
+        if not bucket:
+            raise ValueError("S3_BUCKET未设置")
+        return S3BlobStorage(
+            bucket,
+            prefix=os.getenv("S3_PREFIX", ""),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL"),
+            region=os.getenv("S3_REGION"),
+        )
+    raise ValueError(f"未知的存储后端: {backend}")
+
+
+def get_storage() -> BlobStorage:
+    """当前进程使用的存储后端（首次调用时按环境变量创建）"""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+
+def set_storage(storage: Optional[BlobStorage]) -> None:
+    """替换存储后端（测试时使用InMemoryBlobStorage）"""
+    global _storage
+    _storage = storage
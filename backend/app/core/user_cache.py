@@ -0,0 +1,37 @@
+"""
+已认证用户的进程内缓存
+
+缓存用户列值的快照（不含密码哈希），按用户ID索引，避免每个请求都查询 users 表。
+通过ORM修改或删除用户时自动失效；绕过ORM的批量更新需要手动调用 invalidate_user。
+"""
+import os
+from typing import Any, Dict
+
+from sqlalchemy import event
+
+from app.core.ttl_cache import TTLCache
+from app.models import User
+
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "4096"))
+
+# 缓存的列（密码哈希不进入缓存，需要时由ORM按需加载）
+_SNAPSHOT_COLUMNS = ("id", "username", "role", "class_id", "student_id", "created_at")
+
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+
+def cache_user(user: User) -> Dict[str, Any]:
+    snapshot = {name: getattr(user, name) for name in _SNAPSHOT_COLUMNS}
+    user_cache.set(user.id, snapshot)
+    return snapshot
+
+
+def invalidate_user(user_id: int) -> None:
+    user_cache.pop(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_change(mapper, connection, target: User) -> None:
+    invalidate_user(target.id)
@@ -0,0 +1,77 @@
+"""
+流式生成ZIP
+
+zipfile 写入一个不可seek的缓冲区（条目使用数据描述符记录CRC和大小），每写入一块就把缓冲区中的
+字节交给响应发送。不生成临时文件，内存占用只与单块大小有关，与条目数量和总大小无关。
+PDF、xlsx等本身已压缩的内容使用 stored 条目，不再重复deflate。
+"""
+import logging
+import time
+import zipfile
+from contextlib import closing
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class _Sink:
+    """zipfile的输出目标：暂存写入的数据，由生成器取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+@dataclass
+class ZipMember:
+    arcname: str
+    opener: Callable[[], BinaryIO]  # 生成到该条目时才打开内容
+    compress: bool = True
+    size: Optional[int] = None  # 已知大小时用于判断是否需要ZIP64
+
+
+def _drain(sink: _Sink) -> Iterator[bytes]:
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def stream_zip(members: Iterable[ZipMember]) -> Iterator[bytes]:
+    """逐块生成ZIP内容；打开失败（文件已不存在）的条目跳过"""
+    sink = _Sink()
+    archive = zipfile.ZipFile(sink, "w")
+    date_time = time.localtime()[:6]
+    for member in members:
+        try:
+            src = member.opener()
+        except FileNotFoundError:
+            logger.warning(f"导出时文件不存在，已跳过: {member.arcname}")
+            continue
+        zinfo = zipfile.ZipInfo(member.arcname, date_time=date_time)
+        zinfo.compress_type = zipfile.ZIP_DEFLATED if member.compress else zipfile.ZIP_STORED
+        if member.size is not None:
+            zinfo.file_size = member.size
+        with closing(src), archive.open(zinfo, "w") as dst:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                dst.write(chunk)
+                yield from _drain(sink)
+        yield from _drain(sink)
+    archive.close()
+    yield from _drain(sink)
@@ -1,10 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import auth, assignments, students, teachers
-from app.database import engine, Base
+from app.routers import auth, assignments, students, teachers, analytics
+from app.database import engine
+from app.core.compression import CompressionMiddleware
+from app.core.profiling import ProfilingMiddleware
 
-# 创建数据库表
-Base.metadata.create_all(bind=engine)
+# 导入时不做建表等数据库结构操作，部署或升级后先执行 python -m app.migrate
 
 app = FastAPI(title="AI作业批改助手", version="1.0.0")
 
@@ -15,13 +16,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Last-Modified", "X-Profile-File", "Upload-Offset", "Upload-Length"],
 )
 
+# 压缩JSON和文本响应（br / gzip）
+app.add_middleware(CompressionMiddleware)
+
+# 慢请求日志（含SQL次数和耗时）与按需采样分析（X-Profile 请求头或 PROFILING_ENABLED）
+app.add_middleware(ProfilingMiddleware, engine=engine)
+
 # 注册路由
 app.include_router(auth.router, prefix="/api/auth", tags=["认证"])
 app.include_router(assignments.router, prefix="/api/assignments", tags=["作业"])
 app.include_router(students.router, prefix="/api/students", tags=["学生"])
 app.include_router(teachers.router, prefix="/api/teachers", tags=["教师"])
+app.include_router(analytics.router, prefix="/api/teachers/analytics", tags=["学情分析"])
 
 @app.get("/")
 async def root():
@@ -33,8 +42,20 @@ async def health():
 
 @app.on_event("startup")
 async def startup_event():
-    """启动时开始批改Worker"""
+    """启动时检查数据库结构，开始批改Worker（GRADING_IN_WEB 关闭时不启动），并恢复中断的全班报告任务"""
     import asyncio
+    import logging
+    from app.migrate import pending_migrations
     from app.services.grading_worker import start_grading_worker
+    from app.services.class_report_jobs import resume_stale_jobs
+    pending = pending_migrations()
+    if pending:
+        logging.getLogger(__name__).error(f"数据库结构有 {len(pending)} 项变更未执行，请先运行 python -m app.migrate")
     asyncio.create_task(start_grading_worker())
+    resume_stale_jobs()
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """停止批改Worker，未完成的批改重新入队"""
+    from app.services.grading_worker import stop_grading_worker
+    await stop_grading_worker()
@@ -0,0 +1,103 @@
+"""
+数据库结构迁移
+
+导入应用时不再自动建表，部署或升级后显式执行一次（run.py 启动开发服务器前会自动执行）：
+
+    python -m app.migrate [--dry-run]
+
+依次：创建缺失的表；为已存在的表补充模型中新增的列（ALTER TABLE ADD COLUMN）；
+补建缺失的索引（create_all 不会为已存在的表补建新增的列和索引）。
+新增列必须可为空或带有 server_default，否则无法为已有数据补列，需要手工迁移；
+新增的唯一索引与已有的重复数据冲突时迁移整体回滚，需先处理重复数据。
+"""
+import logging
+from typing import List, Optional
+
+from sqlalchemy import inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from app.database import Base, engine as default_engine
+
+logger = logging.getLogger(__name__)
+
+
+def _load_models() -> None:
+    import app.models  # noqa: F401  注册所有模型
+
+
+def _add_column_sql(engine: Engine, table, column) -> str:
+    preparer = engine.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=engine.dialect)
+    sql = f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+    if column.server_default is not None:
+        default = column.server_default.arg
+        default_sql = default.compile(dialect=engine.dialect) if hasattr(default, "compile") else f"'{default}'"
+        sql += f" DEFAULT {default_sql}"
+    if not column.nullable:
+        sql += " NOT NULL"
+    return sql
+
+
+def pending_migrations(engine: Optional[Engine] = None) -> List[str]:
+    """尚未执行的结构变更（SQL语句列表）"""
+    _load_models()
+    engine = engine or default_engine
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    statements: List[str] = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            statements.append(str(CreateTable(table).compile(dialect=engine.dialect)).strip())
+            statements.extend(str(CreateIndex(index).compile(dialect=engine.dialect)) for index in table.indexes)
+            continue
+        existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing_columns:
+                continue
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(f"无法自动为 {table.name} 补充非空且无默认值的列 {column.name}，请手工迁移")
+            statements.append(_add_column_sql(engine, table, column))
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        statements.extend(
+            str(CreateIndex(index).compile(dialect=engine.dialect))
+            for index in table.indexes if index.name not in existing_indexes
+        )
+    return statements
+
+
+def migrate(engine: Optional[Engine] = None, dry_run: bool = False) -> List[str]:
+    """执行全部待执行的结构变更，返回执行的SQL语句"""
+    engine = engine or default_engine
+    statements = pending_migrations(engine)
+    if dry_run or not statements:
+        return statements
+    with engine.begin() as conn:
+        for sql in statements:
+            logger.info(sql)
+            try:
+                conn.exec_driver_sql(sql)
+            except IntegrityError as e:
+                raise RuntimeError(f"已有数据与新增的唯一约束冲突，请先处理重复数据后再迁移：{sql}") from e
+    return statements
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="数据库结构迁移")
+    parser.add_argument("--dry-run", action="store_true", help="只列出待执行的变更")
+    args = parser.parse_args(argv)
+
+    statements = migrate(dry_run=args.dry_run)
+    if not statements:
+        print("数据库结构已是最新")
+        return
+    for sql in statements:
+        print(sql.rstrip() + ";")
+    print(f"{'待执行' if args.dry_run else '已执行'} {len(statements)} 条变更")
+
+
+if __name__ == "__main__":
+    main()
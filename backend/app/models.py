@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, Index, JSON, Enum as SQLEnum
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -20,6 +20,14 @@ class SubmissionStatus(str, enum.Enum):
     FAILED = "failed"  # 批改失败
     PUBLISHED = "published"  # 已发布给学生
 
+class ClassReportJobStatus(str, enum.Enum):
+    PENDING = "pending"  # 排队中
+    COLLECTING = "collecting"  # 汇总学生报告
+    SUMMARIZING = "summarizing"  # 模型生成中
+    WRITING = "writing"  # 保存报告
+    COMPLETED = "completed"  # 已完成
+    FAILED = "failed"  # 失败
+
 class User(Base):
     __tablename__ = "users"
     
@@ -27,10 +35,21 @@ class User(Base):
     username = Column(String, unique=True, index=True, nullable=False)  # 学生姓名（student_name）
     password_hash = Column(String, nullable=False)
     role = Column(SQLEnum(UserRole), nullable=False)
-    class_id = Column(String, nullable=False)  # 班级ID（从邀请码提取）
+    class_id = Column(String, nullable=False, index=True)  # 班级ID（从邀请码提取）
     student_id = Column(String, nullable=True)  # 学号（仅学生需要）
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
+    __table_args__ = (
+        # 学生的学号唯一（教师没有学号）；并发注册时由数据库保证不会重复
+        Index(
+            "uq_users_student_id",
+            "student_id",
+            unique=True,
+            sqlite_where=role == UserRole.STUDENT,
+            postgresql_where=role == UserRole.STUDENT,
+        ),
+    )
+    
     # 关系
     assignments = relationship("Assignment", back_populates="teacher", foreign_keys="Assignment.teacher_id")
     submissions = relationship("Submission", back_populates="student")
@@ -40,8 +59,8 @@ class Assignment(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
-    teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    class_id = Column(String, nullable=False)
+    teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    class_id = Column(String, nullable=False, index=True)
     status = Column(SQLEnum(AssignmentStatus), default=AssignmentStatus.DRAFT)
     answer_file_path = Column(String)  # 标准答案文件路径
     answer_content = Column(Text)  # 标准答案内容（校对后的）
@@ -57,17 +76,95 @@ class Submission(Base):
     __tablename__ = "submissions"
     
     id = Column(Integer, primary_key=True, index=True)
-    assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False)
-    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False, index=True)
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     homework_file_path = Column(String, nullable=False)  # 学生作业PDF路径
     report_file_path = Column(String)  # 批改报告MD路径
     json_file_path = Column(String)  # JSON数据路径
     status = Column(SQLEnum(SubmissionStatus), default=SubmissionStatus.PENDING)
     grade = Column(String)  # 等级（A+, A, B等）
+    lease_token = Column(String)  # 批改租约（Worker领取时生成），租约失效后该Worker的结果不再写入
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
     # 关系
     assignment = relationship("Assignment", back_populates="submissions")
     student = relationship("User", back_populates="submissions")
+    questions = relationship("SubmissionQuestion", back_populates="submission", cascade="all, delete-orphan")
 
+class SubmissionQuestion(Base):
+    """逐题批改结果（与JSON文件中的questions对应）"""
+    __tablename__ = "submission_questions"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    submission_id = Column(Integer, ForeignKey("submissions.id"), nullable=False, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False, index=True)
+    key = Column(String, nullable=False)  # 题目键，如 §2.5 T6
+    status = Column(String, nullable=False)  # 正确/过程部分正确/答案正确结果错误/错误
+    
+    submission = relationship("Submission", back_populates="questions")
+
+class AssignmentStatsAggregate(Base):
+    """作业学情统计汇总，在提交批改时增量更新"""
+    __tablename__ = "assignment_stats"
+    
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), primary_key=True)
+    submitted_count = Column(Integer, nullable=False, default=0)
+    grade_points_total = Column(Integer, nullable=False, default=0)  # 用于计算平均等级
+    grade_points_count = Column(Integer, nullable=False, default=0)
+    grade_distribution = Column(JSON, nullable=False, default=dict)  # {等级: 人数}
+    question_stats = Column(JSON, nullable=False, default=dict)  # {题目: {correct, partial, wrong, total}}
+    low_score_students = Column(JSON, nullable=False, default=list)
+    version = Column(Integer, nullable=False, default=0)  # 每次变更递增
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ClassReportJob(Base):
+    __tablename__ = "class_report_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False, index=True)
+    teacher_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(SQLEnum(ClassReportJobStatus), default=ClassReportJobStatus.PENDING, nullable=False)
+    active = Column(Boolean, default=True, nullable=False)  # 进行中（每个作业最多一个）
+    runner_id = Column(String)  # 当前执行该任务的进程标识
+    heartbeat_at = Column(DateTime)  # 最近一次心跳（UTC），用于识别中断的任务
+    error = Column(Text)
+    report_path = Column(String)  # 生成的报告路径
+    timestamp = Column(String)  # 报告时间戳（与class_reports目录中的文件名对应）
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    
+    __table_args__ = (
+        # 同一作业同时只允许一个进行中的任务，重复点击会复用已有任务
+        Index(
+            "uq_class_report_jobs_active",
+            "assignment_id",
+            unique=True,
+            sqlite_where=active.is_(True),
+            postgresql_where=active.is_(True),
+        ),
+    )
+    
+    assignment = relationship("Assignment")
+
+
+class UploadSession(Base):
+    """可续传的分块上传（学生作业PDF）；完成后创建提交记录"""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String, primary_key=True)  # 随机ID，用于上传地址
+    student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False)
+    idempotency_key = Column(String)  # 客户端提供，重复创建时返回同一个上传
+    filename = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)  # 文件总字节数
+    offset = Column(Integer, nullable=False, default=0)  # 已接收的字节数
+    submission_id = Column(Integer, ForeignKey("submissions.id"))  # 完成后创建的提交
+    created_at = Column(DateTime, server_default=func.now())  # UTC
+    updated_at = Column(DateTime, onupdate=func.now())
+    
+    __table_args__ = (
+        Index("uq_upload_sessions_idempotency", "student_id", "idempotency_key", unique=True),
+        Index("ix_upload_sessions_created_at", "created_at"),
+    )
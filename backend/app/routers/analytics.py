@@ -0,0 +1,58 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from app.database import get_db
+from app.models import User, Assignment, UserRole
+from app.core.security import get_current_identity, TokenIdentity
+from app.services.analytics import student_trend, section_heatmap, at_risk_students
+import asyncio
+
+router = APIRouter()
+
+def _check_teacher_class(db: Session, class_id: str, current_user: TokenIdentity) -> None:
+    """只有在该班级布置过作业的教师可以查看班级学情"""
+    if current_user.role.value != "teacher":
+        raise HTTPException(status_code=403, detail="只有教师可以查看学情分析")
+
+    has_assignment = db.query(Assignment.id).filter(
+        Assignment.teacher_id == current_user.id,
+        Assignment.class_id == class_id
+    ).first()
+    if not has_assignment:
+        raise HTTPException(status_code=403, detail="无权查看此班级")
+
+@router.get("/students/{student_id}/trend")
+async def get_student_trend(
+    student_id: int,
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """学生在各次作业中的等级、正确率及变化趋势"""
+    if current_user.role.value != "teacher":
+        raise HTTPException(status_code=403, detail="只有教师可以查看学情分析")
+
+    student = db.query(User).filter(User.id == student_id, User.role == UserRole.STUDENT).first()
+    if not student:
+        raise HTTPException(status_code=404, detail="学生不存在")
+    _check_teacher_class(db, student.class_id, current_user)
+
+    return await asyncio.to_thread(student_trend, db, current_user.id, student)
+
+@router.get("/classes/{class_id}/sections")
+async def get_section_heatmap(
+    class_id: str,
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """班级各章节在各次作业中的平均得分（热力图数据）"""
+    _check_teacher_class(db, class_id, current_user)
+    return await asyncio.to_thread(section_heatmap, db, current_user.id, class_id)
+
+@router.get("/classes/{class_id}/at-risk")
+async def get_at_risk_students(
+    class_id: str,
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """风险学生列表（最近成绩偏低、成绩下降或多次未提交）"""
+    _check_teacher_class(db, class_id, current_user)
+    return await asyncio.to_thread(at_risk_students, db, current_user.id, class_id)
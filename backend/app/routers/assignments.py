@@ -1,27 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Response
 from sqlalchemy.orm import Session
-from pathlib import Path
 import os
 from app.database import get_db
 from app.models import User, Assignment, AssignmentStatus
 from app.schemas import AssignmentCreate, AssignmentUpdate, AssignmentResponse, AssignmentDetail, AnswerUpdate
-from app.core.security import get_current_user
+from app.core.security import get_current_user, get_current_identity, TokenIdentity
 from app.core.gemini_client import extract_qa_from_pdf
+from app.core.pagination import paginate, MAX_PAGE_SIZE
+from app.core.file_utils import get_teacher_assignment_dir
+from app.services.dashboard import invalidate_dashboard
 from typing import List, Optional
 
 router = APIRouter()
 
-# 文件存储目录
-UPLOAD_DIR = Path("uploads")
-TEACHERS_DIR = UPLOAD_DIR / "teachers"
-
-def get_teacher_assignment_dir(teacher: "User", assignment: "Assignment") -> Path:
-    """获取教师作业目录：uploads/teachers/{teacher_name}_{teacher_id}/assignments/{assignment_title}_{assignment_id}/"""
-    from app.core.file_utils import get_teacher_dir_name, get_assignment_dir_name
-    teacher_dir = get_teacher_dir_name(teacher.username, teacher.id)
-    assignment_dir = get_assignment_dir_name(assignment.title, assignment.id)
-    return TEACHERS_DIR / teacher_dir / "assignments" / assignment_dir
-
 @router.post("/", response_model=AssignmentResponse)
 async def create_assignment(
     assignment_data: AssignmentCreate,
@@ -41,6 +32,7 @@ async def create_assignment(
     db.add(assignment)
     db.commit()
     db.refresh(assignment)
+    invalidate_dashboard(current_user.id)
     return assignment
 
 @router.post("/{assignment_id}/extract-answer")
@@ -182,6 +174,7 @@ async def update_assignment(
     
     db.commit()
     db.refresh(assignment)
+    invalidate_dashboard(current_user.id)
     
     return {"success": True, "message": "作业已更新", "assignment": assignment}
 
@@ -205,33 +198,68 @@ async def publish_assignment(
     
     assignment.status = AssignmentStatus.PUBLISHED
     db.commit()
+    invalidate_dashboard(current_user.id)
     
     return {"success": True, "message": "作业已发布"}
 
-@router.get("/", response_model=List[AssignmentResponse])
-async def list_assignments(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+# 作业列表支持的排序字段（None 表示按ID，即创建顺序）
+ASSIGNMENT_SORT_FIELDS = {
+    "created_at": None,
+    "id": None,
+    "title": Assignment.title,
+}
+
+def _assignment_list_query(
+    db: Session,
+    current_user: TokenIdentity,
+    status_filter: Optional[AssignmentStatus],
+    class_id: Optional[str]
 ):
-    """获取作业列表"""
     if current_user.role.value == "teacher":
         # 教师查看自己创建的作业
-        assignments = db.query(Assignment).filter(
-            Assignment.teacher_id == current_user.id
-        ).all()
+        query = db.query(Assignment).filter(Assignment.teacher_id == current_user.id)
+        if status_filter is not None:
+            query = query.filter(Assignment.status == status_filter)
+        if class_id is not None:
+            query = query.filter(Assignment.class_id == class_id)
     else:
         # 学生查看自己班级的作业
-        assignments = db.query(Assignment).filter(
+        query = db.query(Assignment).filter(
             Assignment.class_id == current_user.class_id,
             Assignment.status == AssignmentStatus.PUBLISHED
-        ).all()
-    
-    return assignments
+        )
+    return query
+
+@router.get("/", response_model=List[AssignmentResponse])
+async def list_assignments(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="每页数量，不提供则返回全部"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页响应头 X-Next-Cursor）"),
+    sort: str = Query("created_at", description="排序字段：created_at、title，前缀 - 表示降序"),
+    status_filter: Optional[AssignmentStatus] = Query(None, alias="status", description="按作业状态过滤（仅教师）"),
+    class_id: Optional[str] = Query(None, description="按班级过滤（仅教师）"),
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """获取作业列表"""
+    query = _assignment_list_query(db, current_user, status_filter, class_id)
+    return paginate(query, Assignment.id, sort, ASSIGNMENT_SORT_FIELDS, cursor, limit, response)
+
+@router.get("/count")
+async def count_assignments(
+    status_filter: Optional[AssignmentStatus] = Query(None, alias="status", description="按作业状态过滤（仅教师）"),
+    class_id: Optional[str] = Query(None, description="按班级过滤（仅教师）"),
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """获取作业总数（与作业列表使用相同的过滤条件）"""
+    query = _assignment_list_query(db, current_user, status_filter, class_id)
+    return {"total": query.order_by(None).count()}
 
 @router.get("/{assignment_id}", response_model=AssignmentDetail)
 async def get_assignment(
     assignment_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: TokenIdentity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """获取作业详情"""
@@ -297,6 +325,7 @@ async def delete_assignment(
         # 删除数据库记录
         db.delete(assignment)
         db.commit()
+        invalidate_dashboard(current_user.id)
         
         return {
             "success": True,
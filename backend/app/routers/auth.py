@@ -1,13 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from datetime import timedelta
 from app.database import get_db
 from app.models import User, UserRole
 from app.schemas import UserRegister, UserLogin, UserResponse, Token
 from app.core.security import (
-    verify_password, get_password_hash, create_access_token,
-    get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
+    hash_password_async, verify_and_update_password_async, create_user_token, get_current_user
 )
 from app.core.invite_code import validate_invite_code
 
@@ -53,16 +52,28 @@ async def register(user_data: UserRegister, db: Session = Depends(get_db)):
                 detail="该学号已被注册"
             )
     
+    # 归还数据库连接后再计算密码哈希（哈希期间的重复注册由唯一约束拦截）
+    db.rollback()
+    
     # 创建用户
     user = User(
         username=user_data.username,
-        password_hash=get_password_hash(user_data.password),
+        password_hash=await hash_password_async(user_data.password),
         role=user_data.role,
         class_id=class_id,
         student_id=user_data.student_id if user_data.role.value == "student" else None
     )
     db.add(user)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # 并发的重复注册（如重复点击）：用户名或学生学号已被抢先注册
+        db.rollback()
+        username_taken = db.query(User.id).filter(User.username == user_data.username).first()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="用户名已存在" if username_taken else "该学号已被注册"
+        )
     db.refresh(user)
     
     return {
@@ -80,17 +91,28 @@ async def login(
 ):
     """用户登录"""
     user = db.query(User).filter(User.username == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.password_hash):
+    if user:
+        # 先结束事务、归还数据库连接，再进行耗时的哈希校验，避免并发登录占满连接池
+        db.expunge(user)
+        db.rollback()
+        verified, new_hash = await verify_and_update_password_async(form_data.password, user.password_hash)
+    else:
+        verified, new_hash = False, None
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="用户名或密码错误",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
-    )
+    # 哈希参数（如 BCRYPT_ROUNDS）变更后，登录时透明地按新参数重新哈希
+    if new_hash:
+        db.query(User).filter(User.id == user.id).update(
+            {"password_hash": new_hash}, synchronize_session=False
+        )
+        db.commit()
+    
+    access_token = create_user_token(user)
     
     return {
         "access_token": access_token,
@@ -1,30 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Query, Request, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 from pathlib import Path
 from app.database import get_db
-from app.models import User, Assignment, Submission, SubmissionStatus
-from app.schemas import SubmissionResponse
-from app.core.security import get_current_user
-from typing import List
+from app.models import User, Assignment, Submission, SubmissionStatus, UploadSession
+from app.schemas import SubmissionResponse, UploadCreate, UploadStatusResponse
+from app.core.security import get_current_user, get_current_identity, TokenIdentity
+from app.core.pagination import paginate, MAX_PAGE_SIZE
+from app.core.http_cache import cache_headers, is_not_modified, make_etag, not_modified_response
+from app.core.report_files import report_file_response
+from app.core import pack_archive
+from app.core.storage import get_storage
+from typing import List, Optional
 from app.services.grading_queue import enqueue_submission
+from app.services.assignment_stats import record_submission_created
+from app.services.upload_sessions import (
+    MAX_HOMEWORK_SIZE, UPLOAD_CHUNK_SIZE, advance_offset, attach_submission, cleanup_expired_uploads,
+    create_upload_session, find_by_idempotency_key, partial_path, receive_chunk, remove_partial
+)
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-UPLOAD_DIR = Path("uploads")
-SUBMISSIONS_DIR = UPLOAD_DIR / "submissions"
-SUBMISSIONS_DIR.mkdir(parents=True, exist_ok=True)
-
-@router.post("/assignments/{assignment_id}/submit")
-async def submit_homework(
-    assignment_id: int,
-    homework_file: UploadFile = File(...),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """学生提交作业"""
+def _check_can_submit(
+    db: Session, assignment_id: int, current_user: User, exclude_submission_id: Optional[int] = None
+) -> Assignment:
+    """
+    检查学生能否提交该作业（上传前和创建提交时都会检查）
+    exclude_submission_id: 当前事务中刚创建的提交，不算作已提交
+    """
     if current_user.role.value != "student":
         raise HTTPException(status_code=403, detail="只有学生可以提交作业")
     
@@ -41,44 +48,33 @@ async def submit_homework(
     existing = db.query(Submission).filter(
         Submission.assignment_id == assignment_id,
         Submission.student_id == current_user.id
-    ).first()
-    if existing:
+    )
+    if exclude_submission_id is not None:
+        existing = existing.filter(Submission.id != exclude_submission_id)
+    if existing.first():
         raise HTTPException(status_code=400, detail="已提交过此作业")
     
-    # 检查文件格式
-    if not homework_file.filename.endswith('.pdf'):
-        raise HTTPException(status_code=400, detail="仅支持PDF格式")
-    
-    # 保存作业文件（目录结构：班级ID/作业ID/学号-学生姓名）
-    # 结构：uploads/submissions/{class_id}/{assignment_id}/{student_id}-{student_name}/
-    # 学生必须有学号
+    # 学生必须有学号（批改报告保存在 班级ID/作业ID/学号-学生姓名 目录下）
     if not current_user.student_id:
         raise HTTPException(status_code=400, detail="学生必须设置学号才能提交作业")
-    
-    class_id = assignment.class_id
-    student_folder = f"{current_user.student_id}-{current_user.username}"
-    submission_dir = SUBMISSIONS_DIR / class_id / str(assignment_id) / student_folder
-    submission_dir.mkdir(parents=True, exist_ok=True)
-    
-    # 构建文件名：学号-姓名-作业.pdf
-    filename = f"{current_user.student_id}-{current_user.username}-homework.pdf"
-    homework_path = submission_dir / filename
-    
-    with open(homework_path, "wb") as f:
-        content = await homework_file.read()
-        f.write(content)
-    
-    # 创建提交记录
+    return assignment
+
+
+def _new_submission(db: Session, assignment_id: int, current_user: User, homework_ref: str) -> Submission:
+    """创建待批改的提交记录（未提交事务）"""
     submission = Submission(
         assignment_id=assignment_id,
         student_id=current_user.id,
-        homework_file_path=str(homework_path),
+        homework_file_path=homework_ref,
         status=SubmissionStatus.PENDING
     )
     db.add(submission)
-    db.commit()
-    db.refresh(submission)
+    db.flush()
+    record_submission_created(db, submission)
+    return submission
+
 
+async def _enqueue_and_respond(submission: Submission) -> dict:
     # 入队等待后台批改
     try:
         await enqueue_submission(submission.id)
@@ -98,10 +94,197 @@ async def submit_homework(
         "message": "作业上传成功，已加入批改队列"
     }
 
+@router.post("/assignments/{assignment_id}/submit")
+async def submit_homework(
+    assignment_id: int,
+    homework_file: UploadFile = File(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """学生提交作业（一次上传整个文件；网络不稳定时使用下面的可续传上传）"""
+    _check_can_submit(db, assignment_id, current_user)
+    
+    # 检查文件格式
+    if not homework_file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="仅支持PDF格式")
+    
+    # 作业PDF按内容保存到存储后端，提交记录保存其引用
+    homework_ref = await asyncio.to_thread(get_storage().put_file, homework_file.file, ".pdf")
+    
+    # 创建提交记录
+    submission = _new_submission(db, assignment_id, current_user, homework_ref)
+    db.commit()
+    db.refresh(submission)
+
+    return await _enqueue_and_respond(submission)
+
+
+def _upload_status(upload: UploadSession) -> UploadStatusResponse:
+    return UploadStatusResponse(
+        upload_id=upload.id,
+        filename=upload.filename,
+        size=upload.size,
+        offset=upload.offset,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        submission_id=upload.submission_id,
+    )
+
+
+def _upload_headers(upload: UploadSession) -> dict:
+    return {"Upload-Offset": str(upload.offset), "Upload-Length": str(upload.size)}
+
+
+def _get_my_upload(db: Session, upload_id: str, current_user: User) -> UploadSession:
+    upload = db.query(UploadSession).filter(UploadSession.id == upload_id).first()
+    if not upload or upload.student_id != current_user.id:
+        raise HTTPException(status_code=404, detail="上传不存在或已过期")
+    return upload
+
+
+@router.post("/assignments/{assignment_id}/uploads", status_code=201)
+async def create_upload(
+    assignment_id: int,
+    body: UploadCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=200),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    创建可续传的作业上传（随后按偏移量 PATCH 分块，最后完成上传）
+    请求头 Idempotency-Key 相同的重复请求返回同一个上传
+    """
+    if idempotency_key:
+        upload = find_by_idempotency_key(db, current_user.id, idempotency_key)
+        if upload is not None:
+            if upload.assignment_id != assignment_id or upload.size != body.size:
+                raise HTTPException(status_code=409, detail="Idempotency-Key 已用于其他上传")
+            return JSONResponse(_upload_status(upload).model_dump(), headers=_upload_headers(upload))
+
+    _check_can_submit(db, assignment_id, current_user)
+    if not body.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="仅支持PDF格式")
+    if body.size <= 0:
+        raise HTTPException(status_code=400, detail="文件为空")
+    if body.size > MAX_HOMEWORK_SIZE:
+        raise HTTPException(status_code=413, detail=f"文件超过 {MAX_HOMEWORK_SIZE // 1024 // 1024}MB 限制")
+
+    cleanup_expired_uploads(db)
+    upload = create_upload_session(db, current_user.id, assignment_id, body.filename, body.size, idempotency_key)
+    return JSONResponse(_upload_status(upload).model_dump(), status_code=201, headers=_upload_headers(upload))
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadStatusResponse)
+async def get_upload(
+    upload_id: str,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """查询上传进度（续传前获取服务端已接收的偏移量）"""
+    upload = _get_my_upload(db, upload_id, current_user)
+    response.headers.update(_upload_headers(upload))
+    return _upload_status(upload)
+
+
+@router.patch("/uploads/{upload_id}", response_model=UploadStatusResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    response: Response,
+    upload_offset: int = Header(...),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    上传一个分块：请求体为原始字节，请求头 Upload-Offset 为该分块在文件中的起始位置
+    偏移量与服务端不一致时返回409，客户端应查询当前偏移量后从该处继续
+    """
+    upload = _get_my_upload(db, upload_id, current_user)
+    if upload.submission_id is not None:
+        raise HTTPException(status_code=409, detail="上传已完成")
+    if upload_offset != upload.offset:
+        raise HTTPException(status_code=409, detail=f"偏移量不一致，服务端已接收 {upload.offset} 字节",
+                            headers=_upload_headers(upload))
+
+    upload_id, old_offset, size = upload.id, upload.offset, upload.size
+    # 接收期间不占用数据库连接
+    db.rollback()
+    try:
+        new_offset = await receive_chunk(upload_id, old_offset, size, request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    if not advance_offset(db, upload_id, old_offset, new_offset):
+        db.refresh(upload)
+        raise HTTPException(status_code=409, detail=f"偏移量不一致，服务端已接收 {upload.offset} 字节",
+                            headers=_upload_headers(upload))
+    db.refresh(upload)
+    if new_offset < old_offset:
+        # 临时文件不完整，服务端已回退偏移量
+        raise HTTPException(status_code=409, detail=f"部分数据已丢失，请从 {new_offset} 字节处继续上传",
+                            headers=_upload_headers(upload))
+    response.headers.update(_upload_headers(upload))
+    return _upload_status(upload)
+
+
+def _finalized_response(db: Session, submission_id: int) -> dict:
+    """重复完成上传时返回已创建的提交"""
+    submission = db.query(Submission).filter(Submission.id == submission_id).first()
+    return {
+        "success": True,
+        "submission": SubmissionResponse.from_orm(submission),
+        "message": "作业已提交"
+    }
+
+
+@router.post("/uploads/{upload_id}/finalize")
+async def finalize_upload(
+    upload_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    完成上传：保存作业PDF、创建提交并加入批改队列
+    可安全重试：同一个上传重复完成时返回已创建的提交
+    """
+    upload = _get_my_upload(db, upload_id, current_user)
+    if upload.submission_id is not None:
+        return _finalized_response(db, upload.submission_id)
+    if upload.offset != upload.size:
+        raise HTTPException(status_code=409, detail=f"上传未完成，已接收 {upload.offset}/{upload.size} 字节",
+                            headers=_upload_headers(upload))
+
+    def store() -> str:
+        with open(partial_path(upload.id), "rb") as f:
+            return get_storage().put_file(f, ".pdf")
+
+    try:
+        homework_ref = await asyncio.to_thread(store)
+    except FileNotFoundError:
+        raise HTTPException(status_code=410, detail="上传的数据已丢失，请重新上传")
+
+    # 先以CAS方式把提交关联到上传，再检查能否提交：并发的完成请求中只有一个能关联成功，
+    # 其余的返回该提交（若先检查，后到的请求会看到刚创建的提交而误报“已提交过此作业”）
+    submission = _new_submission(db, upload.assignment_id, current_user, homework_ref)
+    if not attach_submission(db, upload.id, submission.id):
+        db.rollback()
+        db.refresh(upload)
+        return _finalized_response(db, upload.submission_id)
+    try:
+        _check_can_submit(db, upload.assignment_id, current_user, exclude_submission_id=submission.id)
+    except HTTPException:
+        db.rollback()
+        raise
+    db.commit()
+    db.refresh(submission)
+    await asyncio.to_thread(remove_partial, upload.id)
+
+    return await _enqueue_and_respond(submission)
+
 @router.get("/assignments/{assignment_id}/submission", response_model=SubmissionResponse)
 async def get_my_submission(
     assignment_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: TokenIdentity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """获取我的提交记录"""
@@ -118,13 +301,8 @@ async def get_my_submission(
     
     return submission
 
-@router.get("/assignments/{assignment_id}/report")
-async def get_my_report(
-    assignment_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """获取我的批改报告"""
+def _get_my_published_report(db: Session, assignment_id: int, current_user: TokenIdentity):
+    """查找当前学生已发布的提交及其报告文件"""
     if current_user.role.value != "student":
         raise HTTPException(status_code=403, detail="只有学生可以查看报告")
     
@@ -143,26 +321,101 @@ async def get_my_report(
         raise HTTPException(status_code=404, detail="报告文件不存在")
     
     report_path = Path(submission.report_file_path)
-    if not report_path.exists():
+    if not pack_archive.exists(report_path):
         raise HTTPException(status_code=404, detail="报告文件不存在")
     
-    return {
-        "content": report_path.read_text(encoding="utf-8"),
+    return submission, report_path
+
+@router.get("/assignments/{assignment_id}/report")
+async def get_my_report(
+    assignment_id: int,
+    request: Request,
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """获取我的批改报告"""
+    submission, report_path = _get_my_published_report(db, assignment_id, current_user)
+    
+    # 强ETag由报告内容摘要和等级生成，未变化时返回304，不再读取报告
+    etag = make_etag(pack_archive.digest(report_path), submission.grade)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    return JSONResponse({
+        "content": pack_archive.read_text(report_path),
         "grade": submission.grade
+    }, headers=cache_headers(etag))
+
+@router.get("/assignments/{assignment_id}/report/meta")
+async def get_my_report_meta(
+    assignment_id: int,
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """获取我的批改报告的元数据（等级等），报告正文通过 /report/file 获取"""
+    submission, _ = _get_my_published_report(db, assignment_id, current_user)
+    return {
+        "grade": submission.grade,
+        "submission_id": submission.id
     }
 
+@router.get("/assignments/{assignment_id}/report/file")
+async def get_my_report_file(
+    assignment_id: int,
+    request: Request,
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """直接发送我的批改报告（Markdown，优先发送预压缩副本）"""
+    _, report_path = _get_my_published_report(db, assignment_id, current_user)
+    return await report_file_response(request, report_path)
+
+# 我的提交列表支持的排序字段（None 表示按ID，即提交顺序）
+MY_SUBMISSION_SORT_FIELDS = {
+    "created_at": None,
+    "id": None,
+}
+
+def _my_submissions_query(
+    db: Session,
+    current_user: User,
+    status: Optional[SubmissionStatus],
+    grade: Optional[str]
+):
+    query = db.query(Submission).filter(Submission.student_id == current_user.id)
+    if status is not None:
+        query = query.filter(Submission.status == status)
+    if grade is not None:
+        query = query.filter(Submission.grade == grade)
+    return query
+
 @router.get("/my-submissions", response_model=List[SubmissionResponse])
 async def list_my_submissions(
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="每页数量，不提供则返回全部"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页响应头 X-Next-Cursor）"),
+    sort: str = Query("created_at", description="排序字段：created_at，前缀 - 表示降序"),
+    status: Optional[SubmissionStatus] = Query(None, description="按提交状态过滤"),
+    grade: Optional[str] = Query(None, description="按等级过滤"),
+    current_user: TokenIdentity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """获取我的所有提交"""
     if current_user.role.value != "student":
         raise HTTPException(status_code=403, detail="只有学生可以查看提交")
     
-    submissions = db.query(Submission).filter(
-        Submission.student_id == current_user.id
-    ).all()
-    
-    return submissions
+    query = _my_submissions_query(db, current_user, status, grade)
+    return paginate(query, Submission.id, sort, MY_SUBMISSION_SORT_FIELDS, cursor, limit, response)
 
+@router.get("/my-submissions/count")
+async def count_my_submissions(
+    status: Optional[SubmissionStatus] = Query(None, description="按提交状态过滤"),
+    grade: Optional[str] = Query(None, description="按等级过滤"),
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """获取我的提交总数（与提交列表使用相同的过滤条件）"""
+    if current_user.role.value != "student":
+        raise HTTPException(status_code=403, detail="只有学生可以查看提交")
+    
+    return {"total": _my_submissions_query(db, current_user, status, grade).count()}
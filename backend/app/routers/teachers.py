@@ -1,34 +1,60 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response, UploadFile, File, Form
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy import func, or_, and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
 from pathlib import Path
 from app.database import get_db
 from app.models import User, Assignment, Submission, SubmissionStatus, UserRole
 from app.schemas import AssignmentStats, SubmissionDetail
-from app.core.security import get_current_user
-from app.core.excel_generator import generate_excel
-from app.core.gemini_client import generate_class_report
-from app.core.file_utils import get_teacher_dir_name, get_assignment_dir_name
-from typing import List
-import json
-from collections import defaultdict
+from app.core.security import get_current_user, get_current_identity, TokenIdentity, hash_password_async
+from app.core.roster import parse_roster
+from app.core.pagination import paginate, MAX_PAGE_SIZE
+from app.core.http_cache import cache_headers, is_not_modified, make_etag, not_modified_response
+from app.core.report_files import report_file_response
+from app.core import pack_archive
+from app.core.excel_stream import BASE_COLS, write_summary_excel
+from app.services.assignment_stats import get_assignment_aggregate, stats_to_dict, backfill_question_rows
+from app.services.bulk_upload import import_homework_zip
+from app.services.export_cache import (
+    get_data_version, summary_is_fresh, summary_path, build_summary_excel,
+    get_cached_excel_table, set_cached_excel_table, get_columnar_table
+)
+from app.services.class_report_jobs import start_class_report_job, get_latest_job, job_to_dict
+from app.services.dashboard import get_dashboard
+from app.core.file_utils import UPLOAD_DIR, SUBMISSIONS_DIR, TEACHERS_DIR, get_teacher_assignment_dir
+from app.core.storage import get_storage
+from app.core.zip_stream import ZipMember, stream_zip
+from typing import List, Optional
+import asyncio
+import os
+import tempfile
+from functools import partial
+from io import BytesIO
+from urllib.parse import quote
 
 router = APIRouter()
 
-UPLOAD_DIR = Path("uploads")
-SUBMISSIONS_DIR = UPLOAD_DIR / "submissions"
-TEACHERS_DIR = UPLOAD_DIR / "teachers"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# 在线表格列式格式的每页最大行数
+MAX_EXCEL_PAGE_SIZE = 1000
 
-def get_teacher_assignment_dir(teacher: User, assignment: Assignment) -> Path:
-    """获取教师作业目录：uploads/teachers/{teacher_name}_{teacher_id}/assignments/{assignment_title}_{assignment_id}/"""
-    teacher_dir = get_teacher_dir_name(teacher.username, teacher.id)
-    assignment_dir = get_assignment_dir_name(assignment.title, assignment.id)
-    return TEACHERS_DIR / teacher_dir / "assignments" / assignment_dir
+@router.get("/dashboard")
+async def get_teacher_dashboard(
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """教师首页汇总：所有作业的提交、批改、失败人数、等级分布和批改进度（一次请求）"""
+    if current_user.role.value != "teacher":
+        raise HTTPException(status_code=403, detail="只有教师可以查看统计")
+    
+    return get_dashboard(db, current_user.id)
 
 @router.get("/assignments/{assignment_id}/stats", response_model=AssignmentStats)
 async def get_assignment_stats(
     assignment_id: int,
-    current_user: User = Depends(get_current_user),
+    current_user: TokenIdentity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """获取作业学情统计"""
@@ -42,99 +68,14 @@ async def get_assignment_stats(
         if assignment.teacher_id != current_user.id:
             raise HTTPException(status_code=403, detail="无权访问此作业")
         
-        # 获取所有提交
-        submissions = db.query(Submission).filter(
-            Submission.assignment_id == assignment_id
-        ).all()
-        
-        # 统计基本信息
-        total_students = len(db.query(User).filter(
+        # 统计汇总在提交批改时增量维护，这里直接读取
+        agg = get_assignment_aggregate(db, assignment_id)
+        total_students = db.query(User).filter(
             User.class_id == assignment.class_id,
             User.role == UserRole.STUDENT
-        ).all())
-        submitted_count = len(submissions)
-        submission_rate = (submitted_count / total_students * 100) if total_students > 0 else 0
-        
-        # 统计等级分布
-        grade_distribution = defaultdict(int)
-        question_stats = defaultdict(lambda: {"correct": 0, "partial": 0, "wrong": 0, "total": 0})
-        low_score_students = []
-        
-        total_grade_points = 0
-        grade_count = 0
-        
-        for submission in submissions:
-            if submission.grade:
-                grade_distribution[submission.grade] += 1
-                # 计算平均等级（简化处理）
-                grade_map = {"A+": 10, "A": 9, "A-": 8, "B+": 7, "B": 6, "B-": 5, 
-                            "C+": 4, "C": 3, "C-": 2, "D": 1, "F": 0}
-                if submission.grade in grade_map:
-                    total_grade_points += grade_map[submission.grade]
-                    grade_count += 1
-                
-                # 判断低分学生
-                if submission.grade in ["D", "F", "C-", "C"]:
-                    low_score_students.append({
-                        "student_id": submission.student.id,
-                        "student_name": submission.student.username,
-                        "grade": submission.grade
-                    })
-            
-            # 统计题目数据
-            if submission.json_file_path:
-                json_path = Path(submission.json_file_path)
-                if json_path.exists():
-                    try:
-                        data = json.loads(json_path.read_text(encoding="utf-8"))
-                        for q in data.get("questions", []):
-                            key = q.get("key", "")
-                            status = q.get("status", "")
-                            if key:
-                                question_stats[key]["total"] += 1
-                                if status == "正确":
-                                    question_stats[key]["correct"] += 1
-                                elif status == "过程部分正确":
-                                    question_stats[key]["partial"] += 1
-                                else:
-                                    question_stats[key]["wrong"] += 1
-                    except Exception as e:
-                        import traceback
-                        print(f"解析JSON文件失败 {json_path}: {e}")
-                        traceback.print_exc()
-                        pass
-        
-        # 计算平均等级
-        average_grade = None
-        if grade_count > 0:
-            avg_point = total_grade_points / grade_count
-            grade_map_reverse = {10: "A+", 9: "A", 8: "A-", 7: "B+", 6: "B", 5: "B-",
-                                4: "C+", 3: "C", 2: "C-", 1: "D", 0: "F"}
-            # 找到最接近的等级
-            closest_grade = min(grade_map_reverse.keys(), key=lambda x: abs(x - avg_point))
-            average_grade = grade_map_reverse[closest_grade]
-        
-        # 转换为列表格式
-        question_stats_list = [
-            {
-                "key": key,
-                "correct_count": stats["correct"],
-                "partial_count": stats["partial"],
-                "wrong_count": stats["wrong"],
-                "total_count": stats["total"]
-            }
-            for key, stats in question_stats.items()
-        ]
+        ).count()
         
-        return {
-            "total_students": total_students,
-            "submitted_count": submitted_count,
-            "submission_rate": round(submission_rate, 2),
-            "average_grade": average_grade,
-            "grade_distribution": dict(grade_distribution),
-            "question_stats": question_stats_list,
-            "low_score_students": low_score_students
-        }
+        return stats_to_dict(agg, total_students)
     except HTTPException:
         raise
     except Exception as e:
@@ -144,10 +85,36 @@ async def get_assignment_stats(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=error_msg)
 
+# 提交列表支持的排序字段（None 表示按ID，即提交顺序）
+SUBMISSION_SORT_FIELDS = {
+    "created_at": None,
+    "id": None,
+    "grade": func.coalesce(Submission.grade, ""),
+}
+
+def _submission_list_query(
+    db: Session,
+    assignment_id: int,
+    status: Optional[SubmissionStatus],
+    grade: Optional[str]
+):
+    query = db.query(Submission).filter(Submission.assignment_id == assignment_id)
+    if status is not None:
+        query = query.filter(Submission.status == status)
+    if grade is not None:
+        query = query.filter(Submission.grade == grade)
+    return query
+
 @router.get("/assignments/{assignment_id}/submissions", response_model=List[SubmissionDetail])
 async def list_submissions(
     assignment_id: int,
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="每页数量，不提供则返回全部"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页响应头 X-Next-Cursor）"),
+    sort: str = Query("created_at", description="排序字段：created_at、grade，前缀 - 表示降序"),
+    status: Optional[SubmissionStatus] = Query(None, description="按提交状态过滤"),
+    grade: Optional[str] = Query(None, description="按等级过滤"),
+    current_user: TokenIdentity = Depends(get_current_identity),
     db: Session = Depends(get_db)
 ):
     """获取作业的所有提交"""
@@ -161,9 +128,10 @@ async def list_submissions(
         if assignment.teacher_id != current_user.id:
             raise HTTPException(status_code=403, detail="无权访问此作业")
         
-        submissions = db.query(Submission).filter(
-            Submission.assignment_id == assignment_id
-        ).all()
+        query = _submission_list_query(db, assignment_id, status, grade).options(
+            joinedload(Submission.student)
+        )
+        submissions = paginate(query, Submission.id, sort, SUBMISSION_SORT_FIELDS, cursor, limit, response)
         
         result = []
         for sub in submissions:
@@ -200,6 +168,26 @@ async def list_submissions(
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=error_msg)
 
+@router.get("/assignments/{assignment_id}/submissions/count")
+async def count_submissions(
+    assignment_id: int,
+    status: Optional[SubmissionStatus] = Query(None, description="按提交状态过滤"),
+    grade: Optional[str] = Query(None, description="按等级过滤"),
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """获取作业的提交总数（与提交列表使用相同的过滤条件）"""
+    if current_user.role.value != "teacher":
+        raise HTTPException(status_code=403, detail="只有教师可以查看提交")
+    
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail="作业不存在")
+    if assignment.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权访问此作业")
+    
+    return {"total": _submission_list_query(db, assignment_id, status, grade).count()}
+
 @router.get("/assignments/{assignment_id}/submissions/{submission_id}/homework")
 async def get_student_homework(
     assignment_id: int,
@@ -226,24 +214,24 @@ async def get_student_homework(
     if not submission.homework_file_path:
         raise HTTPException(status_code=404, detail="作业文件不存在")
     
-    homework_path = Path(submission.homework_file_path)
-    if not homework_path.exists():
+    storage = get_storage()
+    if not await asyncio.to_thread(storage.exists, submission.homework_file_path):
         raise HTTPException(status_code=404, detail="作业文件不存在")
     
-    return FileResponse(
-        str(homework_path),
-        filename=f"{submission.student.username}_homework.pdf",
-        media_type="application/pdf"
-    )
+    filename = f"{submission.student.username}_homework.pdf"
+    homework_path = storage.filesystem_path(submission.homework_file_path)
+    if homework_path is not None:
+        return FileResponse(str(homework_path), filename=filename, media_type="application/pdf")
+    
+    # 对象存储：读取内容后直接返回
+    content = await asyncio.to_thread(storage.read_bytes, submission.homework_file_path)
+    return Response(content, media_type="application/pdf", headers=_attachment_headers(filename))
 
-@router.get("/assignments/{assignment_id}/submissions/{submission_id}/report")
-async def get_student_report(
-    assignment_id: int,
-    submission_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """获取学生的批改报告"""
+def _attachment_headers(filename: str) -> dict:
+    return {"Content-Disposition": f"attachment; filename*=utf-8''{quote(filename)}"}
+
+def _get_submission_report(db: Session, assignment_id: int, submission_id: int, current_user):
+    """校验权限并返回提交及其报告文件"""
     if current_user.role.value != "teacher":
         raise HTTPException(status_code=403, detail="只有教师可以查看报告")
     
@@ -263,19 +251,98 @@ async def get_student_report(
         raise HTTPException(status_code=404, detail="报告文件不存在")
     
     report_path = Path(submission.report_file_path)
-    if not report_path.exists():
+    if not pack_archive.exists(report_path):
         raise HTTPException(status_code=404, detail="报告文件不存在")
     
+    return submission, report_path
+
+@router.get("/assignments/{assignment_id}/submissions/{submission_id}/report")
+async def get_student_report(
+    assignment_id: int,
+    submission_id: int,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取学生的批改报告"""
+    submission, report_path = _get_submission_report(db, assignment_id, submission_id, current_user)
+    
+    # 强ETag由报告内容摘要和等级生成，未变化时返回304，不再读取报告
+    etag = make_etag(pack_archive.digest(report_path), submission.grade, submission.student_id)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    return JSONResponse({
+        "content": pack_archive.read_text(report_path),
+        "grade": submission.grade,
+        "student_name": submission.student.username,
+        "student_id": str(submission.student.id)
+    }, headers=cache_headers(etag))
+
+@router.get("/assignments/{assignment_id}/submissions/{submission_id}/report/meta")
+async def get_student_report_meta(
+    assignment_id: int,
+    submission_id: int,
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """获取学生批改报告的元数据（等级、姓名），报告正文通过 /report/file 获取"""
+    submission, _ = _get_submission_report(db, assignment_id, submission_id, current_user)
     return {
-        "content": report_path.read_text(encoding="utf-8"),
         "grade": submission.grade,
         "student_name": submission.student.username,
         "student_id": str(submission.student.id)
     }
 
+@router.get("/assignments/{assignment_id}/submissions/{submission_id}/report/file")
+async def get_student_report_file(
+    assignment_id: int,
+    submission_id: int,
+    request: Request,
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """直接发送学生的批改报告（Markdown，优先发送预压缩副本）"""
+    _, report_path = _get_submission_report(db, assignment_id, submission_id, current_user)
+    return await report_file_response(request, report_path)
+
+@router.post("/assignments/{assignment_id}/bulk-upload")
+async def bulk_upload_homework(
+    assignment_id: int,
+    archive: UploadFile = File(..., description="ZIP，文件名格式：{学号}-{姓名}-homework.pdf"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量上传扫描作业（ZIP），按学号匹配学生并加入批改队列"""
+    if current_user.role.value != "teacher":
+        raise HTTPException(status_code=403, detail="只有教师可以批量上传作业")
+    
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail="作业不存在")
+    if assignment.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权访问此作业")
+    if assignment.status.value != "published":
+        raise HTTPException(status_code=400, detail="作业未发布")
+    
+    try:
+        result = await import_homework_zip(db, assignment, archive.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    message = f"已导入 {result['created_count']} 份作业，{result['unmatched_count']} 个文件未匹配"
+    if result["enqueue_failed"]:
+        message += "；部分作业未能加入批改队列，请联系管理员"
+    return {"success": True, "message": message, **result}
+
 @router.get("/assignments/{assignment_id}/excel")
 async def get_excel_data(
     assignment_id: int,
+    request: Request,
+    format: str = Query("rows", pattern="^(rows|columnar)$", description="rows: 每行一个对象（旧格式）；columnar: 列式格式"),
+    offset: int = Query(0, ge=0, description="列式格式：起始行"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_EXCEL_PAGE_SIZE, description="列式格式：每页行数，不传则返回全部"),
+    columns: Optional[List[str]] = Query(None, description="列式格式：只返回这些列，可重复传入"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -289,17 +356,41 @@ async def get_excel_data(
     if assignment.teacher_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权访问此作业")
     
-    # 获取所有提交的JSON文件目录
-    submissions = db.query(Submission).filter(
+    has_submission = db.query(Submission.id).filter(
         Submission.assignment_id == assignment_id
-    ).all()
-    
-    if not submissions:
+    ).first()
+    if not has_submission:
         raise HTTPException(status_code=400, detail="没有提交记录")
     
+    # 数据未变化时返回304或缓存的表格数据
+    version = get_data_version(db, assignment)
+    
+    if format == "columnar":
+        # 列式格式从数据库的逐题记录生成，不依赖JSON目录
+        etag = version.etag(f"columnar:{offset}:{limit}:{','.join(columns or [])}")
+        if is_not_modified(request, etag, version.last_modified):
+            return not_modified_response(etag, version.last_modified)
+        # 缓存未命中时需要补充逐题记录并构建整表，在线程中执行，避免阻塞事件循环
+        table = await asyncio.to_thread(get_columnar_table, db, assignment_id, version)
+        try:
+            selected = table.resolve_columns(columns)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return JSONResponse(
+            {"success": True, "sheet": "汇总(宽表)", **table.page(offset, limit, selected)},
+            headers=cache_headers(etag, version.last_modified)
+        )
+    
+    etag = version.etag("json")
+    if is_not_modified(request, etag, version.last_modified):
+        return not_modified_response(etag, version.last_modified)
+    cached = get_cached_excel_table(assignment_id, version)
+    if cached is not None:
+        return JSONResponse(cached, headers=cache_headers(etag, version.last_modified))
+    
     # 收集所有JSON文件（结构：班级ID/作业ID/学生文件夹）
     json_dir = SUBMISSIONS_DIR / assignment.class_id / str(assignment_id)
-    if not json_dir.exists():
+    if not pack_archive.exists(json_dir):
         raise HTTPException(status_code=404, detail="数据目录不存在")
     
     try:
@@ -310,45 +401,25 @@ async def get_excel_data(
         if not rows:
             raise HTTPException(status_code=400, detail="未找到任何JSON数据")
         
-        base_cols = [
-            "student_name", "student_id", "total_questions",
-            "correct", "partial", "result_wrong", "wrong", "grade"
-        ]
         qcols = get_all_qcols(rows)
         
-        # 确保所有行都有所有列
-        for r in rows:
-            for c in qcols:
-                r.setdefault(c, "")
-        
-        # 宽表数据
-        wide_data = []
-        for r in rows:
-            wide_row = {col: r.get(col, "") for col in base_cols + qcols}
-            wide_data.append(wide_row)
-        
-        # 长表数据
-        long_data = []
-        for r in rows:
-            for qc in qcols:
-                long_data.append({
-                    "student_name": r.get("student_name", ""),
-                    "student_id": r.get("student_id", ""),
-                    "key": qc[2:] if qc.startswith("Q:") else qc,
-                    "status": r.get(qc, ""),
-                    "grade": r.get("grade", "")
-                })
+        # 宽表数据（确保所有行都有所有列）
+        wide_data = [{col: r.get(col, "") for col in BASE_COLS + qcols} for r in rows]
         
         # 只返回汇总(宽表)数据
         excel_data = {
             "汇总(宽表)": wide_data
         }
         
-        return {
+        result = {
             "success": True,
             "data": excel_data,
             "sheets": list(excel_data.keys())
         }
+        set_cached_excel_table(assignment_id, version, result)
+        return JSONResponse(result, headers=cache_headers(etag, version.last_modified))
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -357,6 +428,7 @@ async def get_excel_data(
 @router.get("/assignments/{assignment_id}/download-excel")
 async def download_excel(
     assignment_id: int,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -370,42 +442,120 @@ async def download_excel(
     if assignment.teacher_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权访问此作业")
     
-    # 获取所有提交的JSON文件目录
-    submissions = db.query(Submission).filter(
+    has_submission = db.query(Submission.id).filter(
         Submission.assignment_id == assignment_id
-    ).all()
-    
-    if not submissions:
+    ).first()
+    if not has_submission:
         raise HTTPException(status_code=400, detail="没有提交记录")
     
-    # 收集所有JSON文件（新结构：班级ID/作业ID/学生文件夹）
-    json_dir = SUBMISSIONS_DIR / assignment.class_id / str(assignment_id)
-    if not json_dir.exists():
-        raise HTTPException(status_code=404, detail="数据目录不存在")
+    # 数据未变化时返回304或直接复用上次生成的文件
+    version = get_data_version(db, assignment)
+    etag = version.etag("xlsx")
+    if is_not_modified(request, etag, version.last_modified):
+        return not_modified_response(etag, version.last_modified)
     
-    # 生成Excel（保存到教师作业目录）
     assignment_dir = get_teacher_assignment_dir(current_user, assignment)
-    assignment_dir.mkdir(parents=True, exist_ok=True)
-    output_path = assignment_dir / "summary.xlsx"
-    try:
-        generate_excel(json_dir, output_path)
-        return FileResponse(
-            str(output_path),
-            filename=f"作业分析汇总_{assignment.title}.xlsx",
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    if not summary_is_fresh(assignment_dir, version):
+        # 旧数据只有JSON文件，先补齐逐题记录
+        if backfill_question_rows(db, assignment_id):
+            db.commit()
+        # 生成Excel（保存到教师作业目录），从数据库逐行写入
+        try:
+            await asyncio.to_thread(build_summary_excel, db, assignment_id, assignment_dir, version)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"生成Excel失败: {str(e)}")
+    return FileResponse(
+        str(summary_path(assignment_dir)),
+        filename=f"作业分析汇总_{assignment.title}.xlsx",
+        media_type=XLSX_MEDIA_TYPE,
+        headers=cache_headers(etag, version.last_modified)
+    )
+
+@router.get("/export-excel")
+async def export_excel(
+    assignment_ids: List[int] = Query(..., description="要合并导出的作业ID，可重复传入"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """合并导出多个作业（可跨班级）的成绩汇总"""
+    if current_user.role.value != "teacher":
+        raise HTTPException(status_code=403, detail="只有教师可以下载Excel")
+    
+    assignment_ids = list(dict.fromkeys(assignment_ids))
+    owned = {
+        a.id for a in db.query(Assignment.id).filter(
+            Assignment.id.in_(assignment_ids),
+            Assignment.teacher_id == current_user.id
+        ).all()
+    }
+    missing = [aid for aid in assignment_ids if aid not in owned]
+    if missing:
+        raise HTTPException(
+            status_code=404,
+            detail=f"作业不存在或无权访问: {', '.join(map(str, missing))}"
         )
+    
+    for aid in assignment_ids:
+        backfill_question_rows(db, aid)
+    db.commit()
+    
+    # 写入临时文件，响应发送完毕后删除
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        await asyncio.to_thread(write_summary_excel, db, assignment_ids, Path(tmp_path))
     except Exception as e:
+        os.unlink(tmp_path)
         raise HTTPException(status_code=500, detail=f"生成Excel失败: {str(e)}")
+    return FileResponse(
+        tmp_path,
+        filename="作业分析汇总_合并导出.xlsx",
+        media_type=XLSX_MEDIA_TYPE,
+        background=BackgroundTask(os.unlink, tmp_path)
+    )
 
-@router.post("/assignments/{assignment_id}/generate-class-report")
-async def generate_class_report_endpoint(
+def _archived_file(path: Path):
+    """报告、JSON可能已归档，读出后作为内存中的流（单个文件很小）"""
+    return BytesIO(pack_archive.read_bytes(path))
+
+def _export_members(db: Session, current_user, assignment: Assignment) -> List[ZipMember]:
+    """导出ZIP的条目清单（只收集路径，内容在生成ZIP时逐个读取）"""
+    storage = get_storage()
+    submissions = db.query(Submission).options(joinedload(Submission.student)).filter(
+        Submission.assignment_id == assignment.id
+    ).order_by(Submission.id).all()
+    
+    members = []
+    for submission in submissions:
+        student = submission.student
+        folder = f"{student.student_id}-{student.username}"
+        members.append(ZipMember(
+            f"{folder}/{folder}-homework.pdf",
+            partial(storage.open, submission.homework_file_path),
+            compress=False
+        ))
+        for file_path in (submission.report_file_path, submission.json_file_path):
+            if file_path:
+                members.append(ZipMember(f"{folder}/{Path(file_path).name}", partial(_archived_file, Path(file_path))))
+    
+    assignment_dir = get_teacher_assignment_dir(current_user, assignment)
+    members.append(ZipMember("summary.xlsx", partial(open, summary_path(assignment_dir), "rb"), compress=False))
+    try:
+        class_report_path = _resolve_class_report_path(current_user, assignment, None)
+        members.append(ZipMember("class_report_latest.md", partial(_archived_file, class_report_path)))
+    except HTTPException:
+        pass
+    return members
+
+@router.get("/assignments/{assignment_id}/export-zip")
+async def export_assignment_zip(
     assignment_id: int,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """生成全班学情报告"""
+    """打包下载作业的全部材料：每个学生的作业PDF、批改报告、JSON，成绩汇总和最新的全班报告（流式生成）"""
     if current_user.role.value != "teacher":
-        raise HTTPException(status_code=403, detail="只有教师可以生成报告")
+        raise HTTPException(status_code=403, detail="只有教师可以导出作业")
     
     assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
     if not assignment:
@@ -413,28 +563,53 @@ async def generate_class_report_endpoint(
     if assignment.teacher_id != current_user.id:
         raise HTTPException(status_code=403, detail="无权访问此作业")
     
-    # 获取所有已批改的提交
-    # 查询条件：状态为 GRADED 或 PUBLISHED，或者有报告文件路径的提交
-    from sqlalchemy import or_
-    submissions = db.query(Submission).filter(
+    has_submission = db.query(Submission.id).filter(
         Submission.assignment_id == assignment_id
-    ).filter(
-        or_(
-            Submission.status == SubmissionStatus.GRADED,
-            Submission.status == SubmissionStatus.PUBLISHED,
-            Submission.report_file_path.isnot(None)
-        )
-    ).all()
+    ).first()
+    if not has_submission:
+        raise HTTPException(status_code=400, detail="没有提交记录")
     
-    # 进一步过滤：只保留有报告文件且文件存在的提交
-    valid_submissions = []
-    for s in submissions:
-        if s.report_file_path:
-            report_path = Path(s.report_file_path)
-            if report_path.exists():
-                valid_submissions.append(s)
+    # 成绩汇总与下载Excel共用同一份文件，数据未变化时直接复用
+    version = get_data_version(db, assignment)
+    assignment_dir = get_teacher_assignment_dir(current_user, assignment)
+    if not summary_is_fresh(assignment_dir, version):
+        if backfill_question_rows(db, assignment_id):
+            db.commit()
+        try:
+            await asyncio.to_thread(build_summary_excel, db, assignment_id, assignment_dir, version)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"生成Excel失败: {str(e)}")
+    
+    members = _export_members(db, current_user, assignment)
+    return StreamingResponse(
+        stream_zip(members),
+        media_type="application/zip",
+        headers=_attachment_headers(f"作业导出_{assignment.title}.zip")
+    )
+
+@router.post("/assignments/{assignment_id}/generate-class-report", status_code=status.HTTP_202_ACCEPTED)
+async def generate_class_report_endpoint(
+    assignment_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """生成全班学情报告（后台任务，重复请求复用进行中的任务）"""
+    if current_user.role.value != "teacher":
+        raise HTTPException(status_code=403, detail="只有教师可以生成报告")
     
-    if not valid_submissions:
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail="作业不存在")
+    if assignment.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权访问此作业")
+    
+    # 快速检查是否有已批改的提交，逐个报告文件的检查在后台任务中进行
+    with_report_count = db.query(Submission).filter(
+        Submission.assignment_id == assignment_id,
+        Submission.report_file_path.isnot(None)
+    ).count()
+    
+    if with_report_count == 0:
         # 提供更详细的错误信息
         total_submissions = db.query(Submission).filter(
             Submission.assignment_id == assignment_id
@@ -450,11 +625,6 @@ async def generate_class_report_endpoint(
             Submission.status == SubmissionStatus.PUBLISHED
         ).count()
         
-        with_report_count = db.query(Submission).filter(
-            Submission.assignment_id == assignment_id,
-            Submission.report_file_path.isnot(None)
-        ).count()
-        
         error_msg = (
             f"没有可用的批改报告。"
             f"总提交数: {total_submissions}, "
@@ -464,77 +634,35 @@ async def generate_class_report_endpoint(
         )
         raise HTTPException(status_code=400, detail=error_msg)
     
-    submissions = valid_submissions
+    job, created = start_class_report_job(db, assignment, current_user.id)
     
-    # 汇总所有学生的批改报告（只提取"批改报告"部分）
-    combined_content = []
-    combined_content.append(f"# 作业：{assignment.title}\n")
-    combined_content.append(f"## 全班学生批改报告汇总\n\n")
+    return {
+        "success": True,
+        "message": "全班学情报告生成任务已创建" if created else "全班学情报告正在生成中",
+        "job": job_to_dict(job)
+    }
+
+@router.get("/assignments/{assignment_id}/class-report-job")
+async def get_class_report_job(
+    assignment_id: int,
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """查询全班学情报告生成任务的进度（最近一次任务）"""
+    if current_user.role.value != "teacher":
+        raise HTTPException(status_code=403, detail="只有教师可以查看报告")
     
-    for idx, submission in enumerate(submissions, 1):
-        if not submission.report_file_path:
-            continue
-        
-        report_path = Path(submission.report_file_path)
-        if not report_path.exists():
-            continue
-        
-        report_content = report_path.read_text(encoding="utf-8")
-        
-        # 提取"批改报告"部分（第二部分）
-        # 查找"## 二、逐题批改简报"或类似标记
-        lines = report_content.split('\n')
-        start_idx = -1
-        for i, line in enumerate(lines):
-            if '##' in line and ('二、' in line or '批改' in line or '简报' in line):
-                start_idx = i
-                break
-        
-        if start_idx >= 0:
-            # 提取从第二部分开始的内容
-            report_section = '\n'.join(lines[start_idx:])
-            combined_content.append(f"---\n\n")
-            combined_content.append(f"### 学生 {idx}: {submission.student.username} (ID: {submission.student.id})\n\n")
-            combined_content.append(report_section)
-            combined_content.append("\n\n")
-    
-    if len(combined_content) <= 2:
-        raise HTTPException(status_code=400, detail="没有可用的批改报告")
-    
-    # 保存汇总的MD文件（保存到教师作业目录）
-    assignment_dir = get_teacher_assignment_dir(current_user, assignment)
-    assignment_dir.mkdir(parents=True, exist_ok=True)
-    combined_md_path = assignment_dir / "combined_reports.md"
-    combined_md_path.write_text('\n'.join(combined_content), encoding="utf-8")
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail="作业不存在")
+    if assignment.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权访问此作业")
     
-    # 调用Gemini生成全班学情报告
-    try:
-        class_report = generate_class_report(combined_md_path)
-        
-        # 保存全班学情报告（使用时间戳保存历史版本）
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        reports_dir = assignment_dir / "class_reports"
-        reports_dir.mkdir(parents=True, exist_ok=True)
-        
-        # 保存带时间戳的报告文件
-        class_report_path = reports_dir / f"class_report_{timestamp}.md"
-        class_report_path.write_text(class_report, encoding="utf-8")
-        
-        # 同时保存最新版本（用于快速访问）
-        latest_report_path = assignment_dir / "class_report_latest.md"
-        latest_report_path.write_text(class_report, encoding="utf-8")
-        
-        return {
-            "success": True,
-            "message": "全班学情报告生成成功",
-            "report_content": class_report,
-            "report_path": str(class_report_path),
-            "timestamp": timestamp,
-            "created_at": datetime.now().isoformat()
-        }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"生成报告失败: {str(e)}")
+    job = get_latest_job(db, assignment_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="尚未创建报告生成任务")
+    
+    return {"job": job_to_dict(job)}
 
 @router.get("/assignments/{assignment_id}/class-reports")
 async def list_class_reports(
@@ -555,7 +683,7 @@ async def list_class_reports(
     # 使用新的目录结构：teachers/{teacher_name}_{teacher_id}/assignments/{assignment_title}_{assignment_id}/class_reports/
     assignment_dir = get_teacher_assignment_dir(current_user, assignment)
     reports_dir = assignment_dir / "class_reports"
-    if not reports_dir.exists():
+    if not pack_archive.exists(reports_dir):
         # 兼容旧格式：尝试查找旧目录（按ID）
         old_reports_dir = UPLOAD_DIR / "class_reports" / str(assignment_id)
         if old_reports_dir.exists():
@@ -570,7 +698,7 @@ async def list_class_reports(
     
     # 获取所有报告文件，按时间倒序排列
     reports = []
-    for report_file in sorted(reports_dir.glob("class_report_*.md"), reverse=True):
+    for report_file in reversed(pack_archive.glob(reports_dir, "class_report_*.md")):
         try:
             timestamp_str = report_file.stem.replace("class_report_", "")
             # 解析时间戳
@@ -586,23 +714,9 @@ async def list_class_reports(
     
     return {"reports": reports}
 
-@router.get("/assignments/{assignment_id}/class-report")
-async def get_class_report(
-    assignment_id: int,
-    timestamp: str = Query(None, description="报告时间戳，不提供则返回最新报告"),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
-):
-    """获取全班学情报告（默认最新，或指定时间戳）"""
-    if current_user.role.value != "teacher":
-        raise HTTPException(status_code=403, detail="只有教师可以查看报告")
-    
-    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
-    if not assignment:
-        raise HTTPException(status_code=404, detail="作业不存在")
-    if assignment.teacher_id != current_user.id:
-        raise HTTPException(status_code=403, detail="无权访问此作业")
-    
+def _resolve_class_report_path(current_user, assignment: Assignment, timestamp: Optional[str]) -> Path:
+    """全班报告文件路径（默认最新，或指定时间戳），兼容旧的目录结构"""
+    assignment_id = assignment.id
     assignment_dir = get_teacher_assignment_dir(current_user, assignment)
     
     if timestamp:
@@ -610,7 +724,7 @@ async def get_class_report(
         reports_dir = assignment_dir / "class_reports"
         class_report_path = reports_dir / f"class_report_{timestamp}.md"
         # 兼容旧格式
-        if not class_report_path.exists():
+        if not pack_archive.exists(class_report_path):
             # 尝试旧格式：class_reports/{assignment_id}/
             old_reports_dir = UPLOAD_DIR / "class_reports" / str(assignment_id)
             if old_reports_dir.exists():
@@ -623,7 +737,7 @@ async def get_class_report(
     else:
         # 获取最新报告
         class_report_path = assignment_dir / "class_report_latest.md"
-        if not class_report_path.exists():
+        if not pack_archive.exists(class_report_path):
             # 兼容旧版本：尝试查找旧格式的报告
             # 1. 尝试旧格式：teachers/{teacher_id}/assignments/{assignment_id}/class_report_latest.md
             old_latest_path = TEACHERS_DIR / str(current_user.id) / "assignments" / str(assignment_id) / "class_report_latest.md"
@@ -640,13 +754,54 @@ async def get_class_report(
                 if old_report_path.exists():
                     class_report_path = old_report_path
     
-    if not class_report_path.exists():
+    if not pack_archive.exists(class_report_path):
         raise HTTPException(status_code=404, detail="报告尚未生成，请先生成报告")
+    return class_report_path
+
+def _get_teacher_assignment(db: Session, assignment_id: int, current_user) -> Assignment:
+    if current_user.role.value != "teacher":
+        raise HTTPException(status_code=403, detail="只有教师可以查看报告")
     
-    return {
-        "content": class_report_path.read_text(encoding="utf-8"),
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail="作业不存在")
+    if assignment.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="无权访问此作业")
+    return assignment
+
+@router.get("/assignments/{assignment_id}/class-report")
+async def get_class_report(
+    assignment_id: int,
+    request: Request,
+    timestamp: str = Query(None, description="报告时间戳，不提供则返回最新报告"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """获取全班学情报告（默认最新，或指定时间戳）"""
+    assignment = _get_teacher_assignment(db, assignment_id, current_user)
+    class_report_path = _resolve_class_report_path(current_user, assignment, timestamp)
+    
+    etag = make_etag(pack_archive.digest(class_report_path), timestamp)
+    if is_not_modified(request, etag):
+        return not_modified_response(etag)
+    
+    return JSONResponse({
+        "content": pack_archive.read_text(class_report_path),
         "timestamp": timestamp
-    }
+    }, headers=cache_headers(etag))
+
+@router.get("/assignments/{assignment_id}/class-report/file")
+async def get_class_report_file(
+    assignment_id: int,
+    request: Request,
+    timestamp: str = Query(None, description="报告时间戳，不提供则返回最新报告"),
+    current_user: TokenIdentity = Depends(get_current_identity),
+    db: Session = Depends(get_db)
+):
+    """直接发送全班学情报告（Markdown，优先发送预压缩副本）"""
+    assignment = _get_teacher_assignment(db, assignment_id, current_user)
+    class_report_path = _resolve_class_report_path(current_user, assignment, timestamp)
+    return await report_file_response(request, class_report_path)
 
 @router.post("/assignments/{assignment_id}/publish-reports")
 async def publish_reports(
@@ -680,3 +835,102 @@ async def publish_reports(
         "message": f"已发布 {len(submissions)} 份报告给学生"
     }
 
+
+@router.post("/roster/import")
+async def import_roster(
+    roster_file: UploadFile = File(...),
+    class_id: Optional[str] = Form(None, description="导入到的班级，默认教师所在班级"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """批量导入班级花名册（姓名、学号、初始密码），为学生创建账号"""
+    if current_user.role.value != "teacher":
+        raise HTTPException(status_code=403, detail="只有教师可以导入花名册")
+    
+    target_class_id = (class_id or current_user.class_id).strip()
+    
+    try:
+        rows = parse_roster(roster_file.filename, await roster_file.read())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not rows:
+        raise HTTPException(status_code=400, detail="花名册中没有学生数据")
+    
+    report = {row.row: {"row": row.row, "username": row.username, "student_id": row.student_id,
+                        "status": "pending", "reason": None}
+              for row in rows}
+    
+    def reject(row, reason):
+        report[row.row]["status"] = "error"
+        report[row.row]["reason"] = reason
+    
+    # 文件内校验：必填字段与重复
+    seen_usernames, seen_student_ids = set(), set()
+    candidates = []
+    for row in rows:
+        if not row.username or not row.student_id or not row.password:
+            reject(row, "姓名、学号和初始密码均不能为空")
+        elif row.username in seen_usernames:
+            reject(row, "花名册中姓名重复")
+        elif row.student_id in seen_student_ids:
+            reject(row, "花名册中学号重复")
+        else:
+            candidates.append(row)
+        seen_usernames.add(row.username)
+        seen_student_ids.add(row.student_id)
+    
+    # 与已有账号的唯一性校验（一次查询）
+    if candidates:
+        existing = db.query(User.username, User.student_id, User.role).filter(
+            or_(
+                User.username.in_([r.username for r in candidates]),
+                and_(
+                    User.student_id.in_([r.student_id for r in candidates]),
+                    User.role == UserRole.STUDENT
+                )
+            )
+        ).all()
+        taken_usernames = {u.username for u in existing}
+        taken_student_ids = {u.student_id for u in existing if u.role == UserRole.STUDENT}
+        remaining = []
+        for row in candidates:
+            if row.username in taken_usernames:
+                reject(row, "用户名已存在")
+            elif row.student_id in taken_student_ids:
+                reject(row, "该学号已被注册")
+            else:
+                remaining.append(row)
+        candidates = remaining
+    
+    # 归还数据库连接后并行计算密码哈希
+    db.rollback()
+    password_hashes = await asyncio.gather(*(hash_password_async(r.password) for r in candidates))
+    
+    # 单个事务批量插入
+    if candidates:
+        db.add_all([
+            User(
+                username=row.username,
+                password_hash=password_hash,
+                role=UserRole.STUDENT,
+                class_id=target_class_id,
+                student_id=row.student_id
+            )
+            for row, password_hash in zip(candidates, password_hashes)
+        ])
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="导入期间有账号被同时注册，请重新导入")
+        for row in candidates:
+            report[row.row]["status"] = "created"
+    
+    created_count = len(candidates)
+    return {
+        "success": True,
+        "class_id": target_class_id,
+        "created_count": created_count,
+        "error_count": len(rows) - created_count,
+        "rows": list(report.values())
+    }
@@ -91,6 +91,19 @@ class SubmissionDetail(BaseModel):
     class Config:
         from_attributes = True
 
+# 可续传上传
+class UploadCreate(BaseModel):
+    filename: str
+    size: int  # 文件总字节数
+
+class UploadStatusResponse(BaseModel):
+    upload_id: str
+    filename: str
+    size: int
+    offset: int  # 已接收的字节数，续传时从这里开始
+    chunk_size: int  # 建议的分块大小
+    submission_id: Optional[int] = None  # 已完成时为创建的提交ID
+
 # 学情分析
 class QuestionStats(BaseModel):
     key: str
@@ -0,0 +1,289 @@
+"""
+跨作业的学情分析（学生成绩趋势、知识点热力图、风险学生识别）
+
+每个（教师, 班级）的逐题结果以pandas DataFrame缓存在进程内，查询时向量化计算。
+每次查询先做一次聚合查询检查数据是否变化：有新的批改结果时只拉取更新时间不早于上次水位的提交
+及其逐题记录，替换DataFrame中对应的行；提交被删除等无法增量处理的情况则整体重建。
+"""
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Assignment, AssignmentStatus, Submission, SubmissionQuestion, User, UserRole
+from app.core.ttl_cache import TTLCache
+from app.services.assignment_stats import GRADE_POINTS
+
+# 逐题状态折算的得分
+STATUS_SCORES = {"正确": 1.0, "过程部分正确": 0.5, "答案正确结果错误": 0.5}
+
+# 风险学生判定：最近几次作业的平均分值低于阈值、成绩持续下降、或多次未提交
+AT_RISK_RECENT = int(os.getenv("AT_RISK_RECENT", "3"))
+AT_RISK_MIN_POINTS = float(os.getenv("AT_RISK_MIN_POINTS", str(GRADE_POINTS["C"])))
+AT_RISK_SLOPE = float(os.getenv("AT_RISK_SLOPE", "-1.0"))  # 每次作业下降的分值
+AT_RISK_MISSING = int(os.getenv("AT_RISK_MISSING", "2"))
+
+SUBMISSION_COLUMNS = ["submission_id", "assignment_id", "student_id", "grade", "points"]
+QUESTION_COLUMNS = ["submission_id", "assignment_id", "student_id", "section", "score"]
+
+
+def section_of(key: str) -> str:
+    """题目键的章节部分，如 "§2.5 T6" -> "§2.5"；没有章节时归为"未分章节" """
+    parts = key.split()
+    return parts[0] if len(parts) > 1 else "未分章节"
+
+
+@dataclass
+class _ClassFrames:
+    submissions: "object"  # pandas.DataFrame，列见 SUBMISSION_COLUMNS
+    questions: "object"  # pandas.DataFrame，列见 QUESTION_COLUMNS
+    watermark: Optional[datetime]
+    count: int
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+_frames_cache = TTLCache(maxsize=256, ttl=float(os.getenv("ANALYTICS_CACHE_TTL", "86400")))
+
+
+def _stamp():
+    return func.coalesce(Submission.updated_at, Submission.created_at)
+
+
+def _assignment_ids_query(db: Session, teacher_id: int, class_id: str):
+    return db.query(Assignment.id).filter(
+        Assignment.teacher_id == teacher_id,
+        Assignment.class_id == class_id
+    )
+
+
+def _load_rows(db: Session, assignment_ids_query, since: Optional[datetime]):
+    """读取提交和逐题记录（since 不为空时只读取更新时间不早于 since 的提交）"""
+    import pandas as pd
+
+    sub_query = db.query(
+        Submission.id, Submission.assignment_id, Submission.student_id, Submission.grade
+    ).filter(Submission.assignment_id.in_(assignment_ids_query))
+    if since is not None:
+        sub_query = sub_query.filter(_stamp() >= since)
+    sub_rows = sub_query.all()
+
+    submissions = pd.DataFrame(
+        [(sid, aid, uid, grade, GRADE_POINTS.get(grade)) for sid, aid, uid, grade in sub_rows],
+        columns=SUBMISSION_COLUMNS
+    )
+    submissions["points"] = submissions["points"].astype(float)
+
+    q_query = db.query(
+        SubmissionQuestion.submission_id, SubmissionQuestion.assignment_id,
+        Submission.student_id, SubmissionQuestion.key, SubmissionQuestion.status
+    ).join(Submission, Submission.id == SubmissionQuestion.submission_id).filter(
+        SubmissionQuestion.assignment_id.in_(assignment_ids_query)
+    )
+    if since is not None:
+        q_query = q_query.filter(_stamp() >= since)
+    questions = pd.DataFrame(
+        [(sid, aid, uid, section_of(key), STATUS_SCORES.get(status, 0.0))
+         for sid, aid, uid, key, status in q_query.all()],
+        columns=QUESTION_COLUMNS
+    )
+    questions["score"] = questions["score"].astype(float)
+    return submissions, questions
+
+
+def _data_version(db: Session, assignment_ids_query) -> Tuple[int, Optional[datetime]]:
+    return db.query(func.count(Submission.id), func.max(_stamp())).filter(
+        Submission.assignment_id.in_(assignment_ids_query)
+    ).one()
+
+
+def get_class_frames(db: Session, teacher_id: int, class_id: str) -> _ClassFrames:
+    """返回（必要时增量刷新）某教师某班级的逐题结果DataFrame"""
+    import pandas as pd
+
+    key = (teacher_id, class_id)
+    aid_query = _assignment_ids_query(db, teacher_id, class_id)
+    count, latest = _data_version(db, aid_query)
+
+    frames = _frames_cache.get(key)
+    if frames is None:
+        submissions, questions = _load_rows(db, aid_query, None)
+        frames = _ClassFrames(submissions, questions, latest, count)
+        _frames_cache.set(key, frames)
+        return frames
+
+    with frames.lock:
+        if count == frames.count and latest == frames.watermark:
+            return frames
+        if latest is not None and frames.watermark is not None and count >= frames.count:
+            # 增量：替换水位之后更新过的提交。时间戳只精确到秒（SQLite中按字符串比较），
+            # 向前多取一秒，保证与水位同一秒内更新的提交也会重新读取
+            new_subs, new_questions = _load_rows(db, aid_query, frames.watermark - timedelta(seconds=1))
+            changed = set(new_subs["submission_id"])
+            submissions = pd.concat(
+                [frames.submissions[~frames.submissions["submission_id"].isin(changed)], new_subs],
+                ignore_index=True
+            )
+            questions = pd.concat(
+                [frames.questions[~frames.questions["submission_id"].isin(changed)], new_questions],
+                ignore_index=True
+            )
+            if len(submissions) == count:
+                frames.submissions, frames.questions = submissions, questions
+                frames.watermark, frames.count = latest, count
+                return frames
+        # 有提交被删除等情况：整体重建
+        frames.submissions, frames.questions = _load_rows(db, aid_query, None)
+        frames.watermark, frames.count = latest, count
+        return frames
+
+
+def _class_assignments(db: Session, teacher_id: int, class_id: str) -> List[Assignment]:
+    """已发布的作业（按布置顺序）"""
+    return db.query(Assignment).filter(
+        Assignment.teacher_id == teacher_id,
+        Assignment.class_id == class_id,
+        Assignment.status != AssignmentStatus.DRAFT
+    ).order_by(Assignment.created_at, Assignment.id).all()
+
+
+def _slope(values) -> Optional[float]:
+    """按作业顺序的线性趋势（每次作业的变化量）"""
+    import numpy as np
+
+    y = np.asarray(values, dtype=float)
+    mask = ~np.isnan(y)
+    if mask.sum() < 2:
+        return None
+    x = np.arange(len(y))[mask]
+    return float(np.polyfit(x, y[mask], 1)[0])
+
+
+def _none_if_nan(value):
+    import math
+    return None if value is None or (isinstance(value, float) and math.isnan(value)) else value
+
+
+def student_trend(db: Session, teacher_id: int, student: User) -> Dict:
+    """学生在本学期各次作业中的等级与正确率，以及班级平均正确率"""
+    frames = get_class_frames(db, teacher_id, student.class_id)
+    assignments = _class_assignments(db, teacher_id, student.class_id)
+
+    subs = frames.submissions
+    qs = frames.questions
+    own = subs[subs["student_id"] == student.id].set_index("assignment_id")
+    own_accuracy = qs[qs["student_id"] == student.id].groupby("assignment_id")["score"].mean()
+    class_accuracy = qs.groupby("assignment_id")["score"].mean()
+
+    points = []
+    series = []
+    for a in assignments:
+        submitted = a.id in own.index
+        point = own.at[a.id, "points"] if submitted else float("nan")
+        points.append(point)
+        series.append({
+            "assignment_id": a.id,
+            "title": a.title,
+            "created_at": a.created_at.isoformat() if a.created_at else None,
+            "submitted": submitted,
+            "grade": own.at[a.id, "grade"] if submitted else None,
+            "points": _none_if_nan(float(point)),
+            "accuracy": _none_if_nan(round(float(own_accuracy.get(a.id, float("nan"))), 4)),
+            "class_accuracy": _none_if_nan(round(float(class_accuracy.get(a.id, float("nan"))), 4)),
+        })
+
+    slope = _slope(points)
+    return {
+        "student_id": student.id,
+        "student_name": student.username,
+        "class_id": student.class_id,
+        "series": series,
+        "trend": round(slope, 4) if slope is not None else None,
+    }
+
+
+def section_heatmap(db: Session, teacher_id: int, class_id: str) -> Dict:
+    """章节 × 作业 的平均得分矩阵，章节按整体得分从低到高排列（最薄弱的在前）"""
+    frames = get_class_frames(db, teacher_id, class_id)
+    assignments = _class_assignments(db, teacher_id, class_id)
+    qs = frames.questions
+
+    assignment_ids = [a.id for a in assignments]
+    if qs.empty:
+        return {"class_id": class_id, "sections": [], "assignments": [], "values": [], "overall": []}
+
+    matrix = qs.pivot_table(index="section", columns="assignment_id", values="score", aggfunc="mean")
+    matrix = matrix.reindex(columns=assignment_ids)
+    overall = qs.groupby("section")["score"].agg(["mean", "count"]).sort_values("mean")
+    matrix = matrix.reindex(index=overall.index)
+
+    return {
+        "class_id": class_id,
+        "sections": list(matrix.index),
+        "assignments": [{"assignment_id": a.id, "title": a.title} for a in assignments],
+        "values": [
+            [None if v != v else round(float(v), 4) for v in row]
+            for row in matrix.to_numpy()
+        ],
+        "overall": [
+            {"section": section, "accuracy": round(float(row["mean"]), 4), "answered": int(row["count"])}
+            for section, row in overall.iterrows()
+        ],
+    }
+
+
+def at_risk_students(db: Session, teacher_id: int, class_id: str) -> Dict:
+    """识别风险学生：最近作业平均等级偏低、成绩下降趋势明显、或多次未提交"""
+    import numpy as np
+
+    frames = get_class_frames(db, teacher_id, class_id)
+    assignments = _class_assignments(db, teacher_id, class_id)
+    students = db.query(User).filter(
+        User.class_id == class_id,
+        User.role == UserRole.STUDENT
+    ).order_by(User.id).all()
+
+    assignment_ids = [a.id for a in assignments]
+    if not assignment_ids or not students:
+        return {"class_id": class_id, "students": []}
+
+    # 学生 × 作业 的分值矩阵（未提交或未批改为NaN）
+    points = frames.submissions.pivot_table(
+        index="student_id", columns="assignment_id", values="points", aggfunc="max"
+    ).reindex(index=[s.id for s in students], columns=assignment_ids)
+    submitted = frames.submissions.pivot_table(
+        index="student_id", columns="assignment_id", values="submission_id", aggfunc="count"
+    ).reindex(index=[s.id for s in students], columns=assignment_ids).fillna(0) > 0
+
+    matrix = points.to_numpy(dtype=float)
+    recent = matrix[:, -AT_RISK_RECENT:]
+    graded = (~np.isnan(recent)).sum(axis=1)
+    recent_avg = np.where(graded > 0, np.nansum(recent, axis=1) / np.maximum(graded, 1), np.nan)
+    missing = (~submitted.to_numpy()).sum(axis=1)
+
+    flagged = []
+    for i, student in enumerate(students):
+        reasons = []
+        avg = recent_avg[i]
+        slope = _slope(matrix[i])
+        if not np.isnan(avg) and avg < AT_RISK_MIN_POINTS:
+            reasons.append(f"最近{min(AT_RISK_RECENT, len(assignment_ids))}次作业平均等级偏低")
+        if slope is not None and slope <= AT_RISK_SLOPE:
+            reasons.append("成绩呈下降趋势")
+        if missing[i] >= AT_RISK_MISSING:
+            reasons.append(f"{int(missing[i])}次作业未提交")
+        if reasons:
+            flagged.append({
+                "student_id": student.id,
+                "student_name": student.username,
+                "recent_average_points": None if np.isnan(avg) else round(float(avg), 2),
+                "trend": round(slope, 4) if slope is not None else None,
+                "missing_count": int(missing[i]),
+                "reasons": reasons,
+            })
+
+    flagged.sort(key=lambda s: (-len(s["reasons"]), s["student_id"]))
+    return {"class_id": class_id, "assignment_count": len(assignment_ids), "students": flagged}
@@ -0,0 +1,160 @@
+"""
+已关闭作业的归档
+
+将已关闭（CLOSED）作业的批改报告、JSON、全班报告及其缓存等小文件打包为zstd压缩的归档包，
+并删除原文件及其 .gz/.br 压缩副本。每个作业有两个归档包：
+- 学生提交目录 uploads/submissions/{class_id}/{assignment_id}/archive.zpack
+- 教师作业目录 uploads/teachers/.../assignments/{title}_{id}/archive.zpack
+PDF（作业原件、教师上传的源文件）和Excel汇总不归档。报告接口通过 app.core.pack_archive 透明读取归档内容。
+
+归档后新生成的文件（如重新生成全班报告）留在磁盘上并优先读取，再次归档时合并进归档包：
+
+    python -m app.services.archival run [--assignment-id N] [--older-than-days D] [--dry-run]
+"""
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Assignment, AssignmentStatus
+from app.core import pack_archive
+from app.core.file_utils import SUBMISSIONS_DIR, get_teacher_assignment_dir
+from app.core.report_files import SIDECAR_SUFFIXES
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_SUFFIXES = (".md", ".json")
+
+
+@dataclass
+class ArchiveResult:
+    directory: str
+    files: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    removed: List[str] = field(default_factory=list)
+
+
+def _collect_files(directory: Path) -> Dict[str, Path]:
+    files = {}
+    for path in sorted(directory.rglob("*")):
+        if path.is_file() and path.suffix in ARCHIVE_SUFFIXES:
+            files[path.relative_to(directory).as_posix()] = path
+    return files
+
+
+def _remove_empty_dirs(directory: Path) -> None:
+    for path in sorted(directory.rglob("*"), key=lambda p: len(p.parts), reverse=True):
+        if path.is_dir():
+            try:
+                path.rmdir()
+            except OSError:
+                pass
+
+
+def archive_directory(directory: Path, dry_run: bool = False) -> Optional[ArchiveResult]:
+    """将目录下的报告和JSON打包（与已有归档包合并），校验后删除原文件"""
+    if not directory.is_dir():
+        return None
+    files = _collect_files(directory)
+    if not files:
+        return None
+
+    result = ArchiveResult(directory=str(directory), files=len(files))
+    result.bytes_in = sum(p.stat().st_size for p in files.values())
+    if dry_run:
+        return result
+
+    contents = {}
+    pack_path = directory / pack_archive.PACK_NAME
+    if pack_path.exists():
+        contents.update(pack_archive.iter_pack(pack_path))
+    for name, path in files.items():
+        contents[name] = path.read_bytes()  # 磁盘上的文件比归档包中的新
+
+    index = pack_archive.write_pack(pack_path, sorted(contents.items()))
+
+    # 逐个校验后再删除原文件
+    for name, path in files.items():
+        if pack_archive.read_bytes(path) != contents[name]:
+            raise RuntimeError(f"归档校验失败: {path}")
+    for name, path in files.items():
+        for suffix in SIDECAR_SUFFIXES.values():
+            path.with_name(path.name + suffix).unlink(missing_ok=True)
+        path.unlink()
+        result.removed.append(name)
+    _remove_empty_dirs(directory)
+
+    result.files = len(index.entries)
+    result.bytes_out = pack_path.stat().st_size
+    return result
+
+
+def assignment_directories(assignment: Assignment) -> List[Path]:
+    return [
+        SUBMISSIONS_DIR / assignment.class_id / str(assignment.id),
+        get_teacher_assignment_dir(assignment.teacher, assignment),
+    ]
+
+
+def archive_assignment(assignment: Assignment, dry_run: bool = False) -> List[ArchiveResult]:
+    """归档一个已关闭的作业"""
+    if assignment.status != AssignmentStatus.CLOSED:
+        raise ValueError("只能归档已关闭的作业")
+    results = []
+    for directory in assignment_directories(assignment):
+        result = archive_directory(directory, dry_run=dry_run)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def closed_assignments(db: Session, older_than_days: int = 0) -> List[Assignment]:
+    """已关闭且最近 older_than_days 天内没有修改的作业"""
+    query = db.query(Assignment).filter(Assignment.status == AssignmentStatus.CLOSED)
+    if older_than_days > 0:
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        query = query.filter(func.coalesce(Assignment.updated_at, Assignment.created_at) <= cutoff)
+    return query.order_by(Assignment.id).all()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="已关闭作业的归档")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="将已关闭作业的报告和JSON打包为归档包")
+    run.add_argument("--assignment-id", type=int, help="只归档指定作业（默认全部已关闭作业）")
+    run.add_argument("--older-than-days", type=int, default=int(os.getenv("ARCHIVE_AFTER_DAYS", "0")),
+                     help="只归档关闭后超过指定天数未修改的作业")
+    run.add_argument("--dry-run", action="store_true", help="只统计，不写入归档包")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    db = SessionLocal()
+    try:
+        if args.assignment_id is not None:
+            assignments = db.query(Assignment).filter(Assignment.id == args.assignment_id).all()
+        else:
+            assignments = closed_assignments(db, args.older_than_days)
+        for assignment in assignments:
+            try:
+                results = archive_assignment(assignment, dry_run=args.dry_run)
+            except ValueError as e:
+                print(f"作业 {assignment.id}: {e}")
+                continue
+            for r in results:
+                ratio = f"，压缩后 {r.bytes_out} 字节" if r.bytes_out else ""
+                print(f"作业 {assignment.id}: {r.directory} 共 {r.files} 个文件，{r.bytes_in} 字节{ratio}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
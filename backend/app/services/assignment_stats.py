@@ -0,0 +1,308 @@
+"""
+作业学情统计汇总
+
+assignment_stats 表保存每个作业的等级分布、平均等级、逐题统计和低分学生，
+在提交创建、批改或重新批改时与提交记录在同一事务中增量更新，统计接口直接读取汇总行。
+多个进程（Web进程内批改和独立Worker）同时批改时，先以UPDATE取得汇总行的写锁再读取并修改，
+写锁保持到事务提交，对同一作业汇总的修改依次进行，不会互相覆盖。
+汇总行缺失时会从提交记录（和旧的JSON文件）重建；出现偏差时可用命令行重建：
+
+    python -m app.services.assignment_stats rebuild [--assignment-id N]
+"""
+import json
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.models import (
+    Assignment, AssignmentStatsAggregate, Submission, SubmissionQuestion
+)
+from app.core import pack_archive
+from app.core.json_processor import question_key
+
+logger = logging.getLogger(__name__)
+
+# 等级分值（用于计算平均等级，简化处理）
+GRADE_POINTS = {"A+": 10, "A": 9, "A-": 8, "B+": 7, "B": 6, "B-": 5,
+                "C+": 4, "C": 3, "C-": 2, "D": 1, "F": 0}
+GRADE_BY_POINTS = {v: k for k, v in GRADE_POINTS.items()}
+LOW_SCORE_GRADES = ("D", "F", "C-", "C")
+
+
+def _status_bucket(status: str) -> str:
+    if status == "正确":
+        return "correct"
+    if status == "过程部分正确":
+        return "partial"
+    return "wrong"
+
+
+def _apply_contribution(
+    agg: AssignmentStatsAggregate,
+    submission: Submission,
+    grade: Optional[str],
+    questions: List[Dict],
+    sign: int
+) -> None:
+    """将一份提交的等级与逐题结果计入（sign=1）或移出（sign=-1）汇总"""
+    grade_distribution = dict(agg.grade_distribution or {})
+    question_stats = {k: dict(v) for k, v in (agg.question_stats or {}).items()}
+    low_score_students = [s for s in (agg.low_score_students or [])
+                          if s.get("student_id") != submission.student_id]
+
+    if grade:
+        count = grade_distribution.get(grade, 0) + sign
+        if count > 0:
+            grade_distribution[grade] = count
+        else:
+            grade_distribution.pop(grade, None)
+        if grade in GRADE_POINTS:
+            agg.grade_points_total += sign * GRADE_POINTS[grade]
+            agg.grade_points_count += sign
+        if sign > 0 and grade in LOW_SCORE_GRADES:
+            low_score_students.append({
+                "student_id": submission.student.id,
+                "student_name": submission.student.username,
+                "grade": grade
+            })
+
+    for q in questions:
+        key = q["key"]
+        stats = question_stats.setdefault(key, {"correct": 0, "partial": 0, "wrong": 0, "total": 0})
+        stats[_status_bucket(q["status"])] += sign
+        stats["total"] += sign
+        if stats["total"] <= 0:
+            question_stats.pop(key)
+
+    # JSON列不跟踪原地修改，整体赋值
+    agg.grade_distribution = grade_distribution
+    agg.question_stats = question_stats
+    agg.low_score_students = low_score_students
+
+
+def normalize_questions(raw_questions: List[Dict]) -> List[Dict]:
+    """将JSON中的题目列表规范为 [{key, status}]，忽略没有题号的条目"""
+    questions = []
+    for q in raw_questions or []:
+        key = question_key(q)
+        if key:
+            questions.append({"key": key, "status": str(q.get("status", "")).strip()})
+    return questions
+
+
+def _load_questions_from_json(submission: Submission) -> List[Dict]:
+    """从旧的JSON文件读取逐题结果（数据库中还没有逐题记录的提交）"""
+    if not submission.json_file_path:
+        return []
+    json_path = Path(submission.json_file_path)
+    if not pack_archive.exists(json_path):
+        return []
+    try:
+        data = json.loads(pack_archive.read_text(json_path))
+    except Exception as e:
+        logger.warning(f"解析JSON文件失败 {json_path}: {e}")
+        return []
+    return normalize_questions(data.get("questions", []))
+
+
+def backfill_question_rows(db: Session, assignment_id: int) -> int:
+    """为已有JSON文件但没有逐题记录的提交补充逐题记录，返回补充的提交数"""
+    has_rows = db.query(SubmissionQuestion.submission_id).filter(
+        SubmissionQuestion.submission_id == Submission.id
+    ).exists()
+    pending = db.query(Submission).filter(
+        Submission.assignment_id == assignment_id,
+        Submission.json_file_path.isnot(None),
+        ~has_rows
+    ).all()
+    for submission in pending:
+        for q in _load_questions_from_json(submission):
+            db.add(SubmissionQuestion(
+                submission_id=submission.id,
+                assignment_id=assignment_id,
+                key=q["key"],
+                status=q["status"]
+            ))
+    if pending:
+        db.flush()
+    return len(pending)
+
+
+def rebuild_assignment_stats(db: Session, assignment_id: int) -> AssignmentStatsAggregate:
+    """从提交记录完整重建作业的统计汇总（调用方负责commit）"""
+    backfill_question_rows(db, assignment_id)
+
+    agg = db.query(AssignmentStatsAggregate).filter(
+        AssignmentStatsAggregate.assignment_id == assignment_id
+    ).with_for_update().first()
+    if agg is None:
+        agg = AssignmentStatsAggregate(assignment_id=assignment_id, version=0)
+        db.add(agg)
+    agg.submitted_count = 0
+    agg.grade_points_total = 0
+    agg.grade_points_count = 0
+    agg.grade_distribution = {}
+    agg.question_stats = {}
+    agg.low_score_students = []
+
+    questions_by_submission: Dict[int, List[Dict]] = {}
+    rows = db.query(SubmissionQuestion).filter(
+        SubmissionQuestion.assignment_id == assignment_id
+    ).order_by(SubmissionQuestion.id).all()
+    for row in rows:
+        questions_by_submission.setdefault(row.submission_id, []).append(
+            {"key": row.key, "status": row.status}
+        )
+
+    submissions = db.query(Submission).filter(
+        Submission.assignment_id == assignment_id
+    ).order_by(Submission.id).all()
+    for submission in submissions:
+        agg.submitted_count += 1
+        _apply_contribution(agg, submission, submission.grade,
+                            questions_by_submission.get(submission.id, []), 1)
+
+    agg.version = (agg.version or 0) + 1
+    db.flush()
+    return agg
+
+
+def _locked_aggregate(db: Session, assignment_id: int) -> Optional[AssignmentStatsAggregate]:
+    """
+    取得汇总行的写锁后读取最新值；写锁保持到调用方commit或rollback
+    SQLite忽略 SELECT ... FOR UPDATE，且只有写语句才会开启事务，所以先执行一条UPDATE（递增version）：
+    SQLite上取得数据库写锁，PostgreSQL等取得行锁。之后的读取一定能看到其他事务已提交的修改。
+    """
+    locked = db.query(AssignmentStatsAggregate).filter(
+        AssignmentStatsAggregate.assignment_id == assignment_id
+    ).update({"version": AssignmentStatsAggregate.version + 1}, synchronize_session=False)
+    if not locked:
+        return None
+    return db.query(AssignmentStatsAggregate).filter(
+        AssignmentStatsAggregate.assignment_id == assignment_id
+    ).populate_existing().with_for_update().first()
+
+
+def get_assignment_aggregate(db: Session, assignment_id: int) -> AssignmentStatsAggregate:
+    """获取作业的统计汇总，不存在时从提交记录重建"""
+    agg = db.query(AssignmentStatsAggregate).filter(
+        AssignmentStatsAggregate.assignment_id == assignment_id
+    ).first()
+    if agg is None:
+        agg = rebuild_assignment_stats(db, assignment_id)
+        db.commit()
+    return agg
+
+
+def record_submissions_created(db: Session, assignment_id: int, count: int) -> None:
+    """新提交计入提交人数（在提交记录flush之后、commit之前调用）"""
+    updated = db.query(AssignmentStatsAggregate).filter(
+        AssignmentStatsAggregate.assignment_id == assignment_id
+    ).update({
+        "submitted_count": AssignmentStatsAggregate.submitted_count + count,
+        "version": AssignmentStatsAggregate.version + 1,
+    }, synchronize_session=False)
+    if not updated:
+        # 重建时已包含这些提交
+        rebuild_assignment_stats(db, assignment_id)
+
+
+def record_submission_created(db: Session, submission: Submission) -> None:
+    record_submissions_created(db, submission.assignment_id, 1)
+
+
+def record_grading_result(db: Session, submission: Submission, grade: str, raw_questions: List[Dict]) -> None:
+    """
+    写入提交的（重新）批改结果：更新等级、逐题记录和统计汇总。
+    调用方负责commit，使提交状态与统计在同一事务中生效。
+    """
+    questions = normalize_questions(raw_questions)
+    agg = _locked_aggregate(db, submission.assignment_id)
+    if agg is None:
+        # 从当前（批改前）的提交记录重建，再按增量方式更新
+        agg = rebuild_assignment_stats(db, submission.assignment_id)
+    else:
+        # 取得写锁前读取的提交可能已被其他进程重新批改，以最新的等级和逐题记录为准
+        db.refresh(submission, ["grade", "questions"])
+
+    old_questions = [{"key": q.key, "status": q.status} for q in submission.questions]
+    _apply_contribution(agg, submission, submission.grade, old_questions, -1)
+
+    submission.questions = [
+        SubmissionQuestion(assignment_id=submission.assignment_id, key=q["key"], status=q["status"])
+        for q in questions
+    ]
+    submission.grade = grade
+    _apply_contribution(agg, submission, grade, questions, 1)
+
+
+def average_grade(points_total: int, points_count: int) -> Optional[str]:
+    """平均分值对应的等级（最接近的等级，距离相同时取较高的）；统计页和教师首页共用"""
+    if not points_count:
+        return None
+    avg_point = points_total / points_count
+    closest = min(GRADE_BY_POINTS.keys(), key=lambda x: abs(x - avg_point))
+    return GRADE_BY_POINTS[closest]
+
+
+def grade_points(distribution: Dict[str, int]) -> Tuple[int, int]:
+    """按等级分布计算 (分值总和, 计分人数)，与汇总行中的 grade_points_total / grade_points_count 一致"""
+    total = sum(GRADE_POINTS[g] * n for g, n in distribution.items() if g in GRADE_POINTS)
+    count = sum(n for g, n in distribution.items() if g in GRADE_POINTS)
+    return total, count
+
+
+def stats_to_dict(agg: AssignmentStatsAggregate, total_students: int) -> dict:
+    """转换为 AssignmentStats 响应格式"""
+
+    submitted_count = agg.submitted_count
+    submission_rate = (submitted_count / total_students * 100) if total_students > 0 else 0
+
+    return {
+        "total_students": total_students,
+        "submitted_count": submitted_count,
+        "submission_rate": round(submission_rate, 2),
+        "average_grade": average_grade(agg.grade_points_total, agg.grade_points_count),
+        "grade_distribution": dict(agg.grade_distribution or {}),
+        "question_stats": [
+            {
+                "key": key,
+                "correct_count": stats["correct"],
+                "partial_count": stats["partial"],
+                "wrong_count": stats["wrong"],
+                "total_count": stats["total"]
+            }
+            for key, stats in (agg.question_stats or {}).items()
+        ],
+        "low_score_students": list(agg.low_score_students or [])
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+    from app.database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="作业学情统计汇总维护")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rebuild = sub.add_parser("rebuild", help="从提交记录重建统计汇总")
+    rebuild.add_argument("--assignment-id", type=int, help="只重建指定作业（默认全部）")
+    args = parser.parse_args(argv)
+
+    db = SessionLocal()
+    try:
+        if args.assignment_id is not None:
+            assignment_ids = [args.assignment_id]
+        else:
+            assignment_ids = [a.id for a in db.query(Assignment.id).order_by(Assignment.id).all()]
+        for assignment_id in assignment_ids:
+            agg = rebuild_assignment_stats(db, assignment_id)
+            db.commit()
+            print(f"作业 {assignment_id}: 提交 {agg.submitted_count}, 版本 {agg.version}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+教师批量上传扫描作业（ZIP）
+
+ZIP中的文件名格式为 {学号}-{姓名}-homework.pdf，按学号匹配本班学生，
+为每个匹配的学生创建提交记录并加入批改队列。ZIP直接从上传的临时文件中逐个读取条目，
+不会整体载入内存。
+"""
+import asyncio
+import logging
+import zipfile
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Dict, List
+
+from sqlalchemy.orm import Session
+
+from app.models import Assignment, Submission, SubmissionStatus, User, UserRole
+from app.core.json_processor import parse_name_id_from_filename
+from app.core.storage import get_storage
+from app.services.assignment_stats import record_submissions_created
+from app.services.grading_queue import enqueue_submission
+
+logger = logging.getLogger(__name__)
+
+# 单个PDF的大小上限（与Gemini的20MB限制一致），防止压缩炸弹
+MAX_ENTRY_SIZE = 20 * 1024 * 1024
+
+
+def _entry_name(info: zipfile.ZipInfo) -> str:
+    """获取条目文件名；Windows压缩的中文文件名未设置UTF-8标记时按GBK解码"""
+    name = info.filename
+    if not info.flag_bits & 0x800:
+        try:
+            name = name.encode("cp437").decode("gbk")
+        except (UnicodeEncodeError, UnicodeDecodeError):
+            pass
+    return PurePosixPath(name).name
+
+
+def _extract(archive: zipfile.ZipFile, plan: List[zipfile.ZipInfo]) -> List[str]:
+    """将匹配的条目逐个流式写入存储后端，返回各条目的存储引用"""
+    storage = get_storage()
+    refs = []
+    for info in plan:
+        with archive.open(info) as src:
+            refs.append(storage.put_file(src, ".pdf"))
+    return refs
+
+
+async def import_homework_zip(db: Session, assignment: Assignment, fileobj: BinaryIO) -> Dict:
+    """导入ZIP中的作业PDF，返回匹配与未匹配的明细"""
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise ValueError("无法读取ZIP文件")
+
+    unmatched = []
+    entries = []  # (info, 文件名, 姓名, 学号)
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        filename = _entry_name(info)
+        if info.filename.startswith("__MACOSX/") or filename.startswith("."):
+            continue
+        if not filename.lower().endswith(".pdf"):
+            unmatched.append({"filename": filename, "reason": "不是PDF文件"})
+            continue
+        if info.file_size > MAX_ENTRY_SIZE:
+            unmatched.append({"filename": filename, "reason": "文件超过20MB"})
+            continue
+        name, sid = parse_name_id_from_filename(Path(filename))
+        if not sid:
+            unmatched.append({"filename": filename, "reason": "无法从文件名解析学号"})
+            continue
+        entries.append((info, filename, name, sid))
+
+    # 一次查询匹配本班学生，再一次查询已有提交
+    sids = {sid for _, _, _, sid in entries}
+    students = {
+        u.student_id: u for u in db.query(User).filter(
+            User.class_id == assignment.class_id,
+            User.role == UserRole.STUDENT,
+            User.student_id.in_(sids)
+        ).all()
+    } if sids else {}
+    submitted = {
+        row.student_id for row in db.query(Submission.student_id).filter(
+            Submission.assignment_id == assignment.id,
+            Submission.student_id.in_([u.id for u in students.values()])
+        ).all()
+    } if students else set()
+
+    plan = []
+    matched = []
+    claimed = set()
+    for info, filename, name, sid in entries:
+        student = students.get(sid)
+        if student is None:
+            unmatched.append({"filename": filename, "reason": f"本班没有学号为 {sid} 的学生"})
+            continue
+        if student.id in submitted:
+            unmatched.append({"filename": filename, "reason": "该学生已提交过此作业"})
+            continue
+        if student.id in claimed:
+            unmatched.append({"filename": filename, "reason": "ZIP中该学生有多份作业"})
+            continue
+        claimed.add(student.id)
+
+        plan.append(info)
+        matched.append({
+            "filename": filename,
+            "student_id": student.student_id,
+            "student_name": student.username,
+            "name_mismatch": bool(name) and name != student.username,
+            "user_id": student.id,
+        })
+
+    # 文件写入在线程中进行，不阻塞事件循环
+    refs = await asyncio.to_thread(_extract, archive, plan)
+    archive.close()
+
+    submissions = [
+        Submission(
+            assignment_id=assignment.id,
+            student_id=m["user_id"],
+            homework_file_path=ref,
+            status=SubmissionStatus.PENDING
+        )
+        for m, ref in zip(matched, refs)
+    ]
+    if submissions:
+        db.add_all(submissions)
+        db.flush()
+        record_submissions_created(db, assignment.id, len(submissions))
+        db.commit()
+
+    enqueue_failed = False
+    for m, submission in zip(matched, submissions):
+        m["submission_id"] = submission.id
+        del m["user_id"]
+        try:
+            await enqueue_submission(submission.id)
+        except RuntimeError as e:
+            logger.error(f"Failed to enqueue submission {submission.id}: {e}")
+            enqueue_failed = True
+
+    return {
+        "created_count": len(submissions),
+        "unmatched_count": len(unmatched),
+        "matched": matched,
+        "unmatched": unmatched,
+        "enqueue_failed": enqueue_failed,
+    }
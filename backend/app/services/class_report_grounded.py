@@ -0,0 +1,194 @@
+"""
+基于统计数据的全班学情报告
+
+报告中的数字（提交人数、平均等级、等级分布、逐题正确率、低分学生）直接取自作业统计汇总
+（与 get_assignment_stats 相同），模型只收到一段紧凑的统计表和少量抽样的错误片段，
+负责撰写分析和建议，不再从原文中自行统计。
+
+结果按（作业, 已批改提交集合）缓存：每份提交的ID、等级和报告内容摘要共同组成缓存键，
+提交没有变化时重新生成报告直接返回缓存。
+"""
+import hashlib
+import logging
+import random
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models import Assignment, Submission, SubmissionQuestion, User, UserRole
+from app.core.gemini_client import generate_grounded_class_report
+from app.core import pack_archive
+from app.services.assignment_stats import get_assignment_aggregate, stats_to_dict
+
+logger = logging.getLogger(__name__)
+
+GROUNDED_CACHE_DIRNAME = "class_report_grounded"
+# 修改提示词或统计格式时递增，使旧的缓存失效
+GROUNDED_PROMPT_VERSION = "1"
+
+# 抽样错误片段：错误率最高的若干题，每题若干名学生，每段截断长度
+EXCERPT_QUESTIONS = 5
+EXCERPTS_PER_QUESTION = 3
+EXCERPT_MAX_CHARS = 300
+
+
+@dataclass
+class GroundedContext:
+    assignment_title: str
+    stats_md: str
+    excerpts_md: str
+    cache_key: str
+
+
+def _pct(n: int, total: int) -> str:
+    return f"{n / total * 100:.0f}%" if total else "-"
+
+
+def format_stats_block(stats: Dict, unsubmitted: List[str]) -> str:
+    """将统计结果格式化为Markdown"""
+    lines = [
+        "### 提交情况",
+        f"- 班级人数：{stats['total_students']}",
+        f"- 已提交：{stats['submitted_count']}（提交率 {stats['submission_rate']}%）",
+        f"- 未提交：{len(unsubmitted)}" + (f"（{'、'.join(unsubmitted)}）" if unsubmitted else ""),
+        f"- 平均等级：{stats['average_grade'] or '-'}",
+        "",
+        "### 等级分布",
+    ]
+    for grade, count in sorted(stats["grade_distribution"].items()):
+        lines.append(f"- {grade}：{count}")
+
+    lines += ["", "### 逐题统计", "| 题目 | 正确 | 部分正确 | 错误 | 作答人数 | 正确率 |", "|---|---|---|---|---|---|"]
+    for q in sorted(stats["question_stats"], key=lambda q: q["key"]):
+        lines.append(
+            f"| {q['key']} | {q['correct_count']} | {q['partial_count']} | {q['wrong_count']} "
+            f"| {q['total_count']} | {_pct(q['correct_count'], q['total_count'])} |"
+        )
+
+    lines += ["", "### 低分学生"]
+    if stats["low_score_students"]:
+        for s in stats["low_score_students"]:
+            lines.append(f"- {s['student_name']}（ID: {s['student_id']}）：{s['grade']}")
+    else:
+        lines.append("- 无")
+    return "\n".join(lines)
+
+
+def _question_excerpt(report: str, key: str) -> Optional[str]:
+    """在学生报告的逐题批改部分中找到某题的评语"""
+    marker = report.find("二、")
+    body = report[marker:] if marker >= 0 else report
+    qid = key.split()[-1]
+    lines = body.split("\n")
+    pattern = re.compile(rf"(?<![A-Za-z0-9]){re.escape(qid)}(?![0-9])")
+    for i, line in enumerate(lines):
+        if pattern.search(line):
+            excerpt = "\n".join(l for l in lines[i:i + 4] if l.strip())
+            return excerpt[:EXCERPT_MAX_CHARS]
+    return None
+
+
+def sample_error_excerpts(db: Session, assignment: Assignment, stats: Dict) -> str:
+    """错误率最高的题目，每题抽样几名答错学生的评语片段"""
+    ranked = sorted(
+        (q for q in stats["question_stats"] if q["total_count"]),
+        key=lambda q: (q["correct_count"] / q["total_count"], q["key"])
+    )
+    worst = [q["key"] for q in ranked if q["correct_count"] < q["total_count"]][:EXCERPT_QUESTIONS]
+    if not worst:
+        return ""
+
+    rows = db.query(SubmissionQuestion.key, Submission.report_file_path).join(
+        Submission, Submission.id == SubmissionQuestion.submission_id
+    ).filter(
+        SubmissionQuestion.assignment_id == assignment.id,
+        SubmissionQuestion.key.in_(worst),
+        SubmissionQuestion.status != "正确",
+        Submission.report_file_path.isnot(None)
+    ).order_by(SubmissionQuestion.submission_id).all()
+    paths_by_key: Dict[str, List[str]] = {}
+    for key, path in rows:
+        paths_by_key.setdefault(key, []).append(path)
+
+    # 固定随机种子，同样的数据抽到同样的样本（保证缓存键稳定时结果一致）
+    rng = random.Random(assignment.id)
+    reports: Dict[str, str] = {}
+    parts = []
+    for key in worst:
+        paths = paths_by_key.get(key, [])
+        sample = rng.sample(paths, min(EXCERPTS_PER_QUESTION, len(paths)))
+        excerpts = []
+        for path in sample:
+            if path not in reports:
+                try:
+                    reports[path] = pack_archive.read_text(Path(path))
+                except OSError:
+                    reports[path] = ""
+            excerpt = _question_excerpt(reports[path], key)
+            if excerpt:
+                excerpts.append(excerpt)
+        if excerpts:
+            parts.append(f"### {key}\n\n" + "\n\n".join("> " + e.replace("\n", "\n> ") for e in excerpts))
+    return "\n\n".join(parts)
+
+
+def _submissions_key(db: Session, assignment: Assignment, total_students: int) -> str:
+    """已批改提交集合的摘要（提交ID、等级、报告内容）"""
+    sha = hashlib.sha256(f"{GROUNDED_PROMPT_VERSION}|{assignment.title}|{total_students}".encode("utf-8"))
+    rows = db.query(Submission.id, Submission.grade, Submission.report_file_path).filter(
+        Submission.assignment_id == assignment.id,
+        Submission.report_file_path.isnot(None)
+    ).order_by(Submission.id).all()
+    for submission_id, grade, path in rows:
+        try:
+            digest = pack_archive.digest(Path(path))
+        except OSError:
+            digest = ""
+        sha.update(f"|{submission_id}:{grade}:{digest}".encode("utf-8"))
+    return sha.hexdigest()
+
+
+def build_grounded_context(db: Session, assignment: Assignment) -> Optional[GroundedContext]:
+    """计算统计数据和错误片段；没有已批改提交时返回None"""
+    agg = get_assignment_aggregate(db, assignment.id)
+    students = db.query(User).filter(
+        User.class_id == assignment.class_id,
+        User.role == UserRole.STUDENT
+    ).order_by(User.id).all()
+    stats = stats_to_dict(agg, len(students))
+    if not stats["question_stats"] and not stats["grade_distribution"]:
+        return None
+
+    submitted = {
+        row.student_id for row in db.query(Submission.student_id).filter(
+            Submission.assignment_id == assignment.id
+        ).all()
+    }
+    unsubmitted = [u.username for u in students if u.id not in submitted]
+
+    return GroundedContext(
+        assignment_title=assignment.title,
+        stats_md=format_stats_block(stats, unsubmitted),
+        excerpts_md=sample_error_excerpts(db, assignment, stats),
+        cache_key=_submissions_key(db, assignment, len(students)),
+    )
+
+
+def generate_grounded_report(context: GroundedContext, cache_dir: Path) -> str:
+    """生成（或从缓存读取）基于统计数据的全班报告"""
+    cache_path = cache_dir / f"{context.cache_key}.md"
+    if cache_path.exists():
+        logger.info("全班报告命中缓存")
+        return cache_path.read_text(encoding="utf-8")
+
+    report = generate_grounded_class_report(
+        context.assignment_title, context.stats_md, context.excerpts_md
+    )
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    for old in cache_dir.glob("*.md"):
+        old.unlink(missing_ok=True)
+    cache_path.write_text(report, encoding="utf-8")
+    return report
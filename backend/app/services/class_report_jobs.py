@@ -0,0 +1,330 @@
+"""
+全班学情报告的后台生成任务
+
+生成过程分为三个阶段：collecting（汇总学生报告）→ summarizing（调用模型）→ writing（保存报告）。
+默认由本地统计数据生成报告（见 class_report_grounded），也可切换为整体或分块汇总（见 class_report_map_reduce）。
+任务状态保存在数据库中，客户端断开不影响任务执行，可通过轮询查询进度。
+每个作业同时只有一个进行中的任务，重复请求会直接返回已有任务。
+执行期间持续心跳；超时被其他进程接管后，原进程的状态更新和报告写入都以 runner_id 为条件，不会覆盖接管者的结果。
+"""
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+
+from app.database import SessionLocal
+from app.models import (
+    Assignment, ClassReportJob, ClassReportJobStatus, Submission, SubmissionStatus
+)
+from app.core.gemini_client import generate_class_report
+from app.core import pack_archive
+from app.core.report_files import write_report
+from app.core.file_utils import get_teacher_assignment_dir
+from app.services.class_report_map_reduce import (
+    CHUNK_CACHE_DIRNAME, StudentSection, generate_class_report_map_reduce, use_map_reduce
+)
+from app.services.class_report_grounded import (
+    GROUNDED_CACHE_DIRNAME, build_grounded_context, generate_grounded_report
+)
+
+logger = logging.getLogger(__name__)
+
+# 当前进程标识，用于判断任务由哪个进程执行
+RUNNER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# 模型调用期间的心跳间隔；超过 STALE_AFTER 未心跳的任务视为中断，可被接管
+HEARTBEAT_INTERVAL = 30
+STALE_AFTER = timedelta(seconds=HEARTBEAT_INTERVAL * 4)
+
+# 生成方式：grounded（默认，本地统计 + 抽样片段）、auto（按人数在 single / map_reduce 间选择）、
+# single（所有学生报告拼为一个提示词）、map_reduce（分块汇总后合并）
+CLASS_REPORT_MODE = os.getenv("CLASS_REPORT_MODE", "grounded")
+
+# 持有后台任务引用，避免被垃圾回收
+_running_tasks: set = set()
+
+
+def job_to_dict(job: ClassReportJob) -> dict:
+    """任务状态的API表示"""
+    return {
+        "job_id": job.id,
+        "assignment_id": job.assignment_id,
+        "status": job.status.value,
+        "error": job.error,
+        "report_path": job.report_path,
+        "timestamp": job.timestamp,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None,
+    }
+
+
+def get_latest_job(db: Session, assignment_id: int) -> Optional[ClassReportJob]:
+    return db.query(ClassReportJob).filter(
+        ClassReportJob.assignment_id == assignment_id
+    ).order_by(ClassReportJob.id.desc()).first()
+
+
+def _is_stale(job: ClassReportJob) -> bool:
+    if job.heartbeat_at is None:
+        return True
+    return datetime.utcnow() - job.heartbeat_at > STALE_AFTER
+
+
+def _claim(db: Session, job_id: int, expected_runner: Optional[str]) -> bool:
+    """以CAS方式将任务归属到当前进程，防止多个进程同时执行同一任务"""
+    updated = db.query(ClassReportJob).filter(
+        ClassReportJob.id == job_id,
+        ClassReportJob.active.is_(True),
+        ClassReportJob.runner_id.is_(None) if expected_runner is None
+        else ClassReportJob.runner_id == expected_runner,
+    ).update(
+        {"runner_id": RUNNER_ID, "heartbeat_at": datetime.utcnow()},
+        synchronize_session=False,
+    )
+    db.commit()
+    return updated == 1
+
+
+def _launch(job_id: int) -> None:
+    task = asyncio.create_task(run_class_report_job(job_id))
+    _running_tasks.add(task)
+    task.add_done_callback(_running_tasks.discard)
+
+
+def start_class_report_job(db: Session, assignment: Assignment, teacher_id: int) -> Tuple[ClassReportJob, bool]:
+    """
+    启动（或复用）作业的全班报告生成任务
+    返回: (任务, 是否新建)
+    """
+    active_job = db.query(ClassReportJob).filter(
+        ClassReportJob.assignment_id == assignment.id,
+        ClassReportJob.active.is_(True)
+    ).first()
+
+    if active_job is None:
+        job = ClassReportJob(
+            assignment_id=assignment.id,
+            teacher_id=teacher_id,
+            status=ClassReportJobStatus.PENDING,
+            active=True,
+        )
+        db.add(job)
+        try:
+            db.commit()
+        except IntegrityError:
+            # 并发请求已创建了进行中的任务，直接复用
+            db.rollback()
+            active_job = db.query(ClassReportJob).filter(
+                ClassReportJob.assignment_id == assignment.id,
+                ClassReportJob.active.is_(True)
+            ).first()
+            return active_job, False
+        db.refresh(job)
+        if _claim(db, job.id, None):
+            _launch(job.id)
+        db.refresh(job)
+        return job, True
+
+    # 已有进行中的任务：若其执行进程已中断，则由当前进程接管（从头恢复）
+    if _is_stale(active_job) and _claim(db, active_job.id, active_job.runner_id):
+        logger.info(f"接管中断的全班报告任务 {active_job.id}")
+        _launch(active_job.id)
+        db.refresh(active_job)
+    return active_job, False
+
+
+def resume_stale_jobs() -> None:
+    """启动时恢复因进程退出而中断的任务"""
+    db: Session = SessionLocal()
+    try:
+        jobs = db.query(ClassReportJob).filter(ClassReportJob.active.is_(True)).all()
+        for job in jobs:
+            if _is_stale(job) and _claim(db, job.id, job.runner_id):
+                logger.info(f"恢复中断的全班报告任务 {job.id}")
+                _launch(job.id)
+    finally:
+        db.close()
+
+
+class JobTakenOver(Exception):
+    """任务已被其他进程接管（或已结束），当前进程应停止执行"""
+
+
+def _update_if_owner(db: Session, job_id: int, values: dict) -> bool:
+    """仅当任务仍由当前进程执行时更新（CAS，不提交事务）；返回是否更新成功"""
+    updated = db.query(ClassReportJob).filter(
+        ClassReportJob.id == job_id,
+        ClassReportJob.active.is_(True),
+        ClassReportJob.runner_id == RUNNER_ID
+    ).update({**values, "heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+    return updated == 1
+
+
+def _set_status(db: Session, job_id: int, status: ClassReportJobStatus) -> None:
+    owned = _update_if_owner(db, job_id, {"status": status})
+    db.commit()
+    if not owned:
+        raise JobTakenOver(f"全班报告任务 {job_id} 已被其他进程接管")
+
+
+def _extract_report_section(report_content: str) -> Optional[str]:
+    """提取"批改报告"部分（第二部分），查找"## 二、逐题批改简报"或类似标记"""
+    lines = report_content.split('\n')
+    for i, line in enumerate(lines):
+        if '##' in line and ('二、' in line or '批改' in line or '简报' in line):
+            return '\n'.join(lines[i:])
+    return None
+
+
+def collect_student_sections(db: Session, assignment: Assignment) -> List[StudentSection]:
+    """每个已批改学生的报告片段（只提取"批改报告"部分），按提交顺序排列"""
+    # 查询条件：状态为 GRADED 或 PUBLISHED，或者有报告文件路径的提交
+    submissions = db.query(Submission).options(joinedload(Submission.student)).filter(
+        Submission.assignment_id == assignment.id
+    ).filter(
+        or_(
+            Submission.status == SubmissionStatus.GRADED,
+            Submission.status == SubmissionStatus.PUBLISHED,
+            Submission.report_file_path.isnot(None)
+        )
+    ).order_by(Submission.id).all()
+
+    sections = []
+    for submission in submissions:
+        if not submission.report_file_path:
+            continue
+        report_path = Path(submission.report_file_path)
+        if not pack_archive.exists(report_path):
+            continue
+
+        report_section = _extract_report_section(pack_archive.read_text(report_path))
+        if report_section is not None:
+            sections.append(StudentSection(
+                submission_id=submission.id,
+                student_id=submission.student.id,
+                username=submission.student.username,
+                grade=submission.grade,
+                report=report_section,
+            ))
+    return sections
+
+
+def combine_sections(assignment: Assignment, sections: List[StudentSection]) -> str:
+    """将学生报告片段拼接为一份汇总文档"""
+    combined_content = [f"# 作业：{assignment.title}\n", "## 全班学生批改报告汇总\n\n"]
+    combined_content.extend(s.render(idx) for idx, s in enumerate(sections, 1))
+    return '\n'.join(combined_content)
+
+
+def collect_combined_reports(db: Session, assignment: Assignment) -> Optional[str]:
+    """汇总所有已批改学生的报告（只提取"批改报告"部分），没有可用报告时返回None"""
+    sections = collect_student_sections(db, assignment)
+    if not sections:
+        return None
+    return combine_sections(assignment, sections)
+
+
+async def _heartbeat(job_id: int) -> None:
+    """模型调用期间定期刷新心跳"""
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        db: Session = SessionLocal()
+        try:
+            db.query(ClassReportJob).filter(
+                ClassReportJob.id == job_id,
+                ClassReportJob.runner_id == RUNNER_ID
+            ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+async def run_class_report_job(job_id: int) -> None:
+    """执行全班报告生成任务"""
+    db: Session = SessionLocal()
+    heartbeat = None
+    try:
+        job = db.query(ClassReportJob).filter(ClassReportJob.id == job_id).first()
+        if not job or job.runner_id != RUNNER_ID:
+            return
+        assignment = job.assignment
+        assignment_dir = get_teacher_assignment_dir(assignment.teacher, assignment)
+
+        # 整个执行期间保持心跳（汇总阶段在学生较多时同样耗时）
+        heartbeat = asyncio.create_task(_heartbeat(job_id))
+
+        # 阶段一：汇总学生报告（grounded模式下计算统计数据并抽样错误片段）
+        _set_status(db, job_id, ClassReportJobStatus.COLLECTING)
+        assignment_dir.mkdir(parents=True, exist_ok=True)
+        if CLASS_REPORT_MODE == "grounded":
+            context = await asyncio.to_thread(build_grounded_context, db, assignment)
+            if context is None:
+                raise ValueError("没有可用的批改报告")
+        else:
+            sections = await asyncio.to_thread(collect_student_sections, db, assignment)
+            if not sections:
+                raise ValueError("没有可用的批改报告")
+            combined_md_path = assignment_dir / "combined_reports.md"
+            combined_md_path.write_text(combine_sections(assignment, sections), encoding="utf-8")
+
+        # 阶段二：调用Gemini生成全班学情报告（人数较多时分块汇总后再合并）
+        _set_status(db, job_id, ClassReportJobStatus.SUMMARIZING)
+        if CLASS_REPORT_MODE == "grounded":
+            class_report = await asyncio.to_thread(
+                generate_grounded_report, context, assignment_dir / GROUNDED_CACHE_DIRNAME
+            )
+        elif use_map_reduce(sections, CLASS_REPORT_MODE):
+            class_report = await generate_class_report_map_reduce(
+                assignment.title, sections, assignment_dir / CHUNK_CACHE_DIRNAME
+            )
+        else:
+            class_report = await asyncio.to_thread(generate_class_report, combined_md_path)
+
+        # 阶段三：保存报告（使用时间戳保存历史版本）
+        _set_status(db, job_id, ClassReportJobStatus.WRITING)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        reports_dir = assignment_dir / "class_reports"
+        class_report_path = reports_dir / f"class_report_{timestamp}.md"
+        # 先以CAS标记完成（锁定任务行到提交），确认仍由当前进程执行后再写入报告文件
+        if not _update_if_owner(db, job_id, {
+            "report_path": str(class_report_path),
+            "timestamp": timestamp,
+            "status": ClassReportJobStatus.COMPLETED,
+            "active": False,
+        }):
+            raise JobTakenOver(f"全班报告任务 {job_id} 已被其他进程接管")
+        reports_dir.mkdir(parents=True, exist_ok=True)
+        write_report(class_report_path, class_report)
+
+        # 同时保存最新版本（用于快速访问）
+        latest_report_path = assignment_dir / "class_report_latest.md"
+        write_report(latest_report_path, class_report)
+
+        db.commit()
+        logger.info(f"全班报告任务 {job_id} 完成")
+    except JobTakenOver as e:
+        db.rollback()
+        logger.warning(f"{e}，当前进程停止执行且不写入结果")
+    except Exception as e:
+        logger.error(f"全班报告任务 {job_id} 失败: {e}", exc_info=True)
+        try:
+            db.rollback()
+            _update_if_owner(db, job_id, {
+                "status": ClassReportJobStatus.FAILED,
+                "error": str(e),
+                "active": False,
+            })
+            db.commit()
+        except Exception:
+            db.rollback()
+    finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
+        db.close()
@@ -0,0 +1,138 @@
+"""
+全班学情报告的分块汇总（map-reduce）
+
+学生人数较多时，不再把所有学生的批改简报拼成一个提示词：
+1. map：按提交ID顺序把学生分块（平均每块 CLASS_REPORT_CHUNK_SIZE 人），用Flash模型并行生成结构化摘要，
+   并发数由 CLASS_REPORT_CONCURRENCY 限制；
+2. reduce：用Pro模型将各块摘要合并为五部分的全班报告。
+
+块边界由提交ID的哈希决定（内容定义分块），不按位置切分：中间插入一份迟交的作业只改变它所在的一块，
+其余块的成员不变。每块摘要按块内各学生的提交ID、等级和报告摘要哈希缓存在作业目录下，
+与块在列表中的位置和编号无关，重新生成报告时只有内容变化的块需要重新调用模型。
+耗时约为一次Flash调用加一次Pro调用，基本不随班级人数增长。
+"""
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from app.core.gemini_client import reduce_class_report, summarize_report_chunk
+
+logger = logging.getLogger(__name__)
+
+CLASS_REPORT_CHUNK_SIZE = int(os.getenv("CLASS_REPORT_CHUNK_SIZE", "15"))
+CLASS_REPORT_CONCURRENCY = int(os.getenv("CLASS_REPORT_CONCURRENCY", "4"))
+# auto模式下的阈值：学生数或汇总文本字符数
+MAP_REDUCE_MIN_STUDENTS = int(os.getenv("CLASS_REPORT_MAP_REDUCE_MIN_STUDENTS", "30"))
+MAP_REDUCE_MIN_CHARS = int(os.getenv("CLASS_REPORT_MAP_REDUCE_MIN_CHARS", "200000"))
+
+CHUNK_CACHE_DIRNAME = "class_report_chunks"
+# 修改分块提示词时递增，使旧的缓存失效
+CHUNK_PROMPT_VERSION = "2"
+
+
+@dataclass
+class StudentSection:
+    """一名已批改学生的报告片段（只含"批改报告"部分）"""
+    submission_id: int
+    student_id: int
+    username: str
+    grade: Optional[str]
+    report: str
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.report.encode("utf-8")).hexdigest()
+
+    def render(self, idx: int) -> str:
+        """格式化为汇总文档中的一节，idx 为在当前文档（或块）中的编号"""
+        return (
+            f"---\n\n"
+            f"### 学生 {idx}: {self.username} (ID: {self.student_id})\n\n"
+            f"{self.report}\n\n"
+        )
+
+
+def render_sections(sections: List[StudentSection]) -> str:
+    return "".join(s.render(idx) for idx, s in enumerate(sections, 1))
+
+
+def use_map_reduce(sections: List[StudentSection], mode: str) -> bool:
+    """mode 为 auto 时按人数或文本量决定，single / map_reduce 时强制对应方式"""
+    if mode == "single":
+        return False
+    if mode == "map_reduce":
+        return True
+    return (len(sections) >= MAP_REDUCE_MIN_STUDENTS
+            or sum(len(s.report) for s in sections) >= MAP_REDUCE_MIN_CHARS)
+
+
+def _is_boundary(section: StudentSection, size: int) -> bool:
+    digest = hashlib.sha256(str(section.submission_id).encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") % size == 0
+
+
+def split_chunks(sections: List[StudentSection], size: int = CLASS_REPORT_CHUNK_SIZE) -> List[List[StudentSection]]:
+    """
+    按提交ID顺序分块：提交ID的哈希落在边界上时结束当前块（平均每块 size 人），单块最多 2*size 人
+    新增或删除一名学生只影响它所在的块（达到上限时最多波及到下一个边界）
+    """
+    size = max(1, size)
+    chunks: List[List[StudentSection]] = []
+    current: List[StudentSection] = []
+    for section in sorted(sections, key=lambda s: s.submission_id):
+        current.append(section)
+        if _is_boundary(section, size) or len(current) >= 2 * size:
+            chunks.append(current)
+            current = []
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _chunk_key(chunk: List[StudentSection]) -> str:
+    """只由块内容决定：提交ID、等级和报告摘要哈希"""
+    members = "\n".join(f"{s.submission_id}:{s.grade or ''}:{s.digest}" for s in chunk)
+    return hashlib.sha256(f"{CHUNK_PROMPT_VERSION}\n{members}".encode("utf-8")).hexdigest()
+
+
+def _summarize_cached(chunk: List[StudentSection], cache_dir: Path) -> str:
+    cache_path = cache_dir / f"{_chunk_key(chunk)}.md"
+    if cache_path.exists():
+        return cache_path.read_text(encoding="utf-8")
+    summary = summarize_report_chunk(render_sections(chunk))
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(".tmp")
+    tmp_path.write_text(summary, encoding="utf-8")
+    os.replace(tmp_path, cache_path)
+    return summary
+
+
+def _prune_cache(cache_dir: Path, chunks: List[List[StudentSection]]) -> None:
+    """删除不再使用的分块缓存"""
+    if not cache_dir.exists():
+        return
+    keep = {f"{_chunk_key(c)}.md" for c in chunks}
+    for path in cache_dir.glob("*.md"):
+        if path.name not in keep:
+            path.unlink(missing_ok=True)
+
+
+async def generate_class_report_map_reduce(
+    assignment_title: str, sections: List[StudentSection], cache_dir: Path
+) -> str:
+    """分块并行汇总后合并为全班报告"""
+    chunks = split_chunks(sections)
+    semaphore = asyncio.Semaphore(CLASS_REPORT_CONCURRENCY)
+
+    async def summarize(chunk: List[StudentSection]) -> str:
+        async with semaphore:
+            return await asyncio.to_thread(_summarize_cached, chunk, cache_dir)
+
+    logger.info(f"分块汇总全班报告：{len(sections)} 名学生，{len(chunks)} 块")
+    summaries = await asyncio.gather(*(summarize(c) for c in chunks))
+    await asyncio.to_thread(_prune_cache, cache_dir, chunks)
+    return await asyncio.to_thread(reduce_class_report, assignment_title, list(summaries), len(sections))
@@ -0,0 +1,115 @@
+"""
+教师首页汇总
+
+一次返回教师所有作业的提交、批改、失败人数、等级分布和批改队列进度。
+数据来自几条按作业分组的聚合查询（与作业数、提交数无关），结果按教师缓存 DASHBOARD_CACHE_TTL 秒。
+"""
+import os
+from typing import Dict, List
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Assignment, AssignmentStatsAggregate, Submission, SubmissionStatus, User, UserRole
+from app.core.ttl_cache import TTLCache
+from app.services.assignment_stats import average_grade, grade_points
+
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "5"))
+dashboard_cache = TTLCache(maxsize=1024, ttl=DASHBOARD_CACHE_TTL)
+
+GRADED_STATUSES = (SubmissionStatus.GRADED, SubmissionStatus.PUBLISHED)
+QUEUED_STATUSES = (SubmissionStatus.PENDING, SubmissionStatus.PROCESSING)
+
+
+def build_dashboard(db: Session, teacher_id: int) -> Dict:
+    """按作业分组聚合，返回首页所需的全部数据"""
+    assignments = db.query(
+        Assignment.id, Assignment.title, Assignment.class_id, Assignment.status,
+        Assignment.deadline, Assignment.created_at
+    ).filter(Assignment.teacher_id == teacher_id).order_by(Assignment.created_at.desc()).all()
+    if not assignments:
+        return {"assignments": [], "totals": {"assignments": 0, "submitted": 0, "graded": 0, "failed": 0, "queued": 0}}
+
+    teacher_assignments = db.query(Assignment.id).filter(Assignment.teacher_id == teacher_id)
+
+    status_counts: Dict[int, Dict[SubmissionStatus, int]] = {}
+    for assignment_id, status, count in db.query(
+        Submission.assignment_id, Submission.status, func.count(Submission.id)
+    ).filter(Submission.assignment_id.in_(teacher_assignments)).group_by(
+        Submission.assignment_id, Submission.status
+    ):
+        status_counts.setdefault(assignment_id, {})[status] = count
+
+    distributions: Dict[int, Dict[str, int]] = {}
+    for assignment_id, grade, count in db.query(
+        Submission.assignment_id, Submission.grade, func.count(Submission.id)
+    ).filter(
+        Submission.assignment_id.in_(teacher_assignments),
+        Submission.grade.isnot(None)
+    ).group_by(Submission.assignment_id, Submission.grade):
+        distributions.setdefault(assignment_id, {})[grade] = count
+
+    # 平均等级与统计页一致：优先读取统计汇总行中的分值，汇总行尚未生成时按等级分布计算
+    points = {
+        assignment_id: (total, count)
+        for assignment_id, total, count in db.query(
+            AssignmentStatsAggregate.assignment_id,
+            AssignmentStatsAggregate.grade_points_total,
+            AssignmentStatsAggregate.grade_points_count,
+        ).filter(AssignmentStatsAggregate.assignment_id.in_(teacher_assignments))
+    }
+
+    class_ids = {a.class_id for a in assignments}
+    class_sizes = dict(db.query(User.class_id, func.count(User.id)).filter(
+        User.class_id.in_(class_ids),
+        User.role == UserRole.STUDENT
+    ).group_by(User.class_id).all())
+
+    items: List[Dict] = []
+    totals = {"assignments": len(assignments), "submitted": 0, "graded": 0, "failed": 0, "queued": 0}
+    for a in assignments:
+        counts = status_counts.get(a.id, {})
+        submitted = sum(counts.values())
+        graded = sum(counts.get(s, 0) for s in GRADED_STATUSES)
+        failed = counts.get(SubmissionStatus.FAILED, 0)
+        queued = sum(counts.get(s, 0) for s in QUEUED_STATUSES)
+        distribution = distributions.get(a.id, {})
+        items.append({
+            "id": a.id,
+            "title": a.title,
+            "class_id": a.class_id,
+            "status": a.status.value if a.status else None,
+            "deadline": a.deadline.isoformat() if a.deadline else None,
+            "created_at": a.created_at.isoformat() if a.created_at else None,
+            "total_students": class_sizes.get(a.class_id, 0),
+            "submitted_count": submitted,
+            "graded_count": graded,
+            "failed_count": failed,
+            "published_count": counts.get(SubmissionStatus.PUBLISHED, 0),
+            "pending_count": counts.get(SubmissionStatus.PENDING, 0),
+            "processing_count": counts.get(SubmissionStatus.PROCESSING, 0),
+            # 批改进度：已完成（成功或失败）的提交占比
+            "progress": round((graded + failed) / submitted, 4) if submitted else None,
+            "grade_distribution": distribution,
+            "average_grade": average_grade(*points.get(a.id, grade_points(distribution))),
+        })
+        totals["submitted"] += submitted
+        totals["graded"] += graded
+        totals["failed"] += failed
+        totals["queued"] += queued
+
+    return {"assignments": items, "totals": totals}
+
+
+def get_dashboard(db: Session, teacher_id: int) -> Dict:
+    """读取（必要时重新计算）教师首页汇总"""
+    data = dashboard_cache.get(teacher_id)
+    if data is None:
+        data = build_dashboard(db, teacher_id)
+        dashboard_cache.set(teacher_id, data)
+    return data
+
+
+def invalidate_dashboard(teacher_id: int) -> None:
+    """作业增删改后清除缓存，教师回到首页时立即看到变化"""
+    dashboard_cache.pop(teacher_id)
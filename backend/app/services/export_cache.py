@@ -0,0 +1,117 @@
+"""
+成绩汇总（summary.xlsx 和在线表格）的版本化缓存
+
+作业的数据版本由提交数、最大提交ID、提交的最近更新时间、统计汇总版本
+和作业（标准答案）的更新时间组成。版本未变化时：
+- 客户端带ETag再次请求直接返回304；
+- summary.xlsx 直接复用磁盘上的文件（旁边的 .version 文件记录生成时的版本）；
+- /excel 表格数据（行格式和列式格式）从进程内缓存返回，不再重新解析JSON文件。
+"""
+import os
+import tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Assignment, AssignmentStatsAggregate, Submission
+from app.core.excel_stream import write_summary_excel
+from app.core.excel_table import ColumnarTable, build_columnar_table
+from app.core.http_cache import make_etag
+from app.core.ttl_cache import TTLCache
+from app.services.assignment_stats import backfill_question_rows
+
+SUMMARY_FILENAME = "summary.xlsx"
+VERSION_SUFFIX = ".version"
+
+# /excel 表格数据缓存：按（作业ID, 格式）保存（版本, 数据）
+EXCEL_TABLE_CACHE_TTL = float(os.getenv("EXCEL_TABLE_CACHE_TTL", "3600"))
+excel_table_cache = TTLCache(maxsize=256, ttl=EXCEL_TABLE_CACHE_TTL)
+
+
+@dataclass(frozen=True)
+class DataVersion:
+    key: str  # 版本标识（各项版本信息的摘要）
+    last_modified: Optional[datetime]
+
+    def etag(self, kind: str) -> str:
+        """不同表示形式（xlsx / json）使用不同的ETag"""
+        return make_etag(kind, self.key)
+
+
+def get_data_version(db: Session, assignment: Assignment) -> DataVersion:
+    """计算作业成绩数据的当前版本（两次索引查询，不读取文件）"""
+    count, max_id, max_updated = db.query(
+        func.count(Submission.id),
+        func.max(Submission.id),
+        func.max(func.coalesce(Submission.updated_at, Submission.created_at)),
+    ).filter(Submission.assignment_id == assignment.id).one()
+    stats_version = db.query(AssignmentStatsAggregate.version).filter(
+        AssignmentStatsAggregate.assignment_id == assignment.id
+    ).scalar()
+    answer_version = assignment.updated_at or assignment.created_at
+
+    key = make_etag(
+        assignment.id, count, max_id,
+        max_updated.isoformat() if max_updated else None,
+        stats_version,
+        answer_version.isoformat() if answer_version else None,
+    ).strip('"')
+    candidates = [t for t in (max_updated, answer_version) if t is not None]
+    return DataVersion(key=key, last_modified=max(candidates) if candidates else None)
+
+
+def summary_path(assignment_dir: Path) -> Path:
+    return assignment_dir / SUMMARY_FILENAME
+
+
+def summary_is_fresh(assignment_dir: Path, version: DataVersion) -> bool:
+    """磁盘上的 summary.xlsx 是否由当前版本的数据生成"""
+    output_path = summary_path(assignment_dir)
+    version_path = output_path.with_name(SUMMARY_FILENAME + VERSION_SUFFIX)
+    try:
+        return output_path.exists() and version_path.read_text() == version.key
+    except OSError:
+        return False
+
+
+def build_summary_excel(db: Session, assignment_id: int, assignment_dir: Path, version: DataVersion) -> Path:
+    """重新生成 summary.xlsx 并记录版本；先写临时文件再替换，并发请求不会读到半个文件"""
+    assignment_dir.mkdir(parents=True, exist_ok=True)
+    output_path = summary_path(assignment_dir)
+    fd, tmp_path = tempfile.mkstemp(suffix=".xlsx.tmp", dir=assignment_dir)
+    os.close(fd)
+    try:
+        write_summary_excel(db, [assignment_id], Path(tmp_path))
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+    output_path.with_name(SUMMARY_FILENAME + VERSION_SUFFIX).write_text(version.key)
+    return output_path
+
+
+def get_cached_excel_table(assignment_id: int, version: DataVersion, kind: str = "rows") -> Optional[Any]:
+    cached = excel_table_cache.get((assignment_id, kind))
+    if cached is not None and cached[0] == version.key:
+        return cached[1]
+    return None
+
+
+def set_cached_excel_table(assignment_id: int, version: DataVersion, data: Any, kind: str = "rows") -> None:
+    excel_table_cache.set((assignment_id, kind), (version.key, data))
+
+
+def get_columnar_table(db: Session, assignment_id: int, version: DataVersion) -> ColumnarTable:
+    """当前版本的列式宽表（缓存整表，分页和列投影在缓存结果上进行）"""
+    table = get_cached_excel_table(assignment_id, version, kind="columnar")
+    if table is None:
+        if backfill_question_rows(db, assignment_id):
+            db.commit()
+        table = build_columnar_table(db, assignment_id)
+        set_cached_excel_table(assignment_id, version, table, kind="columnar")
+    return table
@@ -1,22 +1,125 @@
+"""
+批改队列
+
+队列就是数据库中状态为 PENDING 的提交记录，Web进程和独立Worker进程（python -m app.worker）共用。
+Worker 以CAS方式（PENDING → PROCESSING）领取任务，多个进程同时运行也不会重复批改；
+退出时把未完成的任务改回 PENDING。批改期间每 GRADING_HEARTBEAT_SECONDS 刷新一次 updated_at（租约），
+进程异常退出留下的 PROCESSING 任务超过 GRADING_LEASE_SECONDS 未刷新后重新入队。
+
+领取时为提交生成租约令牌（lease_token），刷新租约、改回 PENDING 和写入批改结果都以令牌为条件：
+心跳失败（如数据库被锁）导致任务被重新入队并由其他Worker领取后，原Worker的结果会被丢弃，不会覆盖。
+"""
 import asyncio
 import logging
-from typing import Optional
+import os
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Submission, SubmissionStatus
 
 logger = logging.getLogger(__name__)
 
-# Global queue instance
-_grading_queue: Optional[asyncio.Queue] = None
+# 租约时长：PROCESSING 的提交超过该时间未刷新，视为执行进程已退出
+GRADING_LEASE_SECONDS = int(os.getenv("GRADING_LEASE_SECONDS", "900"))
+# 批改期间刷新租约的间隔
+GRADING_HEARTBEAT_SECONDS = float(os.getenv("GRADING_HEARTBEAT_SECONDS", str(GRADING_LEASE_SECONDS / 5)))
+# 每次领取时查看的候选数（其余进程可能已抢先领取）
+CLAIM_BATCH = 8
+
+# 本进程内Worker的唤醒信号：Web进程内批改时，新提交无需等到下次轮询
+_wakeup: Optional[asyncio.Event] = None
+
+
+def get_wakeup_event() -> asyncio.Event:
+    global _wakeup
+    if _wakeup is None:
+        _wakeup = asyncio.Event()
+    return _wakeup
 
-def get_grading_queue() -> asyncio.Queue:
-    global _grading_queue
-    if _grading_queue is None:
-        _grading_queue = asyncio.Queue()
-    return _grading_queue
 
 async def enqueue_submission(submission_id: int) -> None:
     """
-    Add a submission ID to the grading queue.
+    通知批改Worker有新的提交（提交记录以 PENDING 状态保存后即已入队）
     """
-    queue = get_grading_queue()
-    await queue.put(submission_id)
+    if _wakeup is not None:
+        _wakeup.set()
     logger.info(f"Submission {submission_id} enqueued for grading.")
+
+
+def claim_next_submission(db: Session) -> Optional[Tuple[int, str]]:
+    """领取最早的待批改提交，返回 (提交ID, 租约令牌)；没有可领取的任务时返回None"""
+    candidates = db.query(Submission.id).filter(
+        Submission.status == SubmissionStatus.PENDING
+    ).order_by(Submission.id).limit(CLAIM_BATCH).all()
+    for (submission_id,) in candidates:
+        lease_token = secrets.token_hex(16)
+        updated = db.query(Submission).filter(
+            Submission.id == submission_id,
+            Submission.status == SubmissionStatus.PENDING
+        ).update(
+            {"status": SubmissionStatus.PROCESSING, "lease_token": lease_token, "updated_at": datetime.utcnow()},
+            synchronize_session=False,
+        )
+        db.commit()
+        if updated == 1:
+            return submission_id, lease_token
+    return None
+
+
+def _leased(db: Session, submission_id: int, lease_token: str):
+    return db.query(Submission).filter(
+        Submission.id == submission_id,
+        Submission.status == SubmissionStatus.PROCESSING,
+        Submission.lease_token == lease_token
+    )
+
+
+def renew_lease(db: Session, submission_id: int, lease_token: str) -> bool:
+    """刷新批改中提交的租约（批改期间定期调用，避免耗时较长的批改被当作中断重新入队）；返回 False 表示租约已失效"""
+    updated = _leased(db, submission_id, lease_token).update(
+        {"updated_at": datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+    return updated == 1
+
+
+def hold_lease(db: Session, submission_id: int, lease_token: str) -> bool:
+    """
+    在写入批改结果的事务开始时确认仍持有租约（不提交事务）
+    这条UPDATE取得该行的写锁并保持到事务结束，确认之后租约不会再被回收；返回 False 时应丢弃结果
+    """
+    updated = _leased(db, submission_id, lease_token).update(
+        {"updated_at": datetime.utcnow()}, synchronize_session=False
+    )
+    return updated == 1
+
+
+def release_lease(db: Session, submission_id: int, lease_token: str, status: SubmissionStatus) -> bool:
+    """持有租约时把提交改为 status（批改失败或Worker退出时调用）；租约已失效时不做修改"""
+    updated = _leased(db, submission_id, lease_token).update(
+        {"status": status, "lease_token": None}, synchronize_session=False
+    )
+    db.commit()
+    return updated == 1
+
+
+def requeue_submission(db: Session, submission_id: int, lease_token: str) -> bool:
+    """将未完成的提交改回 PENDING（Worker退出时调用）"""
+    return release_lease(db, submission_id, lease_token, SubmissionStatus.PENDING)
+
+
+def recover_stale_submissions(db: Session) -> int:
+    """将超过租期仍处于 PROCESSING 的提交重新入队，返回数量"""
+    cutoff = datetime.utcnow() - timedelta(seconds=GRADING_LEASE_SECONDS)
+    updated = db.query(Submission).filter(
+        Submission.status == SubmissionStatus.PROCESSING,
+        func.coalesce(Submission.updated_at, Submission.created_at) < cutoff
+    ).update({"status": SubmissionStatus.PENDING, "lease_token": None}, synchronize_session=False)
+    db.commit()
+    if updated:
+        logger.warning(f"{updated} 个批改中断的提交已重新入队")
+    return updated
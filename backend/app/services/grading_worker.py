@@ -1,18 +1,69 @@
 import asyncio
+import functools
 import logging
 import json
+import os
+from concurrent.futures import Executor, ThreadPoolExecutor
 from pathlib import Path
+from typing import List, Optional
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
 from app.models import Submission, SubmissionStatus, Assignment
-from app.services.grading_queue import get_grading_queue
+from app.services.grading_queue import (
+    GRADING_HEARTBEAT_SECONDS, GRADING_LEASE_SECONDS, claim_next_submission, get_wakeup_event,
+    hold_lease, recover_stale_submissions, release_lease, renew_lease, requeue_submission
+)
+from app.services.assignment_stats import record_grading_result
 from app.core.gemini_client import grade_homework, extract_json_from_report
+from app.core.report_files import write_report
+from app.core.file_utils import get_submission_dir, get_teacher_assignment_dir
+from app.core.storage import get_storage
 
 logger = logging.getLogger(__name__)
 
-async def process_submission(submission_id: int):
-    """处理单个作业批改"""
+# 是否在Web进程内批改；关闭后只由独立Worker进程（python -m app.worker）批改
+GRADING_IN_WEB = os.getenv("GRADING_IN_WEB", "true").lower() in ("1", "true", "yes")
+# Web进程内同时批改的数量
+GRADING_CONCURRENCY = int(os.getenv("GRADING_CONCURRENCY", "1"))
+# 队列为空时轮询数据库的间隔（秒）
+GRADING_POLL_INTERVAL = float(os.getenv("GRADING_POLL_INTERVAL", "2"))
+# 关闭时等待进行中任务的最长时间（秒），超时的任务重新入队
+GRADING_SHUTDOWN_GRACE = float(os.getenv("GRADING_SHUTDOWN_GRACE", "30"))
+
+def _grade_from_storage(storage, homework_ref: str, answer_path: Path) -> str:
+    """取得作业PDF的本地路径（对象存储时下载到临时文件）后批改"""
+    with storage.local_path(homework_ref, ".pdf") as homework_path:
+        return grade_homework(homework_path, answer_path)
+
+async def _heartbeat(submission_id: int, lease_token: str) -> None:
+    """批改期间定期刷新租约"""
+    while True:
+        await asyncio.sleep(GRADING_HEARTBEAT_SECONDS)
+        try:
+            if not await asyncio.to_thread(_run_with_session, renew_lease, submission_id, lease_token):
+                logger.warning(f"submission {submission_id} 的租约已失效（已被重新入队），批改结果将被丢弃")
+                return
+        except Exception as e:
+            logger.error(f"刷新 submission {submission_id} 的租约失败: {e}")
+
+def _mark_failed(db: Session, submission_id: int, lease_token: str) -> None:
+    """仍持有租约时标记为失败；租约已失效时由重新领取的Worker决定结果"""
+    db.rollback()
+    if not release_lease(db, submission_id, lease_token, SubmissionStatus.FAILED):
+        logger.warning(f"submission {submission_id} 的租约已失效，不标记为失败")
+
+async def process_submission(submission_id: int, lease_token: str, executor: Optional[Executor] = None):
+    """
+    处理单个作业批改（提交已由 claim_next_submission 领取，lease_token 为领取时生成的租约令牌）
+    executor: 执行模型调用的线程池（默认为事件循环的默认线程池）
+    """
+    loop = asyncio.get_running_loop()
+
+    def run_blocking(fn, *args):
+        return loop.run_in_executor(executor, functools.partial(fn, *args))
+
     db: Session = SessionLocal()
+    heartbeat = None
     try:
         # 获取submission记录
         submission = db.query(Submission).filter(Submission.id == submission_id).first()
@@ -24,30 +75,26 @@ async def process_submission(submission_id: int):
         assignment = db.query(Assignment).filter(Assignment.id == submission.assignment_id).first()
         if not assignment:
             logger.error(f"Assignment {submission.assignment_id} not found")
-            submission.status = SubmissionStatus.FAILED
-            db.commit()
+            _mark_failed(db, submission_id, lease_token)
             return
             
         if not assignment.answer_content:
             logger.error(f"Assignment {submission.assignment_id} has no answer content")
             # 这里不标记为失败，因为可能是老师还没提取答案，保持PENDING或标记为FAILED视业务逻辑而定
             # 暂时标记为FAILED并提示
-            submission.status = SubmissionStatus.FAILED
-            db.commit()
+            _mark_failed(db, submission_id, lease_token)
             return
         
         logger.info(f"开始批改 submission {submission_id}")
         
-        # 更新状态为处理中
-        submission.status = SubmissionStatus.PROCESSING
-        db.commit()
+        # 领取时已改为处理中，批改期间定期刷新租约
+        heartbeat = asyncio.create_task(_heartbeat(submission_id, lease_token))
         
-        # 准备路径
-        homework_path = Path(submission.homework_file_path)
-        if not homework_path.exists():
-            logger.error(f"Homework file not found: {homework_path}")
-            submission.status = SubmissionStatus.FAILED
-            db.commit()
+        # 作业PDF在存储后端中（旧数据为本地路径）
+        storage = get_storage()
+        if not await asyncio.to_thread(storage.exists, submission.homework_file_path):
+            logger.error(f"Homework file not found: {submission.homework_file_path}")
+            _mark_failed(db, submission_id, lease_token)
             return
 
         # 确保答案文件存在
@@ -60,7 +107,6 @@ async def process_submission(submission_id: int):
         # 如果答案文件路径不存在或文件丢失，尝试重新写入临时文件
         if not answer_path or not answer_path.exists():
             # 使用作业目录下的默认位置
-            from app.routers.assignments import get_teacher_assignment_dir
             assignment_dir = get_teacher_assignment_dir(assignment.teacher, assignment)
             assignment_dir.mkdir(parents=True, exist_ok=True)
             answer_path = assignment_dir / "answer_selected.md"
@@ -71,66 +117,162 @@ async def process_submission(submission_id: int):
             db.commit()
 
         # 调用批改函数 (耗时操作)
-        # 注意：grade_homework 是同步还是异步？查看 gemini_client.py 发现它是同步的(def grade_homework)，
-        # 但内部使用了 retry 机制。为了不阻塞 Worker 循环，最好在线程池中运行，
-        # 或者如果它是IO密集型且内部没有 async，直接调用会阻塞 loop。
-        # 鉴于 gemini_client.py 中使用了 google.genai，这通常是同步客户端。
-        # 我们使用 asyncio.to_thread 来运行它，避免阻塞主事件循环。
-        
-        report_md = await asyncio.to_thread(grade_homework, homework_path, answer_path)
+        # grade_homework / extract_json_from_report 是同步调用（含重试），在线程池中运行，
+        # 避免阻塞事件循环（同时保证租约心跳能按时刷新）
+        report_md = await run_blocking(_grade_from_storage, storage, submission.homework_file_path, answer_path)
         
         # 提取JSON数据
-        json_data = extract_json_from_report(report_md)
+        json_data = await run_blocking(extract_json_from_report, report_md)
+        
+        # 确认仍持有租约（并锁定该行到提交）：租约失效后任务可能已由其他Worker重新批改，丢弃本次结果
+        if not hold_lease(db, submission_id, lease_token):
+            db.rollback()
+            logger.warning(f"submission {submission_id} 的租约已失效，丢弃本次批改结果")
+            return
         
         # 保存批改报告和JSON
-        submission_dir = homework_path.parent
+        submission_dir = get_submission_dir(assignment, submission.student)
+        submission_dir.mkdir(parents=True, exist_ok=True)
         report_path = submission_dir / f"{submission.student.student_id}-{submission.student.username}-report.md"
         json_path = submission_dir / f"{submission.student.student_id}-{submission.student.username}-data.json"
         
-        report_path.write_text(report_md, encoding="utf-8")
+        write_report(report_path, report_md)
         json_path.write_text(json.dumps(json_data, ensure_ascii=False, indent=2), encoding="utf-8")
         
-        # 更新submission记录
+        # 更新submission记录（等级、逐题记录与作业统计在同一事务中更新）
+        record_grading_result(db, submission, json_data.get("grade", ""), json_data.get("questions", []))
         submission.report_file_path = str(report_path)
         submission.json_file_path = str(json_path)
-        submission.grade = json_data.get("grade", "")
         submission.status = SubmissionStatus.GRADED
+        submission.lease_token = None
         
         db.commit()
         logger.info(f"批改完成 submission {submission_id}, 等级: {submission.grade}")
         
     except Exception as e:
         logger.error(f"批改失败 submission {submission_id}: {e}", exc_info=True)
-        # 发生异常时标记为失败
+        # 发生异常时标记为失败（先回滚未提交的批改结果和统计更新）
         try:
-            submission.status = SubmissionStatus.FAILED
-            db.commit()
-        except:
+            _mark_failed(db, submission_id, lease_token)
+        except Exception:
             pass
         db.rollback()
     finally:
+        if heartbeat is not None:
+            heartbeat.cancel()
         db.close()
 
-async def start_grading_worker():
-    """启动批改Worker（后台任务）"""
-    logger.info("批改Worker已启动，等待任务...")
-    queue = get_grading_queue()
-    
-    while True:
+class GradingWorker:
+    """
+    从数据库队列领取并批改提交，同时最多处理 concurrency 个
+
+    shutdown() 停止领取新任务，等待进行中的任务最多 grace 秒，仍未完成的取消并改回 PENDING，
+    由其他Worker（或下次启动时）重新批改。
+    注意：取消只能停止协程，正在进行的模型调用（同步调用，在线程中执行）无法中断。
+    模型调用在Worker自己的线程池中执行，关闭时不等待该线程池（abandoned 为 True 表示仍有调用在进行），
+    但解释器退出时仍会等待这些线程结束（最长约为模型调用的超时时间）。
+    独立Worker进程（python -m app.worker）在这种情况下直接结束进程，使 --grace 成为实际的退出时限；
+    Web进程内的Worker退出时仍可能等待进行中的模型调用。
+    """
+
+    def __init__(self, concurrency: int = 1, poll_interval: float = GRADING_POLL_INTERVAL,
+                 grace: float = GRADING_SHUTDOWN_GRACE):
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.grace = grace
+        self._stopping = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="grading")
+        self.abandoned = False
+
+    async def run(self) -> None:
+        logger.info(f"批改Worker已启动（并发 {self.concurrency}），等待任务...")
+        self._tasks = [asyncio.create_task(self._slot(i)) for i in range(self.concurrency)]
+        self._tasks.append(asyncio.create_task(self._recover_loop()))
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info("批改Worker已停止")
+
+    async def shutdown(self) -> None:
+        """停止领取任务，等待或取消进行中的任务"""
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        get_wakeup_event().set()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=self.grace)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # 不等待被放弃的模型调用；其结果不会被保存（提交已重新入队）
+        self.abandoned = bool(pending)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _wait_for_work(self) -> None:
+        wakeup = get_wakeup_event()
         try:
-            # 从队列中获取submission_id
-            submission_id = await queue.get()
-            logger.info(f"从队列中获取到 submission {submission_id}")
-            
-            # 处理批改
-            await process_submission(submission_id)
-            
-            # 标记任务完成
-            queue.task_done()
-            
-        except asyncio.CancelledError:
-            logger.info("Worker任务被取消")
-            break
-        except Exception as e:
-            logger.error(f"Worker循环发生错误: {e}", exc_info=True)
-            await asyncio.sleep(5)  # 错误后等待5秒再继续
+            await asyncio.wait_for(wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        if not self._stopping.is_set():
+            wakeup.clear()
+
+    async def _slot(self, slot: int) -> None:
+        while not self._stopping.is_set():
+            try:
+                claimed = await asyncio.to_thread(_run_with_session, claim_next_submission)
+            except Exception as e:
+                logger.error(f"领取批改任务失败: {e}", exc_info=True)
+                await asyncio.sleep(5)
+                continue
+            if claimed is None:
+                await self._wait_for_work()
+                continue
+            submission_id, lease_token = claimed
+            logger.info(f"Worker {slot} 领取 submission {submission_id}")
+            try:
+                await process_submission(submission_id, lease_token, self._executor)
+            except asyncio.CancelledError:
+                # 关闭时仍未完成：改回 PENDING，由其他Worker重新批改
+                if _run_with_session(requeue_submission, submission_id, lease_token):
+                    logger.info(f"submission {submission_id} 未完成，已重新入队")
+                raise
+
+    async def _recover_loop(self) -> None:
+        interval = max(GRADING_LEASE_SECONDS / 4, self.poll_interval)
+        while not self._stopping.is_set():
+            try:
+                await asyncio.to_thread(_run_with_session, recover_stale_submissions)
+            except Exception as e:
+                logger.error(f"恢复中断的批改任务失败: {e}", exc_info=True)
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+def _run_with_session(fn, *args):
+    db: Session = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+# Web进程内的批改Worker（GRADING_IN_WEB 关闭时不启动，由独立Worker进程批改）
+_web_worker: Optional[GradingWorker] = None
+
+
+async def start_grading_worker():
+    """在Web进程内启动批改Worker（后台任务）"""
+    global _web_worker
+    if not GRADING_IN_WEB:
+        logger.info("GRADING_IN_WEB 已关闭，批改由独立Worker进程（python -m app.worker）执行")
+        return
+    _web_worker = GradingWorker(concurrency=GRADING_CONCURRENCY)
+    await _web_worker.run()
+
+
+async def stop_grading_worker():
+    if _web_worker is not None:
+        await _web_worker.shutdown()
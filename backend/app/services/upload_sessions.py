@@ -0,0 +1,165 @@
+"""
+可续传的分块上传（学生作业PDF）
+
+协议参考 tus：
+1. 创建上传（声明文件名和总大小）；请求头 Idempotency-Key 相同的重复创建返回同一个上传；
+2. 按偏移量依次 PATCH 分块（请求头 Upload-Offset 必须等于服务端已接收的字节数）。
+   连接中断时已收到的部分会保留，客户端查询当前偏移量后从该处继续；
+3. 全部接收后完成上传：保存到存储后端并创建提交记录。同一个上传重复完成时返回已创建的提交，不会重复提交。
+
+未完成的分块写入 {UPLOAD_DIR}/partial 下的临时文件，多台Web节点时需共享 UPLOAD_DIR 或按上传ID做会话保持。
+上传记录（含已完成的）保留 UPLOAD_SESSION_TTL_HOURS 小时，过期后连同临时文件清理。
+"""
+import asyncio
+import logging
+import os
+import secrets
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.file_utils import UPLOAD_DIR
+from app.models import UploadSession
+
+logger = logging.getLogger(__name__)
+
+PARTIAL_DIR = UPLOAD_DIR / "partial"
+# 建议客户端使用的分块大小；单次 PATCH 不限于该大小
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_HOMEWORK_SIZE = int(os.getenv("MAX_HOMEWORK_SIZE", str(50 * 1024 * 1024)))
+UPLOAD_SESSION_TTL_HOURS = float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+# 接收分块时累积到该大小再写入磁盘
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def partial_path(upload_id: str) -> Path:
+    return PARTIAL_DIR / f"{upload_id}.part"
+
+
+def find_by_idempotency_key(db: Session, student_id: int, key: str) -> Optional[UploadSession]:
+    return db.query(UploadSession).filter(
+        UploadSession.student_id == student_id,
+        UploadSession.idempotency_key == key
+    ).first()
+
+
+def create_upload_session(
+    db: Session, student_id: int, assignment_id: int, filename: str, size: int,
+    idempotency_key: Optional[str] = None,
+) -> UploadSession:
+    """创建上传；并发的相同 Idempotency-Key 请求返回已创建的记录"""
+    upload = UploadSession(
+        id=secrets.token_hex(16),
+        student_id=student_id,
+        assignment_id=assignment_id,
+        idempotency_key=idempotency_key,
+        filename=filename,
+        size=size,
+        offset=0,
+    )
+    db.add(upload)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        existing = find_by_idempotency_key(db, student_id, idempotency_key) if idempotency_key else None
+        if existing is None:
+            raise
+        return existing
+    db.refresh(upload)
+    return upload
+
+
+def _write_at(path: Path, offset: int, data: bytes) -> None:
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        f.write(data)
+
+
+def _prepare_partial(path: Path, offset: int) -> int:
+    """确保临时文件存在并截断到 offset（丢弃中断请求中未确认的数据）；返回文件实际可用的长度"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if not path.exists():
+        path.touch()
+    with open(path, "r+b") as f:
+        available = min(offset, os.fstat(f.fileno()).st_size)
+        f.truncate(available)
+    return available
+
+
+async def receive_chunk(upload_id: str, offset: int, size: int, stream: AsyncIterator[bytes]) -> int:
+    """
+    把请求体写入临时文件的 offset 处，返回写入后的偏移量
+    客户端中途断开时已收到的数据照常写入；超出声明大小时抛出 ValueError（超出部分不写入）
+    """
+    from starlette.requests import ClientDisconnect
+
+    path = partial_path(upload_id)
+    available = await asyncio.to_thread(_prepare_partial, path, offset)
+    if available != offset:
+        # 临时文件丢失或不完整（如被清理、请求到了其他节点），只能从文件实际长度处继续
+        return available
+
+    buffer = bytearray()
+    try:
+        async for chunk in stream:
+            if offset + len(buffer) + len(chunk) > size:
+                raise ValueError("上传的数据超过声明的文件大小")
+            buffer += chunk
+            if len(buffer) >= WRITE_BUFFER_SIZE:
+                await asyncio.to_thread(_write_at, path, offset, bytes(buffer))
+                offset += len(buffer)
+                buffer.clear()
+    except ClientDisconnect:
+        logger.info(f"上传 {upload_id} 连接中断，已接收 {offset + len(buffer)} 字节")
+    finally:
+        if buffer:
+            await asyncio.to_thread(_write_at, path, offset, bytes(buffer))
+            offset += len(buffer)
+    return offset
+
+
+def advance_offset(db: Session, upload_id: str, old_offset: int, new_offset: int) -> bool:
+    """以CAS方式更新偏移量；同一上传的并发请求中只有一个生效"""
+    updated = db.query(UploadSession).filter(
+        UploadSession.id == upload_id,
+        UploadSession.offset == old_offset,
+        UploadSession.submission_id.is_(None)
+    ).update({"offset": new_offset, "updated_at": datetime.utcnow()}, synchronize_session=False)
+    db.commit()
+    return updated == 1
+
+
+def attach_submission(db: Session, upload_id: str, submission_id: int) -> bool:
+    """在创建提交的事务中标记上传已完成（不提交事务）；返回 False 表示已被并发的完成请求抢先"""
+    updated = db.query(UploadSession).filter(
+        UploadSession.id == upload_id,
+        UploadSession.submission_id.is_(None)
+    ).update({"submission_id": submission_id, "updated_at": datetime.utcnow()}, synchronize_session=False)
+    return updated == 1
+
+
+def remove_partial(upload_id: str) -> None:
+    try:
+        partial_path(upload_id).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def cleanup_expired_uploads(db: Session) -> int:
+    """删除过期的上传记录及其临时文件，返回数量"""
+    cutoff = datetime.utcnow() - timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+    expired = [upload_id for (upload_id,) in db.query(UploadSession.id).filter(
+        UploadSession.created_at < cutoff
+    ).all()]
+    if not expired:
+        return 0
+    for upload_id in expired:
+        remove_partial(upload_id)
+    db.query(UploadSession).filter(UploadSession.id.in_(expired)).delete(synchronize_session=False)
+    db.commit()
+    logger.info(f"清理了 {len(expired)} 个过期的上传")
+    return len(expired)
@@ -0,0 +1,60 @@
+"""
+独立的批改Worker进程
+
+与Web进程共用数据库中的批改队列（PENDING状态的提交），可以与Web进程分别扩容：
+
+    python -m app.worker --concurrency 4
+
+此时Web进程可设置 GRADING_IN_WEB=false，只负责接收提交。启动时会先执行待执行的数据库结构变更（同 python -m app.migrate）。
+收到 SIGTERM / SIGINT 后停止领取新任务，等待进行中的任务最多 --grace 秒，未完成的重新入队。
+被放弃的模型调用（在线程中执行，无法中断）不再等待，进程直接退出。
+"""
+import argparse
+import asyncio
+import logging
+import os
+import signal
+from typing import List, Optional
+
+from app.migrate import migrate
+from app.services.grading_worker import (
+    GRADING_CONCURRENCY, GRADING_POLL_INTERVAL, GRADING_SHUTDOWN_GRACE, GradingWorker
+)
+
+logger = logging.getLogger("app.worker")
+
+
+async def _run(worker: GradingWorker) -> None:
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, lambda s=sig: _request_shutdown(worker, s))
+    await worker.run()
+
+
+def _request_shutdown(worker: GradingWorker, sig: signal.Signals) -> None:
+    logger.info(f"收到信号 {sig.name}，停止领取新任务")
+    asyncio.ensure_future(worker.shutdown())
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="批改Worker")
+    parser.add_argument("--concurrency", type=int, default=GRADING_CONCURRENCY, help="同时批改的提交数")
+    parser.add_argument("--poll-interval", type=float, default=GRADING_POLL_INTERVAL,
+                        help="队列为空时轮询数据库的间隔（秒）")
+    parser.add_argument("--grace", type=float, default=GRADING_SHUTDOWN_GRACE,
+                        help="退出时等待进行中任务的最长时间（秒）")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    migrate()
+    worker = GradingWorker(concurrency=args.concurrency, poll_interval=args.poll_interval, grace=args.grace)
+    asyncio.run(_run(worker))
+    if worker.abandoned:
+        # 解释器退出时会等待仍在进行的模型调用线程，直接结束进程
+        logger.warning("仍有模型调用未结束，放弃等待并退出")
+        logging.shutdown()
+        os._exit(0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+数据处理核心函数的微基准：按合成的班级规模测量耗时和内存峰值
+
+对每个（学生数, 题目数）组合生成合成数据（逐题结果、JSON文件、数据库中的提交和逐题记录），测量：
+- process_report_to_json：全部学生的原始逐题结果规范化
+- collect_rows：读取全部JSON文件为宽表行
+- get_all_qcols：汇总题目列
+- generate_excel：生成汇总Excel（宽表 + 长表）
+- rebuild_assignment_stats：从提交记录重建作业统计（统计接口在汇总缺失时的路径），含 stats_to_dict
+
+耗时取 --repeat 次中的最小值，内存峰值用 tracemalloc 单独测一次。
+结果可保存为基线（benchmarks/baselines/bench_core.json），之后的运行与基线对比并标出变慢的项目。
+基线与机器相关，对比前应在同一台机器上重新生成。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_core                                  # 默认规模，与基线对比
+    python -m benchmarks.bench_core --students 50,500,2000,10000 --questions 10,50,200
+    python -m benchmarks.bench_core --only collect_rows,get_all_qcols --save-baseline
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = Path(BACKEND_DIR) / "benchmarks" / "baselines" / "bench_core.json"
+
+BENCHMARKS = ["process_report_to_json", "collect_rows", "get_all_qcols", "generate_excel", "rebuild_assignment_stats"]
+RAW_STATUSES = ["正确", "完全正确", "部分正确", "过程部分正确", "计算错误", "错误", "未作答"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="数据处理核心函数的微基准")
+    parser.add_argument("--students", default="50,500,2000", help="学生数（逗号分隔）")
+    parser.add_argument("--questions", default="10,50,200", help="题目数（逗号分隔）")
+    parser.add_argument("--only", help="只运行指定的基准（逗号分隔）：" + ",".join(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数（取最小耗时）")
+    parser.add_argument("--excel-max-cells", type=int, default=500_000,
+                        help="学生数×题目数超过该值时跳过 generate_excel（openpyxl写入较慢）")
+    parser.add_argument("--no-memory", action="store_true", help="不测内存峰值")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="基线文件路径")
+    parser.add_argument("--save-baseline", action="store_true", help="将本次结果写入基线文件")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="耗时超过基线该倍数时标记为变慢")
+    parser.add_argument("--seed", type=int, default=20240901)
+    return parser.parse_args()
+
+
+def question_keys(n_questions: int):
+    """合成题目：每节10题，如 §2.1 T1"""
+    return [(f"§2.{i // 10 + 1}", f"T{i % 10 + 1}") for i in range(n_questions)]
+
+
+def synthesize(workdir: Path, n_students: int, n_questions: int, rng: random.Random):
+    """生成合成数据：原始逐题结果、JSON文件目录、数据库中的作业及提交"""
+    from sqlalchemy import insert
+    from app.database import SessionLocal
+    from app.models import Assignment, AssignmentStatus, Submission, SubmissionQuestion, SubmissionStatus, User, UserRole
+    from app.core.json_processor import process_report_to_json
+
+    keys = question_keys(n_questions)
+    students = [(f"{20240000 + i}", f"stu{i}") for i in range(n_students)]
+    raw = [
+        [{"section": section, "id": qid, "status": rng.choice(RAW_STATUSES)} for section, qid in keys]
+        for _ in students
+    ]
+
+    json_dir = workdir / f"json_{n_students}_{n_questions}"
+    json_dir.mkdir()
+    processed = []
+    for (sid, name), questions in zip(students, raw):
+        data = process_report_to_json("", name, sid, questions)
+        processed.append(data)
+        student_dir = json_dir / f"{sid}-{name}"
+        student_dir.mkdir()
+        (student_dir / f"{sid}-{name}-data.json").write_text(
+            json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+
+    db = SessionLocal()
+    try:
+        class_id = f"C{n_students}x{n_questions}"
+        teacher = User(username=f"teacher_{class_id}", password_hash="x", role=UserRole.TEACHER, class_id=class_id)
+        db.add(teacher)
+        db.flush()
+        assignment = Assignment(title=f"bench {class_id}", class_id=class_id, teacher_id=teacher.id,
+                                status=AssignmentStatus.CLOSED)
+        db.add(assignment)
+        db.flush()
+        user_ids = [row[0] for row in db.execute(insert(User).returning(User.id), [
+            {"username": f"{class_id}_{name}", "password_hash": "x", "role": UserRole.STUDENT,
+             "class_id": class_id, "student_id": f"{class_id}_{sid}"}
+            for sid, name in students
+        ])]
+        submission_ids = [row[0] for row in db.execute(insert(Submission).returning(Submission.id), [
+            {"assignment_id": assignment.id, "student_id": uid, "homework_file_path": "blob://bench.pdf",
+             "status": SubmissionStatus.GRADED, "grade": data["grade"]}
+            for uid, data in zip(user_ids, processed)
+        ])]
+        db.execute(insert(SubmissionQuestion), [
+            {"submission_id": submission_id, "assignment_id": assignment.id, "key": q["key"], "status": q["status"]}
+            for submission_id, data in zip(submission_ids, processed)
+            for q in data["questions"]
+        ])
+        db.commit()
+        assignment_id = assignment.id
+    finally:
+        db.close()
+
+    return {"students": students, "raw": raw, "json_dir": json_dir, "assignment_id": assignment_id,
+            "output": workdir / f"summary_{n_students}_{n_questions}.xlsx"}
+
+
+def make_cases(data):
+    """各基准的被测函数（无参数的可调用对象）"""
+    from app.database import SessionLocal
+    from app.core.json_processor import process_report_to_json
+    from app.core.excel_generator import collect_rows, generate_excel, get_all_qcols
+    from app.services.assignment_stats import rebuild_assignment_stats, stats_to_dict
+
+    rows = collect_rows(data["json_dir"])
+
+    def run_process_report_to_json():
+        for (sid, name), questions in zip(data["students"], data["raw"]):
+            process_report_to_json("", name, sid, questions)
+
+    def run_rebuild_assignment_stats():
+        db = SessionLocal()
+        try:
+            agg = rebuild_assignment_stats(db, data["assignment_id"])
+            stats_to_dict(agg, len(data["students"]))
+            db.rollback()
+        finally:
+            db.close()
+
+    return {
+        "process_report_to_json": run_process_report_to_json,
+        "collect_rows": lambda: collect_rows(data["json_dir"]),
+        "get_all_qcols": lambda: get_all_qcols(rows),
+        "generate_excel": lambda: generate_excel(data["json_dir"], data["output"]),
+        "rebuild_assignment_stats": run_rebuild_assignment_stats,
+    }
+
+
+def measure(fn, repeat: int, memory: bool):
+    times = []
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            fn()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return {"seconds": min(times), "peak_bytes": peak}
+
+
+def load_baseline(path: str):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("results", {})
+    except FileNotFoundError:
+        return {}
+
+
+def format_result(name, key, result, baseline, tolerance):
+    seconds = result["seconds"]
+    peak = result["peak_bytes"]
+    line = f"  {name:<26} {seconds * 1000:>10.1f}ms"
+    line += f" {peak / 2 ** 20:>9.1f}MB" if peak is not None else " " * 12
+    base = baseline.get(key)
+    if base:
+        ratio = seconds / base["seconds"] if base["seconds"] else float("inf")
+        flag = "  ← 变慢" if ratio > tolerance else ""
+        line += f"   基线 {base['seconds'] * 1000:.1f}ms ×{ratio:.2f}{flag}"
+    return line, bool(base) and seconds > base["seconds"] * tolerance
+
+
+def main():
+    args = parse_args()
+    student_sizes = [int(v) for v in args.students.split(",")]
+    question_sizes = [int(v) for v in args.questions.split(",")]
+    selected = args.only.split(",") if args.only else BENCHMARKS
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        sys.exit(f"未知的基准: {', '.join(sorted(unknown))}")
+    baseline_path = os.path.abspath(args.baseline)
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-core-"))
+    os.environ["DATABASE_URL"] = f"sqlite:///{workdir / 'bench.db'}"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+    from app.migrate import migrate
+    migrate()
+
+    rng = random.Random(args.seed)
+    baseline = load_baseline(baseline_path)
+    results = {}
+    regressions = []
+    for n_students in student_sizes:
+        for n_questions in question_sizes:
+            start = time.perf_counter()
+            data = synthesize(workdir, n_students, n_questions, rng)
+            print(f"学生 {n_students} × 题目 {n_questions}（准备数据 {time.perf_counter() - start:.1f}s）")
+            cases = make_cases(data)
+            for name in selected:
+                if name == "generate_excel" and n_students * n_questions > args.excel_max_cells:
+                    print(f"  {name:<26} 跳过（超过 --excel-max-cells）")
+                    continue
+                key = f"{name}/{n_students}x{n_questions}"
+                results[key] = measure(cases[name], args.repeat, not args.no_memory)
+                line, regressed = format_result(name, key, results[key], baseline, args.tolerance)
+                print(line)
+                if regressed:
+                    regressions.append(key)
+
+    if args.save_baseline:
+        merged = {**baseline, **results}
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": merged}, f, ensure_ascii=False, indent=2,
+                      sort_keys=True)
+        print(f"基线已保存: {baseline_path}")
+    if regressions:
+        print(f"比基线慢 {args.tolerance} 倍以上: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
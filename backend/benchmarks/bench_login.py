@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+登录吞吐量基准测试：模拟上课时全班同时登录
+
+在临时目录中创建独立的SQLite数据库，预先写入N个学生账号，
+然后以给定并发数通过ASGI直接调用 /api/auth/login，统计吞吐量与延迟分位数。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_login --users 200 --concurrency 50 --rounds 12
+    python -m benchmarks.bench_login --inline   # 对比：在事件循环中直接计算bcrypt（旧行为）
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="登录吞吐量基准测试")
+    parser.add_argument("--users", type=int, default=100, help="登录请求数（每个用户一次）")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发请求数")
+    parser.add_argument("--rounds", type=int, default=12, help="BCRYPT_ROUNDS")
+    parser.add_argument("--workers", type=int, default=None, help="PASSWORD_HASH_WORKERS")
+    parser.add_argument("--inline", action="store_true", help="在事件循环中同步计算哈希（旧行为，用于对比）")
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+async def run(args):
+    import httpx
+    from app.main import app
+    from app.migrate import migrate
+    from app.database import SessionLocal
+    from app.models import User, UserRole
+    from app.core import security
+    import app.routers.auth as auth_router
+
+    migrate()
+
+    if args.inline:
+        async def inline_verify(plain, hashed):
+            return security.pwd_context.verify_and_update(plain, hashed)
+        auth_router.verify_and_update_password_async = inline_verify
+
+    # 所有账号使用相同密码，只计算一次哈希以加快准备阶段
+    password_hash = security.get_password_hash("password")
+    db = SessionLocal()
+    db.add_all([
+        User(username=f"bench{i}", password_hash=password_hash, role=UserRole.STUDENT,
+             class_id="101", student_id=f"B{i:06d}")
+        for i in range(args.users)
+    ])
+    db.commit()
+    db.close()
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    failures = 0
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def login(i):
+            nonlocal failures
+            async with semaphore:
+                start = time.perf_counter()
+                resp = await client.post("/api/auth/login", data={"username": f"bench{i}", "password": "password"})
+                latencies.append(time.perf_counter() - start)
+                if resp.status_code != 200:
+                    failures += 1
+
+        # 登录高峰期间持续探测 /api/health，衡量其他请求是否被哈希计算阻塞
+        probe_latencies = []
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                probe_start = time.perf_counter()
+                await client.get("/api/health")
+                probe_latencies.append(time.perf_counter() - probe_start)
+                await asyncio.sleep(0.05)
+
+        probe_task = asyncio.create_task(probe())
+        start = time.perf_counter()
+        await asyncio.gather(*(login(i) for i in range(args.users)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    mode = "inline（事件循环内）" if args.inline else f"线程池（{security.PASSWORD_HASH_WORKERS} 线程）"
+    print(f"模式: {mode}, bcrypt rounds: {security.BCRYPT_ROUNDS}")
+    print(f"请求数: {args.users}, 并发: {args.concurrency}, 失败: {failures}")
+    print(f"总耗时: {elapsed:.2f}s, 吞吐量: {args.users / elapsed:.1f} 次登录/秒")
+    print(
+        f"延迟: p50={percentile(latencies, 50) * 1000:.0f}ms "
+        f"p95={percentile(latencies, 95) * 1000:.0f}ms "
+        f"p99={percentile(latencies, 99) * 1000:.0f}ms "
+        f"mean={statistics.mean(latencies) * 1000:.0f}ms"
+    )
+    print(
+        f"同期 /api/health 延迟: p50={percentile(probe_latencies, 50) * 1000:.0f}ms "
+        f"max={max(probe_latencies) * 1000:.0f}ms（{len(probe_latencies)} 次探测）"
+    )
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench-login-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    if args.workers:
+        os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    os.chdir(workdir)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
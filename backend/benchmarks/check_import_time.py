@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+导入耗时检查：防止Web/Worker进程的启动变慢
+
+在空的临时目录中用全新的解释器多次导入 app.main（及 app.worker），检查：
+- 导入耗时（取中位数）不超过 --budget-ms；
+- 没有在导入时加载重量级依赖（pandas、numpy、openpyxl、google.genai、boto3），它们应在首次使用时导入；
+- 导入时没有在当前目录创建文件或目录（建表等结构变更应由 python -m app.migrate 执行）。
+
+任一项不满足时退出码为1，可放在CI或部署脚本中。预算与机器相关，可按部署环境调整。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.check_import_time
+    python -m benchmarks.check_import_time --budget-ms 1200 --runs 7 --modules app.main
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["pandas", "numpy", "openpyxl", "google.genai", "boto3"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"ms": elapsed * 1000, "heavy": heavy}}))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="导入耗时检查")
+    parser.add_argument("--modules", default="app.main,app.worker", help="要检查的模块（逗号分隔）")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="导入耗时预算（毫秒，中位数）")
+    parser.add_argument("--runs", type=int, default=5, help="每个模块的导入次数")
+    return parser.parse_args()
+
+
+def probe(module: str, workdir: str) -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", "")
+    env["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'app.db')}"
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=workdir, env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        sys.exit(f"导入 {module} 失败：\n{result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    args = parse_args()
+    failures = []
+    for module in args.modules.split(","):
+        with tempfile.TemporaryDirectory(prefix="import-check-") as workdir:
+            runs = [probe(module, workdir) for _ in range(max(1, args.runs))]
+            created = sorted(os.listdir(workdir))
+
+        median = statistics.median(r["ms"] for r in runs)
+        heavy = sorted({m for r in runs for m in r["heavy"]})
+        print(f"{module}: 中位数 {median:.0f}ms（最快 {min(r['ms'] for r in runs):.0f}ms，"
+              f"最慢 {max(r['ms'] for r in runs):.0f}ms，预算 {args.budget_ms:.0f}ms）")
+        if median > args.budget_ms:
+            failures.append(f"{module} 导入耗时 {median:.0f}ms 超过预算 {args.budget_ms:.0f}ms")
+        if heavy:
+            failures.append(f"{module} 导入时加载了 {', '.join(heavy)}")
+        if created:
+            failures.append(f"{module} 导入时在当前目录创建了 {', '.join(created)}")
+
+    if failures:
+        for failure in failures:
+            print(f"✗ {failure}")
+        sys.exit(1)
+    print("✓ 导入检查通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟的 Gemini API（压测用）
+
+实现 POST /{api_version}/models/{model}:generateContent，按提示词类型返回预设内容：
+答案提取、批改报告（逐题结果随机）、逐题JSON、全班报告。可配置响应延迟分布和 429 / 503 错误注入。
+后端通过环境变量 GEMINI_BASE_URL 指向本服务。
+
+单独运行（在 backend 目录下）：
+    python -m benchmarks.fake_gemini --port 8765 --latency lognormal:8,0.4 --rate-429 0.02 --rate-503 0.05
+    GEMINI_BASE_URL=http://127.0.0.1:8765 GEMINI_API_KEY=fake uvicorn app.main:app
+
+延迟分布（秒）：fixed:S、uniform:A,B、lognormal:MEDIAN,SIGMA
+"""
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+STATUSES = ["正确", "正确", "正确", "过程部分正确", "答案正确结果错误", "错误"]
+QUESTION_KEYS = [("§2.5", f"T{i}") for i in range(1, 7)] + [("§2.6", f"T{i}") for i in range(1, 5)]
+
+ANSWER_MD = "# 习题与解答\n\n" + "\n\n".join(
+    f"## {section} {qid}\n题目内容……\n\n**解答**：$x = {i}$" for i, (section, qid) in enumerate(QUESTION_KEYS)
+)
+
+CLASS_REPORT_MD = (
+    "## 一、整体情况概览\n全班整体完成情况良好。\n\n"
+    "## 二、题目完成情况分析\n§2.5 T3 错误率较高。\n\n"
+    "## 三、常见错误分析\n符号错误、漏步。\n\n"
+    "## 四、重点关注学生\n无。\n\n"
+    "## 五、教学建议\n复习§2.5。\n"
+)
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """解析延迟分布：fixed:S、uniform:A,B、lognormal:MEDIAN,SIGMA"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",")] if params else []
+    if kind == "fixed":
+        return lambda: values[0] if values else 0.0
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: random.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+    raise ValueError(f"未知的延迟分布: {spec}")
+
+
+def _grading_report() -> str:
+    lines = ["## 一、学生作业 OCR 结果", "（模拟OCR内容）", "", "## 二、逐题批改简报"]
+    for section, qid in QUESTION_KEYS:
+        lines.append(f"- {section} {qid}：已作答，判断：{random.choice(STATUSES)}。建议：注意书写规范。")
+    return "\n".join(lines) + "\n"
+
+
+def _questions_json(report_md: str) -> str:
+    questions = [
+        {"section": section, "id": qid, "status": status}
+        for section, qid, status in re.findall(r"(§[\d.]+) (T\d+)：已作答，判断：(\S+?)。", report_md)
+    ]
+    # 与真实模型一致，JSON包在代码块中
+    return "```json\n" + json.dumps({"questions": questions}, ensure_ascii=False, indent=2) + "\n```"
+
+
+def canned_response(prompt: str) -> str:
+    """按提示词内容判断调用类型，返回对应的预设内容"""
+    if "严格 JSON" in prompt:
+        return _questions_json(prompt)
+    if "homework.pdf" in prompt:
+        return _grading_report()
+    if "教师用书以及用户" in prompt:
+        return ANSWER_MD
+    return CLASS_REPORT_MD
+
+
+class FakeGemini:
+    def __init__(self, latency: Callable[[], float], rate_429: float = 0.0, rate_503: float = 0.0):
+        self.latency = latency
+        self.rate_429 = rate_429
+        self.rate_503 = rate_503
+        self.counts: Counter = Counter()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """在后台线程中启动服务，返回 base URL"""
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                fake.handle(self, body)
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://{host}:{self._server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def handle(self, handler: BaseHTTPRequestHandler, body: bytes) -> None:
+        if not handler.path.split("?")[0].endswith(":generateContent"):
+            self._send(handler, 404, {"error": {"code": 404, "message": "not found", "status": "NOT_FOUND"}})
+            return
+        time.sleep(self.latency())
+
+        roll = random.random()
+        if roll < self.rate_429:
+            self.count("429")
+            self._send(handler, 429, {"error": {
+                "code": 429, "message": "Resource has been exhausted (e.g. check quota).",
+                "status": "RESOURCE_EXHAUSTED"}})
+            return
+        if roll < self.rate_429 + self.rate_503:
+            self.count("503")
+            self._send(handler, 503, {"error": {
+                "code": 503, "message": "The model is overloaded. Please try again later.",
+                "status": "UNAVAILABLE"}})
+            return
+
+        request = json.loads(body or b"{}")
+        prompt = "\n".join(
+            part.get("text", "")
+            for content in request.get("contents", [])
+            for part in content.get("parts", [])
+        )
+        text = canned_response(prompt)
+        self.count("200")
+        self._send(handler, 200, {
+            "candidates": [{
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": len(prompt), "candidatesTokenCount": len(text)},
+        })
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, payload: dict) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json; charset=utf-8")
+        handler.send_header("Content-Length", str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--latency", default="lognormal:2,0.5",
+                        help="模型响应延迟分布（秒）：fixed:S、uniform:A,B、lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回429（限流）的比例")
+    parser.add_argument("--rate-503", type=float, default=0.0, help="返回503（过载）的比例")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 Gemini API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    fake = FakeGemini(parse_latency(args.latency), args.rate_429, args.rate_503)
+    print(f"模拟 Gemini API: {fake.start(args.host, args.port)}")
+    try:
+        while True:
+            time.sleep(60)
+            print(dict(fake.counts))
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
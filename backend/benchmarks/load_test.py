@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端压测：模拟截止时间前全班集中提交作业
+
+启动本地模拟的 Gemini API（benchmarks/fake_gemini.py），在临时目录中使用独立的SQLite数据库和上传目录，
+通过ASGI直接调用真实的FastAPI应用，完整走一遍：
+教师注册登录 → 创建作业、提取答案、发布 → N个学生注册登录 → 提交作业 → 批改 → 统计 → 导出Excel。
+
+批改由本进程内的批改Worker执行（与Web进程内批改相同），或用 --worker-processes 启动独立的
+python -m app.worker 进程。输出提交吞吐量、排队等待和端到端耗时的分位数，以及数据库锁错误数。
+
+用法（在 backend 目录下）：
+    python -m benchmarks.load_test --students 200 --worker-concurrency 8 --latency lognormal:3,0.5
+    python -m benchmarks.load_test --students 200 --worker-processes 2 --worker-concurrency 4 --rate-503 0.05
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.fake_gemini import FakeGemini, add_arguments, parse_latency
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_LOCK_MESSAGE = "database is locked"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="端到端压测")
+    parser.add_argument("--students", type=int, default=50, help="学生人数（每人提交一次）")
+    parser.add_argument("--concurrency", type=int, default=10, help="注册、登录、提交的并发请求数")
+    parser.add_argument("--arrival-window", type=float, default=0.0,
+                        help="提交在该时间窗口（秒）内均匀随机到达；0 表示同时提交")
+    parser.add_argument("--worker-concurrency", type=int, default=4, help="每个批改Worker同时批改的数量")
+    parser.add_argument("--worker-processes", type=int, default=0,
+                        help="独立批改Worker进程数；0 表示在本进程内批改（与 GRADING_IN_WEB 相同）")
+    parser.add_argument("--pdf-kb", type=int, default=200, help="每份作业PDF的大小（KB）")
+    parser.add_argument("--poll-interval", type=float, default=0.2, help="轮询批改状态的间隔（秒）")
+    parser.add_argument("--timeout", type=float, default=900, help="等待全部批改完成的最长时间（秒）")
+    parser.add_argument("--rounds", type=int, default=4, help="BCRYPT_ROUNDS（压测准备阶段使用较小值）")
+    parser.add_argument("--json", help="将结果另存为JSON文件")
+    add_arguments(parser)
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "mean": statistics.mean(values) if values else float("nan"),
+    }
+
+
+def format_summary(name, s, unit=1.0, suffix="s"):
+    return (
+        f"{name}: p50={s['p50'] * unit:.2f}{suffix} p95={s['p95'] * unit:.2f}{suffix} "
+        f"p99={s['p99'] * unit:.2f}{suffix} mean={s['mean'] * unit:.2f}{suffix}（{s['count']} 个）"
+    )
+
+
+class LockErrorCounter(logging.Handler):
+    """统计日志中的SQLite锁错误"""
+
+    def __init__(self):
+        super().__init__(level=logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        text = record.getMessage()
+        if record.exc_info and record.exc_info[1] is not None:
+            text += str(record.exc_info[1])
+        if DB_LOCK_MESSAGE in text:
+            self.count += 1
+
+
+def fake_pdf(size_kb: int, seed: int) -> bytes:
+    # 每份内容不同，避免存储去重影响结果
+    rng = random.Random(seed)
+    return b"%PDF-1.4\n" + rng.randbytes(max(size_kb, 1) * 1024) + b"\n%%EOF\n"
+
+
+async def wait_for_log(path: str, text: str, timeout: float = 60) -> None:
+    """等待独立Worker进程启动完成"""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            if text in f.read():
+                return
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"批改Worker未能启动，见 {path}")
+
+
+async def run(args, fake: FakeGemini, workdir: str):
+    import httpx
+    from app.main import app
+    from app.migrate import migrate
+    from app.services.grading_worker import GradingWorker
+
+    migrate()
+
+    lock_errors = LockErrorCounter()
+    logging.getLogger().addHandler(lock_errors)
+    http_errors = Counter()
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def request(method, url, expected=200, **kwargs):
+            resp = await client.request(method, url, **kwargs)
+            if resp.status_code != expected:
+                http_errors[f"{method} {url.rstrip('/').rsplit('/', 1)[-1]} {resp.status_code}"] += 1
+                if DB_LOCK_MESSAGE in resp.text:
+                    lock_errors.count += 1
+            return resp
+
+        async def register_and_login(username, role, class_id, student_id=None):
+            await request("POST", "/api/auth/register", json={
+                "username": username, "password": "password", "role": role,
+                "invite_code": f"{role}-{class_id}", "student_id": student_id,
+            })
+            resp = await request("POST", "/api/auth/login", data={"username": username, "password": "password"})
+            if resp.status_code != 200:
+                return None
+            return {"Authorization": f"Bearer {resp.json()['access_token']}"}
+
+        # 准备：教师创建并发布作业（答案提取同样经过模拟的 Gemini API）
+        setup_start = time.perf_counter()
+        teacher = await register_and_login("bench_teacher", "teacher", "901")
+        assignment = (await request("POST", "/api/assignments/", json={"title": "压测作业", "class_id": "901"},
+                                    headers=teacher)).json()
+        assignment_id = assignment["id"]
+        await request("POST", f"/api/assignments/{assignment_id}/extract-answer",
+                      files={"pdf_file": ("answer.pdf", fake_pdf(64, -1), "application/pdf")},
+                      data={"teacher_msg": "全部"}, headers=teacher)
+        await request("POST", f"/api/assignments/{assignment_id}/publish", headers=teacher)
+
+        # 批改Worker（在准备学生账号期间启动，不把进程启动时间计入排队等待）
+        worker_procs = []
+        worker = None
+        worker_task = None
+        if args.worker_processes > 0:
+            for n in range(args.worker_processes):
+                log = open(os.path.join(workdir, f"worker-{n}.log"), "w")
+                worker_procs.append((subprocess.Popen(
+                    [sys.executable, "-m", "app.worker", "--concurrency", str(args.worker_concurrency),
+                     "--poll-interval", str(args.poll_interval)],
+                    cwd=workdir, env={**os.environ, "PYTHONPATH": BACKEND_DIR},
+                    stdout=log, stderr=subprocess.STDOUT,
+                ), log))
+        else:
+            worker = GradingWorker(concurrency=args.worker_concurrency, poll_interval=args.poll_interval)
+            worker_task = asyncio.create_task(worker.run())
+
+        async def prepare_student(i):
+            async with semaphore:
+                return await register_and_login(f"bench_s{i}", "student", "901", f"B{i:06d}")
+
+        students = [h for h in await asyncio.gather(*(prepare_student(i) for i in range(args.students))) if h]
+        print(f"准备完成: {len(students)}/{args.students} 名学生，用时 {time.perf_counter() - setup_start:.1f}s")
+        for _, log in worker_procs:
+            await wait_for_log(log.name, "批改Worker已启动")
+
+        # 提交：按到达时间分布提交，记录每份提交的时间
+        submitted_at = {}
+        submit_latencies = []
+        pdfs = [fake_pdf(args.pdf_kb, i) for i in range(args.students)]
+        load_start = time.perf_counter()
+
+        async def submit(i, headers):
+            await asyncio.sleep(random.uniform(0, args.arrival_window) if args.arrival_window else 0)
+            async with semaphore:
+                start = time.perf_counter()
+                resp = await request("POST", f"/api/students/assignments/{assignment_id}/submit",
+                                     files={"homework_file": ("homework.pdf", pdfs[i], "application/pdf")},
+                                     headers=headers)
+                end = time.perf_counter()
+            submit_latencies.append(end - start)
+            if resp.status_code == 200:
+                submitted_at[resp.json()["submission"]["id"]] = end
+
+        # 轮询批改状态：首次看到 processing 记为开始批改，首次看到 graded / failed 记为完成
+        started_at, finished_at, final_status = {}, {}, {}
+        submitting = asyncio.gather(*(submit(i, h) for i, h in enumerate(students)))
+
+        async def monitor():
+            while True:
+                resp = await request("GET", f"/api/teachers/assignments/{assignment_id}/submissions",
+                                     headers=teacher)
+                now = time.perf_counter()
+                if resp.status_code == 200:
+                    for s in resp.json():
+                        if s["status"] == "processing":
+                            started_at.setdefault(s["id"], now)
+                        elif s["status"] in ("graded", "failed", "published"):
+                            started_at.setdefault(s["id"], now)
+                            if s["id"] not in finished_at:
+                                finished_at[s["id"]] = now
+                                final_status[s["id"]] = s["status"]
+                if submitting.done() and len(finished_at) >= len(submitted_at):
+                    return
+                if now - load_start > args.timeout:
+                    print(f"超时：{len(submitted_at) - len(finished_at)} 份提交未完成批改")
+                    return
+                await asyncio.sleep(args.poll_interval)
+
+        await asyncio.gather(submitting, monitor())
+        load_elapsed = time.perf_counter() - load_start
+
+        if worker is not None:
+            await worker.shutdown()
+            await worker_task
+        for proc, log in worker_procs:
+            proc.terminate()
+            proc.wait(timeout=60)
+            log.close()
+            with open(log.name, encoding="utf-8", errors="replace") as f:
+                lock_errors.count += f.read().count(DB_LOCK_MESSAGE)
+
+        # 批改完成后的统计和导出
+        start = time.perf_counter()
+        await request("GET", f"/api/teachers/assignments/{assignment_id}/stats", headers=teacher)
+        stats_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        excel = await request("GET", f"/api/teachers/assignments/{assignment_id}/download-excel", headers=teacher)
+        excel_seconds = time.perf_counter() - start
+
+    queue_waits = [started_at[i] - submitted_at[i] for i in finished_at if i in submitted_at]
+    end_to_end = [finished_at[i] - submitted_at[i] for i in finished_at if i in submitted_at]
+    statuses = Counter(final_status.values())
+    completed = sum(n for status, n in statuses.items() if status != "failed")
+    return {
+        "students": args.students,
+        "worker_processes": args.worker_processes,
+        "worker_concurrency": args.worker_concurrency,
+        "latency": args.latency,
+        "rate_429": args.rate_429,
+        "rate_503": args.rate_503,
+        "elapsed_seconds": load_elapsed,
+        "submissions_per_minute": completed / load_elapsed * 60 if load_elapsed else 0.0,
+        "statuses": dict(statuses),
+        "submit_latency": summarize(submit_latencies),
+        "queue_wait": summarize(queue_waits),
+        "end_to_end": summarize(end_to_end),
+        "stats_seconds": stats_seconds,
+        "excel_seconds": excel_seconds,
+        "excel_bytes": len(excel.content),
+        "db_lock_errors": lock_errors.count,
+        "http_errors": dict(http_errors),
+        "gemini_responses": dict(fake.counts),
+    }
+
+
+def report(result):
+    workers = (f"{result['worker_processes']} 个独立进程 × {result['worker_concurrency']}"
+               if result["worker_processes"] else f"进程内 × {result['worker_concurrency']}")
+    print(f"学生: {result['students']}, 批改Worker: {workers}, 模型延迟: {result['latency']}, "
+          f"429: {result['rate_429']:.0%}, 503: {result['rate_503']:.0%}")
+    print(f"总耗时: {result['elapsed_seconds']:.1f}s, 吞吐量: {result['submissions_per_minute']:.1f} 份/分钟, "
+          f"结果: {result['statuses']}")
+    print(format_summary("提交请求", result["submit_latency"], 1000, "ms"))
+    print(format_summary("排队等待", result["queue_wait"]))
+    print(format_summary("端到端", result["end_to_end"]))
+    print(f"统计: {result['stats_seconds'] * 1000:.0f}ms, Excel导出: {result['excel_seconds'] * 1000:.0f}ms "
+          f"（{result['excel_bytes']} 字节）")
+    print(f"数据库锁错误: {result['db_lock_errors']}, HTTP错误: {result['http_errors'] or '无'}")
+    print(f"模拟 Gemini 响应: {result['gemini_responses']}")
+
+
+def main():
+    args = parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    workdir = tempfile.mkdtemp(prefix="bench-load-")
+    fake = FakeGemini(parse_latency(args.latency), args.rate_429, args.rate_503)
+    os.environ["GEMINI_BASE_URL"] = fake.start()
+    os.environ["GEMINI_API_KEY"] = "fake"
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["GRADING_IN_WEB"] = "false"
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+    logging.basicConfig(level=logging.ERROR)
+
+    result = asyncio.run(run(args, fake, workdir))
+    fake.stop()
+    report(result)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,9 @@
 import uvicorn
 
 if __name__ == "__main__":
+    # 开发环境启动前自动执行数据库结构迁移（生产环境见 python -m app.migrate）
+    from app.migrate import migrate
+    migrate()
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
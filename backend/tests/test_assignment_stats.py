@@ -0,0 +1,131 @@
+"""
+作业统计汇总的并发更新：两个会话（模拟Web进程和独立Worker）交错批改同一作业的不同提交
+
+在 backend 目录下运行：python -m pytest -q tests
+"""
+import threading
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.migrate import migrate
+from app.models import (
+    Assignment, AssignmentStatsAggregate, Submission, SubmissionStatus, User, UserRole
+)
+from app.services.assignment_stats import (
+    get_assignment_aggregate, record_grading_result, record_submissions_created
+)
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'stats.db'}", connect_args={"check_same_thread": False, "timeout": 10}
+    )
+    migrate(engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    yield factory
+    engine.dispose()
+
+
+def _seed(factory, submissions: int):
+    """创建一个作业和若干份待批改的提交，并建立统计汇总；返回 (作业ID, 提交ID列表)"""
+    db = factory()
+    try:
+        teacher = User(username="teacher", password_hash="x", role=UserRole.TEACHER, class_id="c1")
+        db.add(teacher)
+        db.flush()
+        assignment = Assignment(title="HW", teacher_id=teacher.id, class_id="c1")
+        db.add(assignment)
+        db.flush()
+        ids = []
+        for i in range(submissions):
+            student = User(username=f"s{i}", password_hash="x", role=UserRole.STUDENT,
+                           class_id="c1", student_id=str(i))
+            db.add(student)
+            db.flush()
+            submission = Submission(assignment_id=assignment.id, student_id=student.id,
+                                    homework_file_path="h.pdf", status=SubmissionStatus.PROCESSING)
+            db.add(submission)
+            db.flush()
+            ids.append(submission.id)
+        get_assignment_aggregate(db, assignment.id)
+        return assignment.id, ids
+    finally:
+        db.close()
+
+
+def _interleave(factory, steps):
+    """
+    每个step(db)在各自的会话和线程中执行：全部先完成读取，再依次写入并提交；
+    step 返回写入函数，写入后保持事务一小段时间，确保后一个写入与之重叠
+    """
+    loaded = threading.Barrier(len(steps))
+    errors = []
+
+    def run(step):
+        db = factory()
+        try:
+            write = step(db)
+            loaded.wait()
+            write()
+            threading.Event().wait(0.2)
+            db.commit()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=run, args=(step,)) for step in steps]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+
+def _aggregate(factory, assignment_id):
+    db = factory()
+    try:
+        return db.query(AssignmentStatsAggregate).filter(
+            AssignmentStatsAggregate.assignment_id == assignment_id
+        ).one()
+    finally:
+        db.close()
+
+
+def test_concurrent_grading_keeps_both_results(session_factory):
+    assignment_id, (first, second) = _seed(session_factory, 2)
+
+    def grade(submission_id, grade, status):
+        def step(db):
+            submission = db.query(Submission).filter(Submission.id == submission_id).one()
+            # 先读取汇总（旧实现在此时就读到了修改前的值）
+            get_assignment_aggregate(db, assignment_id)
+            return lambda: record_grading_result(
+                db, submission, grade, [{"key": "T1", "status": status}]
+            )
+        return step
+
+    _interleave(session_factory, [grade(first, "A", "正确"), grade(second, "B", "错误")])
+
+    agg = _aggregate(session_factory, assignment_id)
+    assert agg.grade_distribution == {"A": 1, "B": 1}
+    assert agg.grade_points_count == 2
+    assert agg.grade_points_total == 9 + 6
+    assert sum(stats["total"] for stats in agg.question_stats.values()) == 2
+
+
+def test_concurrent_submission_counts_are_added(session_factory):
+    assignment_id, _ = _seed(session_factory, 0)
+
+    def create(count):
+        def step(db):
+            get_assignment_aggregate(db, assignment_id)
+            return lambda: record_submissions_created(db, assignment_id, count)
+        return step
+
+    _interleave(session_factory, [create(1), create(3)])
+
+    assert _aggregate(session_factory, assignment_id).submitted_count == 4
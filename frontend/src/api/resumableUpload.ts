@@ -0,0 +1,91 @@
+import client from './client'
+
+// 可续传上传：创建上传 → 按偏移量分块 PATCH → 完成上传
+// 网络中断时查询服务端已接收的偏移量并从该处继续；刷新页面后重新选择同一文件也会续传
+
+const MAX_RETRIES = 8
+
+interface UploadStatus {
+  upload_id: string
+  size: number
+  offset: number
+  chunk_size: number
+  submission_id: number | null
+}
+
+const storageKey = (assignmentId: string, file: File) =>
+  `upload:${assignmentId}:${file.name}:${file.size}:${file.lastModified}`
+
+const newIdempotencyKey = () =>
+  typeof crypto !== 'undefined' && 'randomUUID' in crypto
+    ? crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms))
+
+// 只有网络错误和服务端临时错误需要重试；4xx（偏移量冲突除外）直接报错
+const isRetryable = (err: any) => !err.response || err.response.status >= 500
+
+async function withRetry<T>(fn: () => Promise<T>): Promise<T> {
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await fn()
+    } catch (err: any) {
+      if (!isRetryable(err) || attempt >= MAX_RETRIES) throw err
+      await sleep(Math.min(1000 * 2 ** attempt, 15000))
+    }
+  }
+}
+
+export async function uploadHomework(
+  assignmentId: string,
+  file: File,
+  onProgress?: (loaded: number, total: number) => void
+) {
+  const key = storageKey(assignmentId, file)
+  // 同一文件复用同一个 Idempotency-Key，重复创建时服务端返回已有的上传
+  const idempotencyKey = localStorage.getItem(key) || newIdempotencyKey()
+  localStorage.setItem(key, idempotencyKey)
+
+  let status: UploadStatus = (
+    await withRetry(() =>
+      client.post(
+        `/students/assignments/${assignmentId}/uploads`,
+        { filename: file.name, size: file.size },
+        { headers: { 'Idempotency-Key': idempotencyKey } }
+      )
+    )
+  ).data
+
+  let failures = 0
+  while (status.submission_id === null && status.offset < status.size) {
+    const offset = status.offset
+    const chunk = file.slice(offset, Math.min(offset + status.chunk_size, status.size))
+    onProgress?.(offset, status.size)
+    try {
+      const res = await client.patch(`/students/uploads/${status.upload_id}`, chunk, {
+        headers: {
+          'Content-Type': 'application/offset+octet-stream',
+          'Upload-Offset': String(offset),
+        },
+        onUploadProgress: (e) => onProgress?.(offset + e.loaded, status.size),
+      })
+      status = res.data
+      failures = 0
+    } catch (err: any) {
+      if (err.response && err.response.status !== 409 && !isRetryable(err)) throw err
+      if (++failures > MAX_RETRIES) throw err
+      if (!err.response || err.response.status >= 500) {
+        await sleep(Math.min(1000 * 2 ** (failures - 1), 15000))
+      }
+      // 偏移量冲突或连接中断：以服务端已接收的偏移量为准继续
+      status = (await withRetry(() => client.get(`/students/uploads/${status.upload_id}`))).data
+    }
+  }
+  onProgress?.(status.size, status.size)
+
+  // 完成上传可安全重试，不会重复提交
+  const res = await withRetry(() => client.post(`/students/uploads/${status.upload_id}/finalize`))
+  localStorage.removeItem(key)
+  return res.data
+}
@@ -131,7 +131,18 @@ export default function AssignmentStats() {
     addBackgroundTask(taskId)
 
     try {
-      await client.post(`/teachers/assignments/${id}/generate-class-report`)
+      const response = await client.post(`/teachers/assignments/${id}/generate-class-report`)
+      let job = response.data.job
+      // 报告在后台生成，轮询任务进度直到完成或失败
+      while (job.status !== 'completed' && job.status !== 'failed') {
+        await new Promise((resolve) => setTimeout(resolve, 3000))
+        const jobRes = await client.get(`/teachers/assignments/${id}/class-report-job`)
+        job = jobRes.data.job
+      }
+      if (job.status === 'failed') {
+        alert(`生成报告失败: ${job.error || '未知错误'}`)
+        return
+      }
       setHasReports(true)
       alert('全班学情报告生成成功！')
       loadData().catch(console.error)
@@ -48,8 +48,9 @@ export default function ClassReportView() {
     setLoadingReport(true)
     setError('')
     try {
-      const response = await client.get(`/teachers/assignments/${id}/class-report`)
-      setReportContent(response.data.content)
+      // 报告正文以Markdown文件直接下载（服务端发送预压缩副本）
+      const response = await client.get(`/teachers/assignments/${id}/class-report/file`, { responseType: 'text' })
+      setReportContent(response.data)
     } catch (error: any) {
       if (error.response?.status === 404) {
         setError('报告尚未生成，请先生成报告')
@@ -65,8 +66,11 @@ export default function ClassReportView() {
     setLoadingReport(true)
     setError('')
     try {
-      const response = await client.get(`/teachers/assignments/${id}/class-report?timestamp=${ts}`)
-      setReportContent(response.data.content)
+      const response = await client.get(`/teachers/assignments/${id}/class-report/file`, {
+        params: { timestamp: ts },
+        responseType: 'text'
+      })
+      setReportContent(response.data)
     } catch (error: any) {
       setError('加载报告失败')
     } finally {
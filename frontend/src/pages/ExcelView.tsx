@@ -3,25 +3,38 @@ import { useParams, Link } from 'react-router-dom'
 import client from '../api/client'
 import '../index.css'
 
+const PAGE_SIZE = 100
+
+interface ColumnarPage {
+  columns: string[]
+  status_dictionary: string[]
+  encoded_columns: string[]
+  data: any[][]
+  total_rows: number
+  offset: number
+}
+
 export default function ExcelView() {
   const { id } = useParams<{ id: string }>()
-  const [excelData, setExcelData] = useState<any>(null)
+  const [page, setPage] = useState<ColumnarPage | null>(null)
+  const [offset, setOffset] = useState(0)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState('')
 
   useEffect(() => {
     loadExcelData()
-  }, [id])
+  }, [id, offset])
 
   const loadExcelData = async () => {
     setLoading(true)
     setError('')
     try {
-      const response = await client.get(`/teachers/assignments/${id}/excel`)
-      if (response.data.success && response.data.data) {
-        // 只使用汇总(宽表)数据
-        const wideData = response.data.data['汇总(宽表)'] || []
-        setExcelData(wideData)
+      // 列式格式：列名只返回一次，逐题状态为状态字典下标，按页加载
+      const response = await client.get(`/teachers/assignments/${id}/excel`, {
+        params: { format: 'columnar', offset, limit: PAGE_SIZE }
+      })
+      if (response.data.success && response.data.columns) {
+        setPage(response.data)
       } else {
         setError('数据格式错误')
       }
@@ -33,6 +46,11 @@ export default function ExcelView() {
     }
   }
 
+  // 将当前页还原为行对象
+  const columns = page?.columns || []
+  const excelData = page ? decodeRows(page) : []
+  const totalRows = page?.total_rows || 0
+
   if (loading) {
     return (
       <div className="app">
@@ -64,7 +82,7 @@ export default function ExcelView() {
     )
   }
 
-  if (!excelData || excelData.length === 0) {
+  if (totalRows === 0) {
     return (
       <div className="app">
         <header className="header">
@@ -84,9 +102,6 @@ export default function ExcelView() {
     )
   }
 
-  // 获取所有列名
-  const columns = excelData.length > 0 ? Object.keys(excelData[0]) : []
-
   return (
     <div className="app">
       <header className="header">
@@ -102,7 +117,28 @@ export default function ExcelView() {
           <div style={{ marginBottom: '16px', display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
             <h2>汇总(宽表)</h2>
             <div style={{ fontSize: '14px', color: '#666' }}>
-              共 {excelData.length} 条记录
+              共 {totalRows} 条记录
+              {totalRows > PAGE_SIZE && (
+                <span style={{ marginLeft: '12px' }}>
+                  <button
+                    className="btn btn-secondary"
+                    disabled={offset === 0}
+                    onClick={() => setOffset(Math.max(0, offset - PAGE_SIZE))}
+                  >
+                    上一页
+                  </button>
+                  <span style={{ margin: '0 8px' }}>
+                    {offset + 1}-{Math.min(offset + PAGE_SIZE, totalRows)}
+                  </span>
+                  <button
+                    className="btn btn-secondary"
+                    disabled={offset + PAGE_SIZE >= totalRows}
+                    onClick={() => setOffset(offset + PAGE_SIZE)}
+                  >
+                    下一页
+                  </button>
+                </span>
+              )}
             </div>
           </div>
           <div style={{ overflowX: 'auto', maxHeight: '80vh', overflowY: 'auto' }}>
@@ -136,7 +172,7 @@ export default function ExcelView() {
                     key={idx} 
                     style={{ 
                       borderBottom: '1px solid #eee',
-                      background: idx % 2 === 0 ? '#fff' : '#f9f9f9'
+                      background: (offset + idx) % 2 === 0 ? '#fff' : '#f9f9f9'
                     }}
                   >
                     {columns.map((key) => {
@@ -190,3 +226,18 @@ export default function ExcelView() {
   )
 }
 
+
+function decodeRows(page: ColumnarPage): Record<string, any>[] {
+  const encoded = new Set(page.encoded_columns)
+  const rowCount = page.data.length > 0 ? page.data[0].length : 0
+  const rows: Record<string, any>[] = []
+  for (let r = 0; r < rowCount; r++) {
+    const row: Record<string, any> = {}
+    page.columns.forEach((col, c) => {
+      const value = page.data[c][r]
+      row[col] = encoded.has(col) ? page.status_dictionary[value] : value
+    })
+    rows.push(row)
+  }
+  return rows
+}
@@ -1,6 +1,7 @@
 import { useEffect, useState } from 'react'
 import { useParams, Link } from 'react-router-dom'
 import client from '../api/client'
+import { uploadHomework } from '../api/resumableUpload'
 import ReactMarkdown from 'react-markdown'
 import { ChevronLeft, Upload, FileText, CheckCircle2, Clock, AlertCircle, RefreshCw, Loader2 } from 'lucide-react'
 import clsx from 'clsx'
@@ -24,6 +25,7 @@ export default function StudentAssignmentDetail() {
   const [report, setReport] = useState<{ content: string; grade: string } | null>(null)
   const [loading, setLoading] = useState(true)
   const [uploading, setUploading] = useState(false)
+  const [progress, setProgress] = useState(0)
   const [file, setFile] = useState<File | null>(null)
   const [error, setError] = useState('')
 
@@ -60,8 +62,12 @@ export default function StudentAssignmentDetail() {
 
   const loadReport = async () => {
     try {
-      const response = await client.get(`/students/assignments/${id}/report`)
-      setReport(response.data)
+      // 元数据与报告正文分开获取，正文直接以Markdown文件发送
+      const [meta, file] = await Promise.all([
+        client.get(`/students/assignments/${id}/report/meta`),
+        client.get(`/students/assignments/${id}/report/file`, { responseType: 'text' })
+      ])
+      setReport({ ...meta.data, content: file.data })
     } catch (error) {
       console.error('加载报告失败:', error)
     }
@@ -79,13 +85,12 @@ export default function StudentAssignmentDetail() {
     }
 
     setUploading(true)
+    setProgress(0)
     setError('')
 
     try {
-      const formData = new FormData()
-      formData.append('homework_file', file)
-
-      await client.post(`/students/assignments/${id}/submit`, formData)
+      // 分块续传，网络中断后自动从已上传的位置继续
+      await uploadHomework(id!, file, (loaded, total) => setProgress(Math.floor((loaded / total) * 100)))
       await loadData()
     } catch (err: any) {
       setError(err.response?.data?.detail || '提交失败')
@@ -166,7 +171,7 @@ export default function StudentAssignmentDetail() {
                   disabled={uploading || !file}
                 >
                   {uploading ? <Loader2 className="animate-spin" size={16} /> : <Upload size={16} />}
-                  提交作业
+                  {uploading ? `上传中 ${progress}%` : '提交作业'}
                 </button>
               </div>
             ) : (
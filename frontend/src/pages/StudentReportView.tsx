@@ -15,8 +15,13 @@ export default function StudentReportView() {
 
   const loadReport = async () => {
     try {
-      const response = await client.get(`/teachers/assignments/${id}/submissions/${submissionId}/report`)
-      setReport(response.data)
+      // 元数据与报告正文分开获取，正文直接以Markdown文件发送
+      const base = `/teachers/assignments/${id}/submissions/${submissionId}/report`
+      const [meta, file] = await Promise.all([
+        client.get(`${base}/meta`),
+        client.get(`${base}/file`, { responseType: 'text' })
+      ])
+      setReport({ ...meta.data, content: file.data })
     } catch (err: any) {
       setError(err.response?.data?.detail || '加载报告失败')
     } finally {
@@ -10,6 +10,14 @@ interface Assignment {
   status: string
   created_at: string
   deadline?: string
+  total_students: number
+  submitted_count: number
+  graded_count: number
+  failed_count: number
+  pending_count: number
+  processing_count: number
+  progress: number | null
+  average_grade: string | null
 }
 
 export default function TeacherDashboard() {
@@ -23,8 +31,9 @@ export default function TeacherDashboard() {
 
   const loadAssignments = async () => {
     try {
-      const response = await client.get('/assignments/')
-      setAssignments(response.data)
+      // 一次请求获取所有作业及其提交、批改进度
+      const response = await client.get('/teachers/dashboard')
+      setAssignments(response.data.assignments)
     } catch (error) {
       console.error('加载作业失败:', error)
     } finally {
@@ -114,6 +123,31 @@ export default function TeacherDashboard() {
                     <Calendar size={14} className="mr-1.5" />
                     <span>创建于 {new Date(assignment.created_at).toLocaleDateString('zh-CN')}</span>
                   </div>
+
+                  {assignment.status !== 'draft' && (
+                    <div className="mt-4 space-y-2">
+                      <div className="flex justify-between text-sm text-slate-600">
+                        <span>已提交 {assignment.submitted_count}/{assignment.total_students}</span>
+                        <span>
+                          已批改 {assignment.graded_count}
+                          {assignment.failed_count > 0 && (
+                            <span className="text-red-600 ml-2">失败 {assignment.failed_count}</span>
+                          )}
+                        </span>
+                      </div>
+                      {assignment.progress !== null && assignment.progress < 1 && (
+                        <div className="h-1.5 bg-slate-100 rounded-full overflow-hidden">
+                          <div
+                            className="h-full bg-primary-500"
+                            style={{ width: `${Math.round(assignment.progress * 100)}%` }}
+                          />
+                        </div>
+                      )}
+                      {assignment.average_grade && (
+                        <div className="text-sm text-slate-500">平均等级 {assignment.average_grade}</div>
+                      )}
+                    </div>
+                  )}
                 </div>
                 
                 <div className="border-t border-slate-100 px-6 py-4 bg-slate-50/50 rounded-b-xl flex justify-between items-center group-hover:bg-slate-50 transition-colors">